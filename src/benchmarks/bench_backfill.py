@@ -0,0 +1,32 @@
+""" Benchmarks of the backfill of features against the sequential online loop."""
+
+import copy
+
+from sklearn.base import clone
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv
+from src.features.backfill import backfill_features
+from src.features.build_features import FEATURES_PIPELINE
+
+
+class Backfill:
+    params = [[20, 100]]
+    param_names = ["n_bars"]
+    timeout = 600
+
+    def setup(self, n_bars):
+        self.ohlcv = generate_ohlcv(400 + n_bars, seed=0).set_index(cfg.DATE)
+        cfg.FINTA_COLS = None
+        self.pipeline = clone(FEATURES_PIPELINE)
+        self.pipeline.fit_transform(self.ohlcv.iloc[:-n_bars])
+        self.start = self.ohlcv.index[-n_bars]
+
+    def time_backfill(self, n_bars):
+        backfill_features(self.pipeline, self.ohlcv, start=self.start)
+
+    def time_sequential(self, n_bars):
+        """ Each bar transformed in turn, as the loop replaced by the backfill."""
+        pipeline = copy.deepcopy(self.pipeline)
+        for i in range(-n_bars, 0):
+            pipeline.transform(self.ohlcv.iloc[i])
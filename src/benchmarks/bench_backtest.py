@@ -0,0 +1,26 @@
+""" Benchmarks of the vectorized backtest over parameter grids."""
+
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+from src.data.synthetic import generate_universe
+from src.models.backtest import backtest_grid
+
+
+class BacktestGrid:
+    params = [[10, 50], [100, 1000]]
+    param_names = ["n_symbols", "n_thresholds"]
+
+    def setup(self, n_symbols, n_thresholds):
+        self.ohlcvs = {symbol: df.set_index(cfg.DATE) for symbol, df in generate_universe(n_symbols, 1000, seed=0)}
+        dates = next(iter(self.ohlcvs.values())).index
+        self.signals = pd.DataFrame(np.random.default_rng(0).random((len(dates), n_symbols)),
+                                    index=dates, columns=list(self.ohlcvs))
+        self.thresholds = np.linspace(0, 1, n_thresholds)
+
+    def time_backtest_grid(self, n_symbols, n_thresholds):
+        backtest_grid(self.signals, self.ohlcvs, self.thresholds, [1, 2, 5, 10])
+
+    def peakmem_backtest_grid(self, n_symbols, n_thresholds):
+        backtest_grid(self.signals, self.ohlcvs, self.thresholds, [1, 2, 5, 10], memory_budget=2**26)
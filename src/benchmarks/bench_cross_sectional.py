@@ -0,0 +1,29 @@
+""" Benchmarks of the cross-sectional features of a universe."""
+
+import numpy as np
+import pandas as pd
+
+from src.features.cross_sectional import cross_sectional_stats
+
+
+class CrossSectionalStats:
+    params = [[2500, 10000], [500, 3000]]
+    param_names = ["n_dates", "n_symbols"]
+
+    def setup(self, n_dates, n_symbols):
+        rng = np.random.default_rng(0)
+        self.values = rng.standard_normal((n_dates, n_symbols)).astype(np.float32)
+        # Symbols listed after the start or delisted before the end
+        self.values[rng.random(self.values.shape) < 0.1] = np.nan
+
+    def time_cross_sectional_stats(self, n_dates, n_symbols):
+        cross_sectional_stats(self.values)
+
+    def time_pandas_rank(self, n_dates, n_symbols):
+        # Ranks and percentiles only, for reference
+        df = pd.DataFrame(self.values)
+        df.rank(axis=1)
+        df.rank(axis=1, pct=True)
+
+    def peakmem_cross_sectional_stats(self, n_dates, n_symbols):
+        cross_sectional_stats(self.values)
@@ -0,0 +1,27 @@
+""" Benchmarks of the streaming drift monitor of features."""
+
+import numpy as np
+import pandas as pd
+
+from src.features.drift import DriftMonitor
+
+
+class DriftMonitorUpdate:
+    params = [[100, 1000, 5000]]
+    param_names = ["n_features"]
+
+    def setup(self, n_features):
+        rng = np.random.default_rng(0)
+        self.monitor = DriftMonitor(halflife=500).fit(pd.DataFrame(rng.standard_normal((2000, n_features))))
+        self.rows = rng.standard_normal((1000, n_features))
+
+    def time_update_rows(self, n_features):
+        """ 1000 bars pushed one at a time, as by an InferencePlan."""
+        for row in self.rows:
+            self.monitor.update(row)
+
+    def time_update_batch(self, n_features):
+        self.monitor.update(self.rows)
+
+    def time_report(self, n_features):
+        self.monitor.report()
@@ -0,0 +1,45 @@
+""" Benchmarks of feature matrix decoding: CSV, plain float32 and feature stores."""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.data.feature_store import FeatureStore, write_features
+
+N_COLUMNS = 100
+
+
+class FeatureStoreRead:
+    params = [[100000], ["auto", "int16", "float32"]]
+    param_names = ["n_rows", "encoding"]
+
+    def setup(self, n_rows, encoding):
+        rng = np.random.default_rng(0)
+        # Half bounded scaled columns, half unbounded random walks
+        values = np.hstack([rng.uniform(0, 1, (n_rows, N_COLUMNS // 2)),
+                            np.cumsum(rng.standard_normal((n_rows, N_COLUMNS // 2)), axis=0)])
+        X = pd.DataFrame(values, columns=[f"f{j}" for j in range(N_COLUMNS)])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv = Path(self.tmp.name) / "features.csv"
+        self.npy = Path(self.tmp.name) / "features.npy"
+        X.to_csv(self.csv, index=False)
+        np.save(self.npy, values.astype(np.float32))
+        self.store = FeatureStore(write_features(Path(self.tmp.name) / "features.feat", X, encoding))
+
+    def teardown(self, n_rows, encoding):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def time_read_store(self, n_rows, encoding):
+        self.store.read()
+
+    def time_read_store_column(self, n_rows, encoding):
+        self.store.read(["f0"])
+
+    def time_read_csv(self, n_rows, encoding):
+        pd.read_csv(self.csv, dtype=np.float32)
+
+    def time_load_float32(self, n_rows, encoding):
+        np.load(self.npy)
@@ -0,0 +1,195 @@
+""" Benchmarks of the features generation steps on synthetic data."""
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv
+from src.features.finta_transformer import compute_finta_metrics
+from src.features.scalers import SCALERS, EWStandardScaler, MovingRobustScaler
+from src.features.distances import signed_distance
+from src.features.fractional_diff import fractional_differences, fractional_weights
+from src.features.smoothers import lowess_agf, SMA
+from src.features.nan_handlers import drop_unconsistant_columns, offset_nan
+from src.features.redundancy import RedundantColumnDroper
+
+
+def synthetic_ohlcv(n_rows:int, seed:int=0) -> pd.DataFrame:
+    """ Synthetic OHLCV with dates as index, as returned by `Stock.ohlcv`."""
+    return generate_ohlcv(n_rows, seed=seed).set_index(cfg.DATE)
+
+
+def synthetic_features(n_rows:int, n_cols:int=68, seed:int=0) -> pd.DataFrame:
+    """ Wide frame of price-like random walks, about the width of the Finta output."""
+    rng = np.random.default_rng(seed)
+    values = 100 + np.cumsum(rng.standard_normal((n_rows, n_cols)), axis=0)
+    return pd.DataFrame(values, columns=[f"feature_{i}" for i in range(n_cols)])
+
+
+class FintaMetrics:
+    params = [500, 2000]
+    param_names = ["n_rows"]
+
+    def setup(self, n_rows):
+        self.ohlcv = synthetic_ohlcv(n_rows)
+
+    def time_compute_finta_metrics(self, n_rows):
+        compute_finta_metrics(self.ohlcv)
+
+    def peakmem_compute_finta_metrics(self, n_rows):
+        compute_finta_metrics(self.ohlcv)
+
+
+class Scalers:
+    params = [[name for name, _ in SCALERS], [1000, 10000]]
+    param_names = ["scaler", "n_rows"]
+
+    def setup(self, scaler, n_rows):
+        self.X = synthetic_features(n_rows)
+        self.scaler = clone(dict(SCALERS)[scaler])
+
+    def time_fit_transform(self, scaler, n_rows):
+        self.scaler.fit_transform(self.X)
+
+    def peakmem_fit_transform(self, scaler, n_rows):
+        self.scaler.fit_transform(self.X)
+
+
+class StreamingScalers:
+    params = [["ew_standard_scaler", "moving_robust_scaler"], [10, 100]]
+    param_names = ["scaler", "window"]
+
+    def setup(self, scaler, window):
+        X = synthetic_features(1000 + window)
+        self.rows = X.values[-1000:]
+        if scaler == "ew_standard_scaler":
+            self.scaler = EWStandardScaler(span=window).fit(X.iloc[:window])
+        else:
+            self.scaler = MovingRobustScaler(window=window).fit(X.iloc[:window])
+
+    def time_update(self, scaler, window):
+        """ 1000 bars scored one at a time, as by an InferencePlan."""
+        for row in self.rows:
+            self.scaler.update(row)
+
+
+def direct_fractional_differences(values:np.ndarray, weights:list) -> np.ndarray:
+    """ Fixed-width fractional differences as sliding dot products, O(n·w) per column."""
+    out = np.full((len(values), len(weights) * values.shape[1]), np.nan)
+    for i, w in enumerate(weights):
+        windows = np.lib.stride_tricks.sliding_window_view(values, len(w), axis=0)
+        out[len(w) - 1:, i * values.shape[1]:(i + 1) * values.shape[1]] = windows @ w[::-1]
+    return out
+
+
+class FractionalDifferencing:
+    params = [["fft", "direct"], [10000, 100000]]
+    param_names = ["method", "n_rows"]
+
+    def setup(self, method, n_rows):
+        self.values = synthetic_features(n_rows).values
+        self.weights = [fractional_weights(d) for d in [0.2, 0.4, 0.6]]
+        self.func = fractional_differences if method == "fft" else direct_fractional_differences
+
+    def time_fractional_differences(self, method, n_rows):
+        self.func(self.values, self.weights)
+
+    def peakmem_fractional_differences(self, method, n_rows):
+        self.func(self.values, self.weights)
+
+
+class SignedDistance:
+    params = [1000, 10000]
+    param_names = ["n_rows"]
+
+    def setup(self, n_rows):
+        self.X = synthetic_features(n_rows)
+
+    def time_sma_signed_distance(self, n_rows):
+        signed_distance(self.X, func=SMA, kwds={"window": cfg.SMA_DEFAULT_WINDOW})
+
+    def peakmem_sma_signed_distance(self, n_rows):
+        signed_distance(self.X, func=SMA, kwds={"window": cfg.SMA_DEFAULT_WINDOW})
+
+
+class Lowess:
+    params = [200, 1000]
+    param_names = ["n_rows"]
+
+    def setup(self, n_rows):
+        self.y = synthetic_ohlcv(n_rows)[cfg.CLOSE].values
+
+    def time_lowess_agf(self, n_rows):
+        lowess_agf(self.y)
+
+    def peakmem_lowess_agf(self, n_rows):
+        lowess_agf(self.y)
+
+
+class NanHandlers:
+    params = [1000, 10000]
+    param_names = ["n_rows"]
+
+    def setup(self, n_rows):
+        X = synthetic_features(n_rows)
+        # NaN warm up periods of various lengths, as produced by rolling indicators
+        for i, col in enumerate(X.columns):
+            X.iloc[:i, X.columns.get_loc(col)] = np.nan
+        self.X = X
+
+    def time_drop_unconsistant_columns(self, n_rows):
+        drop_unconsistant_columns(self.X.copy())
+
+    def time_offset_nan(self, n_rows):
+        offset_nan(self.X)
+
+
+class RedundancyPruning:
+    params = [[500, 5000], [2**24, 2**28]]
+    param_names = ["n_cols", "memory_budget"]
+
+    def setup(self, n_cols, memory_budget):
+        X = synthetic_features(2000, n_cols // 2)
+        # Affine copies of every column, as produced by the scalers
+        self.X = pd.concat([X, 2 * X.add_suffix("_scaled") + 1], axis=1)
+
+    def time_fit(self, n_cols, memory_budget):
+        RedundantColumnDroper(memory_budget=memory_budget).fit(self.X)
+
+    def peakmem_fit(self, n_cols, memory_budget):
+        RedundantColumnDroper(memory_budget=memory_budget).fit(self.X)
+
+
+class FeaturesPipeline:
+    params = [1000, 5000]
+    param_names = ["n_rows"]
+
+    def setup(self, n_rows):
+        from src.features.build_features import FEATURES_PIPELINE
+        self.pipeline = FEATURES_PIPELINE
+        self.ohlcv = synthetic_ohlcv(n_rows)
+
+    def time_fit_transform(self, n_rows):
+        self.pipeline.fit_transform(self.ohlcv)
+
+    def peakmem_fit_transform(self, n_rows):
+        self.pipeline.fit_transform(self.ohlcv)
+
+
+class ChunkedFeaturesPipeline:
+    params = [[5000], [1000, 2500]]
+    param_names = ["n_rows", "block_size"]
+
+    def setup(self, n_rows, block_size):
+        self.ohlcv = synthetic_ohlcv(n_rows)
+
+    def time_chunked_fit_transform(self, n_rows, block_size):
+        from src.features.build_features import FEATURES_PIPELINE
+        from src.features.chunked import chunked_fit_transform
+        chunked_fit_transform(clone(FEATURES_PIPELINE), self.ohlcv, block_size=block_size)
+
+    def peakmem_chunked_fit_transform(self, n_rows, block_size):
+        from src.features.build_features import FEATURES_PIPELINE
+        from src.features.chunked import chunked_fit_transform
+        chunked_fit_transform(clone(FEATURES_PIPELINE), self.ohlcv, block_size=block_size)
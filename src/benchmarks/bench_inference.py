@@ -0,0 +1,22 @@
+""" Benchmarks of single bar scoring with the fitted features pipeline."""
+
+from src.benchmarks.bench_features import synthetic_ohlcv
+
+
+class SingleBarScoring:
+
+    def setup(self):
+        from src.features.build_features import FEATURES_PIPELINE
+        from src.features.inference_plan import InferencePlan
+        ohlcv = synthetic_ohlcv(500)
+        self.pipeline = FEATURES_PIPELINE
+        self.pipeline.fit_transform(ohlcv.iloc[:-1])
+        self.plan = InferencePlan(self.pipeline)
+        self.bar = ohlcv.iloc[-1]
+        self.row = self.bar[self.plan.input_columns].values
+
+    def time_pipeline_transform(self):
+        self.pipeline.transform(self.bar)
+
+    def time_inference_plan_update(self):
+        self.plan.update(self.row)
@@ -0,0 +1,39 @@
+""" Benchmarks of the labeling of stock data."""
+
+import src.config as cfg
+from src.data.labeling import compute_labels, compute_universe_labels
+from src.data.synthetic import generate_ohlcv, generate_universe
+
+
+class Labeling:
+    params = [1000, 100000]
+    param_names = ["n_rows"]
+
+    def setup(self, n_rows):
+        self.dohlcv = generate_ohlcv(n_rows, freq="1min", seed=0)
+
+    def time_next_day_apply(self, n_rows):
+        # Former `Stock.labels` implementation, for reference
+        evolution = (self.dohlcv[cfg.CLOSE] - self.dohlcv[cfg.OPEN]).shift(-1) / self.dohlcv[cfg.OPEN].shift(-1)
+        evolution.apply(lambda x: 0 if x < cfg.BREAKEVEN else x/x)
+
+    def time_compute_labels(self, n_rows):
+        compute_labels(self.dohlcv)
+
+    def peakmem_compute_labels(self, n_rows):
+        compute_labels(self.dohlcv)
+
+
+class UniverseLabeling:
+    params = [10, 100]
+    param_names = ["n_symbols"]
+
+    def setup(self, n_symbols):
+        self.universe = dict(generate_universe(n_symbols, 2500, seed=0))
+
+    def time_compute_universe_labels(self, n_symbols):
+        compute_universe_labels(self.universe)
+
+    def time_compute_labels_per_symbol(self, n_symbols):
+        for dohlcv in self.universe.values():
+            compute_labels(dohlcv)
@@ -0,0 +1,36 @@
+""" Benchmarks of the as-of join of higher timeframe features onto 1-minute bars."""
+
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+from src.data.resampling import resample_ohlcv
+from src.data.synthetic import generate_ohlcv
+from src.features.multi_timeframe import asof_indexer, asof_join, completion_times
+
+N_FEATURES = 20
+
+
+class AsofJoin:
+    params = [[100000, 1000000], ["60min", "daily"]]
+    param_names = ["n_rows", "timeframe"]
+
+    def setup(self, n_rows, timeframe):
+        ohlcv = generate_ohlcv(n_rows, freq="1min", seed=0).set_index(cfg.DATE)
+        bars = resample_ohlcv(ohlcv, timeframe)
+        rng = np.random.default_rng(0)
+        # Stand-in for the features of the higher timeframe bars
+        self.features = rng.standard_normal((len(bars), N_FEATURES))
+        self.completed = completion_times(bars.index.values, timeframe)
+        self.bar_ends = (ohlcv.index + pd.Timedelta("1min")).values.view(np.int64)
+        self.left = pd.DataFrame({"end": self.bar_ends})
+        self.right = pd.DataFrame(self.features).assign(completed=self.completed)
+
+    def time_asof_join(self, n_rows, timeframe):
+        asof_join(self.features, asof_indexer(self.bar_ends, self.completed))
+
+    def time_pandas_merge_asof(self, n_rows, timeframe):
+        pd.merge_asof(self.left, self.right, left_on="end", right_on="completed")
+
+    def peakmem_asof_join(self, n_rows, timeframe):
+        asof_join(self.features, asof_indexer(self.bar_ends, self.completed))
@@ -0,0 +1,25 @@
+""" Benchmarks of the resampling of 1-minute bars to higher timeframes."""
+
+import src.config as cfg
+from src.data.resampling import resample_ohlcv
+from src.data.synthetic import generate_ohlcv
+
+AGGREGATIONS = {cfg.OPEN: "first", cfg.HIGH: "max", cfg.LOW: "min", cfg.CLOSE: "last", cfg.VOLUME: "sum"}
+
+
+class Resampling:
+    params = [[100000, 2000000], ["15min", "daily"]]
+    param_names = ["n_rows", "freq"]
+
+    def setup(self, n_rows, freq):
+        self.ohlcv = generate_ohlcv(n_rows, freq="1min", seed=0).set_index(cfg.DATE)
+
+    def time_resample_ohlcv(self, n_rows, freq):
+        resample_ohlcv(self.ohlcv, freq)
+
+    def time_pandas_resample(self, n_rows, freq):
+        # Calendar buckets without session handling, for reference
+        self.ohlcv.resample("D" if freq == "daily" else freq).agg(AGGREGATIONS).dropna()
+
+    def peakmem_resample_ohlcv(self, n_rows, freq):
+        resample_ohlcv(self.ohlcv, freq)
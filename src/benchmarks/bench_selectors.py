@@ -0,0 +1,23 @@
+""" Benchmarks of the feature selection filters on wide matrices."""
+
+import numpy as np
+import pandas as pd
+
+from src.features.selectors import FeatureSelector
+
+
+class Selectors:
+    params = [["mutual_information", "auc"], [1000, 10000]]
+    param_names = ["method", "n_cols"]
+
+    def setup(self, method, n_cols):
+        rng = np.random.default_rng(0)
+        X = rng.standard_normal((2000, n_cols))
+        self.y = (X[:, 0] + rng.standard_normal(2000) > 0).astype(float)
+        self.X = pd.DataFrame(X)
+
+    def time_fit(self, method, n_cols):
+        FeatureSelector(method, k=100).fit(self.X, self.y)
+
+    def peakmem_fit(self, method, n_cols):
+        FeatureSelector(method, k=100).fit(self.X, self.y)
@@ -0,0 +1,102 @@
+""" Latency benchmark of single bar scoring.
+
+ Compares `FEATURES_PIPELINE.transform` with the compiled InferencePlan on the
+ last bars of a stock and reports p50 and p99 latencies."""
+
+import contextlib
+import io
+import logging
+import time
+from typing import Callable, Iterable
+
+import click
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+
+
+def measure_latency(func:Callable, inputs:Iterable, n_warmup:int=5) -> dict:
+    """
+        Call `func` on each input and collect latency percentiles.
+
+        Parameters
+        ----------
+        func: python function
+            The function to benchmark. It is called once per input.
+        inputs: Iterable
+            Inputs passed to func one at a time.
+        n_warmup: int
+            Amount of first calls excluded from statistics.
+
+        Returns
+        -------
+        dict
+            Amount of measured calls with p50, p99, mean and max latencies in milliseconds.
+    """
+    timings = []
+    for i, x in enumerate(inputs):
+        start = time.perf_counter()
+        func(x)
+        if i >= n_warmup:
+            timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1e3
+    return {
+        "n": len(timings),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "mean_ms": float(timings.mean()),
+        "max_ms": float(timings.max()),
+    }
+
+
+def compare_scoring_paths(ohlcv:pd.DataFrame, n_bars:int=200, n_warmup:int=5) -> dict:
+    """
+        Fit FEATURES_PIPELINE on all but the last `n_bars` bars then score them one by one
+        with the pipeline and with a compiled InferencePlan.
+
+        Parameters
+        ----------
+        ohlcv: pd.DataFrame
+            Open, high, low, close stock prices with volumes and with dates as indexes.
+        n_bars: int
+            Amount of bars scored by each path.
+    """
+    from src.features.build_features import FEATURES_PIPELINE
+    from src.features.inference_plan import InferencePlan
+
+    X, bars = ohlcv.iloc[:-n_bars], ohlcv.iloc[-n_bars:]
+    # Silence print based logs of the transformers
+    with contextlib.redirect_stdout(io.StringIO()):
+        FEATURES_PIPELINE.fit_transform(X)
+        plan = InferencePlan(FEATURES_PIPELINE)
+        rows = [bars.iloc[i] for i in range(len(bars))]
+        pipeline_stats = measure_latency(FEATURES_PIPELINE.transform, rows, n_warmup)
+    plan_stats = measure_latency(plan.update, bars[plan.input_columns].values, n_warmup)
+    return {"pipeline": pipeline_stats, "inference_plan": plan_stats}
+
+
+@click.command()
+@click.argument('symbol', type=click.STRING, required=False)
+@click.option('--synthetic-rows', default=None, type=int, help="Benchmark on synthetic data instead of stock data.")
+@click.option('--n-bars', default=200, help="Amount of bars scored by each path.")
+@click.option('--target-p99-ms', default=cfg.INFERENCE_P99_TARGET_MS, help="p99 latency target of the inference plan.")
+def main(symbol:str, synthetic_rows:int, n_bars:int, target_p99_ms:float):
+    if synthetic_rows is not None:
+        from src.data.synthetic import generate_ohlcv
+        ohlcv = generate_ohlcv(synthetic_rows, seed=0).set_index(cfg.DATE)
+    elif symbol is not None:
+        from src.data.stock import Stock
+        ohlcv = Stock(symbol).ohlcv
+    else:
+        raise click.UsageError("Provide a SYMBOL or --synthetic-rows.")
+    results = compare_scoring_paths(ohlcv, n_bars=n_bars)
+    for path, stats in results.items():
+        logging.info(f"{path:>15}: p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms (n={stats['n']})")
+    if results["inference_plan"]["p99_ms"] > target_p99_ms:
+        raise click.ClickException(f"Inference plan p99 latency above target ({target_p99_ms}ms).")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(**cfg.LOGGING_CONFIG)
+    main()
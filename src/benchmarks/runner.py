@@ -0,0 +1,170 @@
+""" Runner of the offline benchmark suite.
+
+ Benchmarks are written asv-style in `src/benchmarks/bench_*.py` modules: classes
+ with an optional `setup(*params)` method, `params`/`param_names` attributes and
+ `time_*` and `peakmem_*` methods. `time_*` methods are timed over several repeats,
+ `peakmem_*` methods are run once under tracemalloc to record their peak memory.
+
+ Results are saved as JSON and can be compared with a previous run to catch regressions:
+
+    python -m src.benchmarks.runner --output reports/benchmarks/baseline.json
+    python -m src.benchmarks.runner --baseline reports/benchmarks/baseline.json
+"""
+
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import logging
+import pkgutil
+import platform
+import re
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List, Optional
+
+import click
+import numpy as np
+
+import src.benchmarks
+import src.config as cfg
+
+BENCHMARKS_DIR = Path(cfg.PROJECT_DIR) / "reports" / "benchmarks"
+BENCHMARK_PREFIXES = ("time_", "peakmem_")
+
+
+def discover(pattern:Optional[str]=None) -> List[tuple]:
+    """
+        List benchmarks of the `src.benchmarks.bench_*` modules.
+
+        Parameters
+        ----------
+        pattern: str, default=None
+            Regular expression filtering benchmark names (`module.Class.method`)
+
+        Returns
+        -------
+        list of (name, class, method name) tuples
+    """
+    benchmarks = []
+    for module_info in pkgutil.iter_modules(src.benchmarks.__path__):
+        if not module_info.name.startswith("bench_"):
+            continue
+        module = importlib.import_module(f"src.benchmarks.{module_info.name}")
+        for cls_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            for method in dir(cls):
+                name = f"{module_info.name}.{cls_name}.{method}"
+                if method.startswith(BENCHMARK_PREFIXES) and (pattern is None or re.search(pattern, name)):
+                    benchmarks.append((name, cls, method))
+    return benchmarks
+
+
+def _param_combinations(cls) -> List[tuple]:
+    params = getattr(cls, "params", None)
+    if params is None:
+        return [()]
+    if not isinstance(params[0], (list, tuple)):
+        params = [params]
+    return list(itertools.product(*params))
+
+
+def run_benchmark(cls, method:str, params:tuple, repeat:int=5) -> dict:
+    """
+        Run a single benchmark method for a combination of parameters.
+
+        Returns
+        -------
+        dict
+            `seconds` (median, min and max over repeats) for `time_*` methods,
+            `bytes` of peak traced memory for `peakmem_*` methods.
+    """
+    bench = cls()
+    if hasattr(bench, "setup"):
+        bench.setup(*params)
+    func = getattr(bench, method)
+
+    if method.startswith("peakmem_"):
+        tracemalloc.start()
+        func(*params)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result = {"unit": "bytes", "value": peak}
+    else:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(*params)
+            timings.append(time.perf_counter() - start)
+        result = {"unit": "seconds", "value": float(np.median(timings)), "min": min(timings), "max": max(timings)}
+
+    if hasattr(bench, "teardown"):
+        bench.teardown(*params)
+    return result
+
+
+def run_suite(pattern:Optional[str]=None, repeat:int=5) -> dict:
+    """ Run every discovered benchmark with each combination of its parameters."""
+    results = {}
+    for name, cls, method in discover(pattern):
+        for params in _param_combinations(cls):
+            key = f"{name}({', '.join(map(str, params))})" if len(params) > 0 else name
+            results[key] = run_benchmark(cls, method, params, repeat)
+            logging.info(f"{key}: {_format(results[key])}")
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def compare(results:dict, baseline:dict, threshold:float=1.25) -> List[str]:
+    """
+        List the benchmarks whose value grew by more than `threshold` times their baseline value.
+    """
+    regressions = []
+    for key, result in results["results"].items():
+        reference = baseline["results"].get(key)
+        if reference is None or reference["value"] == 0:
+            continue
+        ratio = result["value"] / reference["value"]
+        if ratio > threshold:
+            regressions.append(f"{key}: {_format(reference)} -> {_format(result)} (x{ratio:.2f})")
+    return regressions
+
+
+def _format(result:dict) -> str:
+    if result["unit"] == "bytes":
+        return f"{result['value'] / 2**20:.2f}MiB"
+    return f"{result['value'] * 1e3:.2f}ms"
+
+
+@click.command()
+@click.option('--bench', 'pattern', default=None, help="Regular expression filtering benchmark names.")
+@click.option('--repeat', default=5, help="Amount of repeats of time benchmarks.")
+@click.option('--output', default=str(BENCHMARKS_DIR / "latest.json"), help="Path of the JSON results.")
+@click.option('--baseline', default=None, help="Previous results to compare with.")
+@click.option('--threshold', default=1.25, help="Ratio to baseline above which a benchmark regressed.")
+def main(pattern:str, repeat:int, output:str, baseline:str, threshold:float):
+    results = run_suite(pattern, repeat)
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as fp:
+        json.dump(results, fp, indent=2)
+    logging.info(f"Results saved in {output}")
+
+    if baseline is not None:
+        with open(baseline, 'r') as fp:
+            regressions = compare(results, json.load(fp), threshold)
+        for regression in regressions:
+            logging.warning(f"Regression: {regression}")
+        if len(regressions) > 0:
+            raise click.ClickException(f"{len(regressions)} benchmarks regressed.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(**cfg.LOGGING_CONFIG)
+    main()
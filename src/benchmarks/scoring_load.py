@@ -0,0 +1,130 @@
+""" Load generator of the local scoring service.
+
+ Client threads post the next bars of their symbols to the service over HTTP,
+ each symbol being owned by a single client so that its bars arrive in time order.
+ Client side latencies and throughput are reported against the p99 latency target.
+
+    python -m src.benchmarks.scoring_load --symbols 20 --bars 50 --clients 8
+"""
+
+import json
+import logging
+import threading
+import time
+import urllib.request
+from typing import Dict
+
+import click
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+
+
+def post_bars(url:str, updates:list, timeout:float=cfg.SCORING_TIMEOUT_S) -> list:
+    """ Post (symbol, bar dict) updates to the /score endpoint and return their scores."""
+    payload = json.dumps({"bars": [{"symbol": symbol, "bar": bar} for symbol, bar in updates]}).encode()
+    request = urllib.request.Request(f"{url}/score", data=payload, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())["scores"]
+
+
+def run_load(url:str, bars:Dict[str, pd.DataFrame], n_clients:int=8, bars_per_request:int=1) -> dict:
+    """
+        Post every bar to the scoring service from concurrent clients.
+
+        Parameters
+        ----------
+        url: str
+            i.e "http://127.0.0.1:8765"
+        bars: dict
+            {symbol: bars to score in time order, with OHLCV columns}
+        n_clients: int
+            Amount of concurrent client threads. Symbols are spread among clients.
+        bars_per_request: int
+            Amount of consecutive bars of a symbol posted in a single request
+
+        Returns
+        -------
+        dict
+            Amount of scored bars, throughput and client side latency percentiles in milliseconds
+    """
+    symbols = list(bars)
+    latencies, scores, errors = [], {}, []
+    lock = threading.Lock()
+
+    def client(owned):
+        for symbol in owned:
+            records = bars[symbol][cfg.OHLCV].to_dict("records")
+            for i in range(0, len(records), bars_per_request):
+                updates = [(symbol, record) for record in records[i:i + bars_per_request]]
+                start = time.perf_counter()
+                try:
+                    result = post_bars(url, updates)
+                except Exception as e:
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+                    scores.setdefault(symbol, []).extend(result)
+
+    threads = [threading.Thread(target=client, args=(symbols[i::n_clients],)) for i in range(n_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1e3
+    n_scored = sum(len(s) for s in scores.values())
+    return {
+        "scored": n_scored,
+        "errors": len(errors),
+        "bars_per_s": n_scored / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) > 0 else None,
+        "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) > 0 else None,
+        "scores": scores,
+    }
+
+
+@click.command()
+@click.option('--symbols', 'n_symbols', default=20, help="Amount of synthetic symbols served.")
+@click.option('--history', default=500, help="Amount of bars each model is fitted on.")
+@click.option('--bars', 'n_bars', default=50, help="Amount of bars scored per symbol.")
+@click.option('--clients', 'n_clients', default=8, help="Amount of concurrent clients.")
+@click.option('--bars-per-request', default=1, help="Amount of bars of a symbol posted together.")
+@click.option('--target-p99-ms', default=cfg.INFERENCE_P99_TARGET_MS, help="Client side p99 latency target.")
+def main(n_symbols:int, history:int, n_bars:int, n_clients:int, bars_per_request:int, target_p99_ms:float):
+    from src.data.labeling import class_name, compute_labels
+    from src.data.synthetic import generate_universe
+    from src.models.scoring_service import ScoringService, fit_plan, serve
+
+    universe = {symbol: df.set_index(cfg.DATE) for symbol, df in generate_universe(n_symbols, history + n_bars, seed=0)}
+    plans = {}
+    for symbol, ohlcv in universe.items():
+        labels = compute_labels(ohlcv.iloc[:history], [1], [cfg.BREAKEVEN], [])[class_name(1, cfg.BREAKEVEN)]
+        plans[symbol] = fit_plan(ohlcv.iloc[:history], labels)
+
+    service = ScoringService(plans)
+    server = serve(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://{cfg.SCORING_HOST}:{server.server_address[1]}"
+        results = run_load(url, {symbol: ohlcv.iloc[history:] for symbol, ohlcv in universe.items()},
+                           n_clients=n_clients, bars_per_request=bars_per_request)
+    finally:
+        server.shutdown()
+        service.stop()
+
+    logging.info(f"{results['scored']} bars scored ({results['errors']} errors), {results['bars_per_s']:.1f} bars/s, "
+                 f"client p50={results['p50_ms']:.2f}ms p99={results['p99_ms']:.2f}ms")
+    logging.info(f"Service: {service.stats()}")
+    if results["errors"] > 0 or results["p99_ms"] > target_p99_ms:
+        raise click.ClickException(f"Scoring errors or p99 latency above target ({target_p99_ms}ms).")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(**cfg.LOGGING_CONFIG)
+    main()
@@ -0,0 +1,138 @@
+""" Startup time of the command line entry points.
+
+ Each entry point module is imported in a fresh interpreter with `python -X importtime`,
+ whose report gives the cumulative import time of the module and of its heaviest
+ dependencies. Import times above the budget of an entry point fail the run, so that
+ heavy libraries or API clients loaded at import time are caught.
+
+    python -m src.benchmarks.startup
+    python -m src.benchmarks.startup src.data.make_dataset --repeat 5
+"""
+
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import click
+import numpy as np
+
+import src.config as cfg
+
+# {entry point module: import time budget in milliseconds}
+ENTRY_POINTS = {
+    "src.data.make_dataset": 600,
+    "src.features.build_features": 1300,
+    "src.models.train_model": 1300,
+    "src.models.scoring_service": 1300,
+    "src.benchmarks.runner": 300,
+    "src.benchmarks.scoring_load": 600,
+}
+# Modules which must only be loaded on first use (API clients, indicators, plots)
+LAZY_MODULES = ["alpha_vantage", "finta", "plotly"]
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def parse_importtime(stderr:str) -> List[dict]:
+    """ Self and cumulative import times (microseconds), nesting depth and name of each module of an importtime report."""
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is not None:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({"module": name, "self_us": int(self_us), "cumulative_us": int(cumulative_us),
+                            "depth": len(indent) // 2})
+    return modules
+
+
+def import_profile(module:str) -> List[dict]:
+    """ Import a module in a fresh interpreter and return its importtime report (see `parse_importtime`)."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(Path(cfg.PROJECT_DIR).resolve()),
+                                                                    os.environ.get("PYTHONPATH")]))}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env, cwd=cfg.PROJECT_DIR)
+    if result.returncode != 0:
+        raise RuntimeError(f"Import of {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def measure_startup(module:str, repeat:int=3, top:int=5) -> dict:
+    """
+        Import time of an entry point module.
+
+        Parameters
+        ----------
+        module: str
+            i.e "src.data.make_dataset"
+        repeat: int
+            Amount of fresh interpreters, the median import time is kept
+        top: int
+            Amount of heaviest top-level dependencies reported
+
+        Returns
+        -------
+        dict
+            Median import time in milliseconds, heaviest dependencies of the last run and
+            lazy modules (see LAZY_MODULES) loaded at import
+    """
+    times = []
+    for _ in range(repeat):
+        profile = import_profile(module)
+        total = next(m for m in reversed(profile) if m["module"] == module)
+        times.append(total["cumulative_us"] / 1e3)
+    dependencies = sorted([m for m in profile if m["depth"] <= 1 and m["module"] != module],
+                          key=lambda m: m["cumulative_us"], reverse=True)
+    names = {m["module"] for m in profile}
+    return {
+        "module": module,
+        "import_ms": float(np.median(times)),
+        "heaviest": {m["module"]: m["cumulative_us"] / 1e3 for m in dependencies[:top]},
+        "lazy_loaded": [lazy for lazy in LAZY_MODULES if lazy in names],
+    }
+
+
+def check_budgets(results:List[dict], budgets:Dict[str, float], scale:float=1.) -> List[str]:
+    """ Messages of the entry points above their budget (multiplied by scale) or loading lazy modules."""
+    failures = []
+    for result in results:
+        budget = budgets.get(result["module"])
+        if budget is not None and result["import_ms"] > budget * scale:
+            failures.append(f"{result['module']} imports in {result['import_ms']:.0f}ms, budget {budget * scale:.0f}ms")
+        if len(result["lazy_loaded"]) > 0:
+            failures.append(f"{result['module']} loads {result['lazy_loaded']} at import")
+    return failures
+
+
+@click.command()
+@click.argument('modules', nargs=-1, type=click.STRING)
+@click.option('--repeat', default=3, help="Amount of fresh interpreters per entry point.")
+@click.option('--budget-scale', default=1., help="Multiplier of the budgets, i.e for slower machines.")
+@click.option('--output', default=None, help="Save results as JSON in this path.")
+def main(modules:tuple, repeat:int, budget_scale:float, output:Optional[str]):
+    modules = list(modules) or list(ENTRY_POINTS)
+    results = []
+    for module in modules:
+        result = measure_startup(module, repeat=repeat)
+        results.append(result)
+        heaviest = ", ".join(f"{name} {ms:.0f}ms" for name, ms in result["heaviest"].items())
+        logging.info(f"{module:>30} {result['import_ms']:7.0f}ms (budget {ENTRY_POINTS.get(module, float('nan')) * budget_scale:.0f}ms) "
+                     f"| {heaviest}")
+
+    if output is not None:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w") as fp:
+            json.dump(results, fp, indent=2)
+    failures = check_budgets(results, ENTRY_POINTS, budget_scale)
+    for failure in failures:
+        logging.error(failure)
+    if len(failures) > 0:
+        raise click.ClickException(f"{len(failures)} startup regressions.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(**cfg.LOGGING_CONFIG)
+    main()
@@ -6,16 +6,55 @@ PROJECT_DIR = os.path.join(os.path.dirname(__file__), os.pardir)
 DATA_DIR = os.path.join(PROJECT_DIR, "data")
 RAW_DATA_DIR = os.path.join(DATA_DIR, "raw") 
 PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
+MODELS_DIR = os.path.join(PROJECT_DIR, "models")
 
 DOTENV_PATH = os.path.join(PROJECT_DIR, '.env')
 dotenv.load_dotenv(DOTENV_PATH)
 
 # Seuil de rentabilité d'une évolution quotidienne
 BREAKEVEN = 0.003
+# Coût d'un aller-retour, en fraction du capital échangé
+TRANSACTION_COST = 0.001
+
+# Labeling parameters (see src/data/labeling.py)
+LABEL_HORIZONS = [1, 5, 10] # Amount of held bars
+LABEL_THRESHOLDS = [BREAKEVEN] # Forward return thresholds of classes
+LABEL_BARRIERS = [(0.02, 0.01)] # (take profit, stop loss) of triple barrier labels
+LABELS_HORIZON = 1 # Held bars of the LABELS training labels (next day evolution)
 
 #Features generator parameters
 SCALING_WINDOW = 10
 SMA_DEFAULT_WINDOW = 3
+CORRELATION_THRESHOLD = 0.95 # Absolute correlation above which a feature is redundant
+CHUNK_SIZE = 100000 # Rows per block of the chunked features pipeline (see src/features/chunked.py)
+FEATURE_STORE_ENCODING = "auto" # Quantization of the feature store columns (see src/data/feature_store.py)
+FEATURE_STORE_MAX_ERROR = 1e-3 # Largest absolute decoding error of the "auto" quantization
+FEATURE_STORE_BLOCK_ROWS = 65536 # Rows per compressed block of the feature store
+FRACDIFF_D_VALUES = [0.4] # Orders of the fractional differences (see src/features/fractional_diff.py)
+FRACDIFF_THRESHOLD = 1e-4 # Weights of the fractional differencing kernel below this value are cut off
+FRACDIFF_MAX_WIDTH = 10000 # Largest width of the fractional differencing kernel
+DRIFT_BINS = 10 # Quantile bins of the reference distribution of each feature (see src/features/drift.py)
+DRIFT_PSI_THRESHOLD = 0.25 # Population stability index above which a feature drifts
+DRIFT_KS_THRESHOLD = 0.2 # Largest gap between binned distribution functions above which a feature drifts
+DRIFT_MIN_COUNT = 50 # Amount of scored rows before drifts are flagged
+
+# Scoring latency target of a single bar with the compiled inference plan (milliseconds)
+INFERENCE_P99_TARGET_MS = 150
+
+# Local scoring service (see src/models/scoring_service.py)
+SCORING_HOST = "127.0.0.1"
+SCORING_PORT = 8765
+SCORING_MAX_BATCH_SIZE = 256 # Maximum amount of bars scored together
+SCORING_MAX_WAIT_MS = 2 # Time waited for other bars to batch with
+SCORING_TIMEOUT_S = 30
+
+# Data layer metrics (see src/data/metrics.py)
+AV_CALLS_PER_MINUTE = 5 # Alpha Vantage quotas, usage is reported as a fraction of them
+AV_CALLS_PER_DAY = 25
+METRICS_LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+METRICS_DUMP_INTERVAL_S = 60
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 8766
 
 # CONFIG VARIABLES - This values are filled dynamically by the pipeline
 CURRENT_COLS = None # To be filled after each step of the transformation
@@ -29,8 +68,8 @@ SELECTED_NAMES = None # Filled by Selectors
 SELECTED_COLS = None
 PASSTHROUGH_NAME = "passthrough"
 
-SORT_STOCK_ASCENDING = False
-SHIFT = 1 if SORT_STOCK_ASCENDING else -1
+SORT_STOCK_ASCENDING = True
+SHIFT = -1 if SORT_STOCK_ASCENDING else 1 # Shift bringing the next day values on the current day
 
 
 DAILY_COMPACT = {
@@ -61,6 +100,13 @@ INTRADAY_1MIN_FULL ={
 
 
 STOCK_SETTINGS = DAILY_COMPACT
+STOCK_INGEST_ERRORS = "warn" # Handling of invalid rows of loaded or downloaded data (see src/data/validation.py)
+
+# Regular trading session, in exchange local time (see src/data/resampling.py)
+SESSION_OPEN = "09:30"
+SESSION_CLOSE = "16:00"
+# Higher timeframes whose features are joined onto each bar (see src/features/multi_timeframe.py)
+TIMEFRAMES = ["60min", "daily"]
 
 #Columns names
 DATE = "date"
@@ -75,8 +121,8 @@ NEXT_DAY_EVOLUTION_RATIO = "next_day_evolution_ratio"
 
 DOHLCV = [DATE, OPEN, HIGH, LOW, CLOSE, VOLUME]
 DOHLC = [DATE, OPEN, HIGH, LOW, CLOSE]
-OHLC = [OPEN, HIGH, LOW, CLOSE, VOLUME]
-OHLCV = [OPEN, HIGH, LOW, CLOSE]
+OHLC = [OPEN, HIGH, LOW, CLOSE]
+OHLCV = [OPEN, HIGH, LOW, CLOSE, VOLUME]
 
 RENAME_AV_COLUMNS = {
     "1. open": OPEN,
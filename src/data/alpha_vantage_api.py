@@ -1,21 +1,33 @@
 import os
-import pandas as pd
 import logging
-import dotenv
 import time
-
-from alpha_vantage.timeseries import TimeSeries
-from alpha_vantage.techindicators import TechIndicators
+from functools import lru_cache
 
 import src.config as cfg
+from src.data.metrics import METRICS
+
+#tools.set_credentials_file(username = plotly_username, api_key = plotly_api_key)
 
-dotenv.load_dotenv(cfg.DOTENV_PATH)
-alpha_vantage_api_key = os.environ.get("AV_API_KEY")
 
+@lru_cache(maxsize=None)
+def time_series():
+    """ Alpha Vantage TimeSeries client, built on first call (`.env` is loaded by `src.config`)."""
+    from alpha_vantage.timeseries import TimeSeries
+    return TimeSeries(os.environ.get("AV_API_KEY"), output_format='pandas')
 
-ts = TimeSeries(alpha_vantage_api_key, output_format='pandas')
-ti = TechIndicators(alpha_vantage_api_key, output_format ='pandas')
-#tools.set_credentials_file(username = plotly_username, api_key = plotly_api_key)
+
+@lru_cache(maxsize=None)
+def tech_indicators():
+    """ Alpha Vantage TechIndicators client, built on first call."""
+    from alpha_vantage.techindicators import TechIndicators
+    return TechIndicators(os.environ.get("AV_API_KEY"), output_format='pandas')
+
+
+def _payload_size(data) -> int:
+    """ In-memory size in bytes of a decoded response, not the bytes received: the client does not expose the raw response."""
+    if hasattr(data, "memory_usage"):
+        return int(data.memory_usage(deep=True).sum())
+    return len(repr(data).encode())
 
 
 def get_data_from_alpha_vantage(symbol, mode="daily", adjusted=False, interval='15min', outputsize='compact'):
@@ -49,29 +61,40 @@ def get_data_from_alpha_vantage(symbol, mode="daily", adjusted=False, interval='
             Dictionnay including: '1.information', '2. Symbol', '3. Last refreshed', '4. Output Size', '5. Time Zone'
     """
 
+    ts = time_series()
+    labels = {"mode": mode, "symbol": symbol}
     ping = 0
     while ping < 3:
+        METRICS.record_call()
+        METRICS.inc("api_calls", **labels)
         try:
-            if mode == "daily" and not adjusted:
-                data, meta_data = ts.get_daily(symbol=symbol, outputsize=outputsize)
-            elif mode == "intraday" and not adjusted:
-                data, meta_data = ts.get_intraday(symbol=symbol, interval=interval, outputsize=outputsize)
-            elif mode == "daily" and adjusted:
-                data, meta_data = ts.get_daily_adjusted(symbol=symbol, outputsize=outputsize)
-            elif mode == "last":
-                data, meta_data = ts.get_quote_endpoint(symbol=symbol)
-            elif mode == "symbol_search":
-                data, metadata = ts.get_symbol_search(symbol)
-                if len(data) > 1:
-                  #Select the best matching symbol
-                  data = data.loc[data.index == data['9. matchScore'].astype(float).idxmax()].to_dict('list')
+            with METRICS.timer("api_latency_ms", **labels):
+                if mode == "daily" and not adjusted:
+                    data, meta_data = ts.get_daily(symbol=symbol, outputsize=outputsize)
+                elif mode == "intraday" and not adjusted:
+                    data, meta_data = ts.get_intraday(symbol=symbol, interval=interval, outputsize=outputsize)
+                elif mode == "daily" and adjusted:
+                    data, meta_data = ts.get_daily_adjusted(symbol=symbol, outputsize=outputsize)
+                elif mode == "last":
+                    data, meta_data = ts.get_quote_endpoint(symbol=symbol)
+                elif mode == "symbol_search":
+                    data, metadata = ts.get_symbol_search(symbol)
+                    if len(data) > 1:
+                      #Select the best matching symbol
+                      data = data.loc[data.index == data['9. matchScore'].astype(float).idxmax()].to_dict('list')
+            METRICS.inc("api_payload_bytes", _payload_size(data), **labels)
             break
         except Exception as e:
+            METRICS.inc("api_errors", error=e.__class__.__name__, **labels)
             logging.error("An issue occured during Alpha Vantage API call (get_data)")
             logging.error(repr(e))
             ping += 1
+            if ping < 3:
+                METRICS.inc("api_retries", **labels)
+            METRICS.inc("api_backoff_s", 1, **labels)
             time.sleep(1)
     if ping == 3:
+        METRICS.inc("api_failures", **labels)
         raise ConnectionError("Impossible to connect to Alpha Vantage API.")
     if mode != "symbol_search":
       data = data.rename(columns = cfg.RENAME_AV_COLUMNS)
@@ -0,0 +1,442 @@
+""" Quantized and compressed on-disk format of feature matrices.
+
+ Columns are stored by blocks of rows. Each (block, column) chunk is quantized
+ with its own scale and offset, byte-shuffled (the i-th bytes of all the values
+ are stored together, which makes them compress much better) and compressed
+ with zlib. The index of the chunks is written as a JSON footer, so that
+ matrices are streamed block by block and any column or range of rows is read
+ without decompressing the others. Chunks are decoded directly into float32
+ arrays, ready for training.
+
+ Encodings:
+    "int8", "int16": values mapped linearly on the integer range of the block, the smallest
+                     integer marking NaN. The error is at most half a quantization step,
+                     (max - min) / 508 or (max - min) / 131068 of the chunk.
+    "float16": half precision, for columns within +-65504.
+    "float32": lossless for float32 values. Chunks of other encodings holding infinite values
+               (or values beyond the float16 range) fall back to it.
+    "auto": the smallest of "int8", "int16" and "float32" whose error stays below `max_error`,
+            chosen chunk by chunk: bounded scaled columns (i.e min-max scalers output in [0, 1])
+            are stored in 16 bits while raw indicators keep their precision. The error of integer
+            encodings includes the float32 rounding of the decoding, so that columns of a large
+            level and a narrow range (i.e prices) stay in float32.
+
+ File layout:
+
+    MAGIC | chunk | chunk | ... | JSON footer | footer length (uint64) | MAGIC
+
+    python -m src.data.feature_store data/processed/aapl_all_features.csv --encoding auto --report
+"""
+
+import json
+import logging
+import mmap
+import struct
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import click
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+
+MAGIC = b"SAFFEATS"
+FORMAT_VERSION = 1
+SUFFIX = ".feat"
+ENCODINGS = {"float32": np.float32, "float16": np.float16, "int16": np.int16, "int8": np.int8}
+AUTO = "auto"
+FLOAT16_MAX = float(np.finfo(np.float16).max)
+
+
+# ----------- Chunks -----------
+
+def _shuffle(codes:np.ndarray) -> bytes:
+    """ Bytes of codes grouped by significance: all first bytes, then all second bytes, ..."""
+    if codes.itemsize == 1:
+        return codes.tobytes()
+    return np.ascontiguousarray(codes.view(np.uint8).reshape(-1, codes.itemsize).T).tobytes()
+
+
+def _unshuffle(raw:bytes, dtype) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    data = np.frombuffer(raw, dtype=np.uint8)
+    if dtype.itemsize == 1:
+        return data.view(dtype)
+    n = len(data) // dtype.itemsize
+    codes = np.empty(n, dtype=dtype)
+    # One strided copy per byte plane is several times faster than a transposed copy
+    planes = codes.view(np.uint8).reshape(n, dtype.itemsize)
+    for k in range(dtype.itemsize):
+        planes[:, k] = data[k * n:(k + 1) * n]
+    return codes
+
+
+def _quantization_error(low:float, high:float, dtype) -> float:
+    """ Largest decoding error of values within [low, high] mapped on an integer type."""
+    return (high - low) / (4 * np.iinfo(dtype).max)
+
+
+def _decoding_error(low:float, high:float, dtype) -> float:
+    """ Largest distance between values within [low, high] decoded from an integer type and their float32 value:
+    half a quantization step plus the float32 roundings of the decoding, which grow with the level of the values."""
+    eps = float(np.finfo(np.float32).eps)
+    return _quantization_error(low, high, dtype) + ((high - low) / 2 + 2 * max(abs(low), abs(high))) * eps
+
+
+def quantize(values:np.ndarray, encoding:str, max_error:float=cfg.FEATURE_STORE_MAX_ERROR) -> tuple:
+    """
+        Encode the values of a chunk.
+
+        Parameters
+        ----------
+        values: np.ndarray of float of shape (n_rows,)
+        encoding: str
+            One of ENCODINGS keys or "auto"
+        max_error: float
+            Largest absolute decoding error of the "auto" encoding
+
+        Returns
+        -------
+        codes: np.ndarray
+            Encoded values
+        encoding: str
+            Encoding used, "float32" when the requested one can not represent the values
+        scale, offset: float
+            Values are decoded as `codes * scale + offset` for integer encodings
+    """
+    if encoding not in ENCODINGS and encoding != AUTO:
+        raise ValueError(f"Unknown encoding {encoding}. Available encodings: {list(ENCODINGS) + [AUTO]}")
+    values = np.asarray(values, dtype=float)
+    nans = np.isnan(values)
+    finite = values[~nans]
+    if encoding != "float32" and not np.isfinite(finite).all():
+        encoding = "float32"
+    if encoding == "float16" and len(finite) > 0 and np.abs(finite).max() > FLOAT16_MAX:
+        encoding = "float32"
+    low, high = (finite.min(), finite.max()) if len(finite) > 0 and encoding != "float32" else (0., 0.)
+    if encoding == AUTO:
+        encoding = next((name for name in ("int8", "int16") if _decoding_error(low, high, ENCODINGS[name]) <= max_error),
+                        "float32")
+    if encoding in ("float32", "float16"):
+        return values.astype(ENCODINGS[encoding]), encoding, 1., 0.
+
+    info = np.iinfo(ENCODINGS[encoding])
+    # The offset is added in float32 when decoding: it is rounded first so that the codes account for it
+    offset = float(np.float32((high + low) / 2))
+    scale = max(high - offset, offset - low) / info.max if high > low else 1.
+    codes = np.rint((np.where(nans, offset, values) - offset) / scale)
+    codes = np.clip(codes, -info.max, info.max).astype(info.dtype)
+    codes[nans] = info.min
+    return codes, encoding, float(scale), float(offset)
+
+
+def dequantize(codes:np.ndarray, encoding:str, scale:float, offset:float, out:np.ndarray) -> np.ndarray:
+    """ Decode codes of a chunk into the float32 array out."""
+    if encoding in ("float32", "float16"):
+        out[:] = codes
+        return out
+    np.multiply(codes, np.float32(scale), out=out, casting="unsafe")
+    out += np.float32(offset)
+    out[codes == np.iinfo(codes.dtype).min] = np.nan
+    return out
+
+
+# ----------- Writing -----------
+
+class FeatureStoreWriter:
+    """Stream a feature matrix to a feature store file, block by block.
+
+    Also usable as the sink of `src.features.chunked.chunked_fit_transform`.
+
+    Parameters
+    ----------
+    path: str or Path
+    encoding: str or dict
+        Encoding of all the columns (see ENCODINGS and "auto"), or {column: encoding} with
+        "float32" for missing columns
+    max_error: float
+        Largest absolute decoding error of the "auto" encoding
+    block_rows: int
+        Amount of rows of a block, the unit of decompression
+    level: int
+        zlib compression level
+
+    Example:
+    --------
+    ```Python
+        with FeatureStoreWriter(path, encoding="int16") as writer:
+            writer.write(X)
+    ```
+    """
+
+    def __init__(self, path, encoding:Union[str, Dict[str, str]]=cfg.FEATURE_STORE_ENCODING,
+                 max_error:float=cfg.FEATURE_STORE_MAX_ERROR, block_rows:int=cfg.FEATURE_STORE_BLOCK_ROWS,
+                 level:int=6) -> None:
+        self.path = Path(path)
+        self.encoding = encoding
+        self.max_error = max_error
+        self.block_rows = block_rows
+        self.level = level
+        self.columns = None
+        self.n_rows = 0
+        self._blocks = []
+        self._pending = []
+        self._n_pending = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = open(self.path, "wb")
+        self._fp.write(MAGIC)
+
+    def _encoding(self, column:str) -> str:
+        if isinstance(self.encoding, str):
+            return self.encoding
+        return self.encoding.get(column, "float32")
+
+    def write(self, block:pd.DataFrame) -> None:
+        if self.columns is None:
+            self.columns = [str(col) for col in block.columns]
+        elif [str(col) for col in block.columns] != self.columns:
+            raise ValueError("Blocks written to a feature store must have the same columns.")
+        self._pending.append(block.to_numpy(dtype=float))
+        self._n_pending += len(block)
+        while self._n_pending >= self.block_rows:
+            self._flush(self.block_rows)
+
+    def _flush(self, n_rows:int) -> None:
+        values = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+        block, rest = values[:n_rows], values[n_rows:]
+        self._pending, self._n_pending = ([rest] if len(rest) > 0 else []), len(rest)
+
+        chunks = []
+        for j, column in enumerate(self.columns):
+            codes, encoding, scale, offset = quantize(block[:, j], self._encoding(column), self.max_error)
+            payload = zlib.compress(_shuffle(codes), self.level)
+            chunks.append([encoding, scale, offset, self._fp.tell(), len(payload)])
+            self._fp.write(payload)
+        self._blocks.append({"rows": [self.n_rows, self.n_rows + len(block)], "chunks": chunks})
+        self.n_rows += len(block)
+
+    def close(self) -> Path:
+        if self._n_pending > 0:
+            self._flush(self._n_pending)
+        footer = json.dumps({
+            "version": FORMAT_VERSION,
+            "columns": self.columns or [],
+            "n_rows": self.n_rows,
+            "block_rows": self.block_rows,
+            "blocks": self._blocks,
+        }).encode()
+        self._fp.write(footer)
+        self._fp.write(struct.pack("<Q", len(footer)))
+        self._fp.write(MAGIC)
+        self._fp.close()
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_features(path, X:pd.DataFrame, encoding:Union[str, Dict[str, str]]=cfg.FEATURE_STORE_ENCODING,
+                   max_error:float=cfg.FEATURE_STORE_MAX_ERROR, block_rows:int=cfg.FEATURE_STORE_BLOCK_ROWS,
+                   level:int=6) -> Path:
+    """ Save a feature matrix in a feature store file (see FeatureStoreWriter). The index is not saved."""
+    writer = FeatureStoreWriter(path, encoding, max_error, block_rows, level)
+    writer.write(X)
+    return writer.close()
+
+
+# ----------- Reading -----------
+
+class FeatureStore:
+    """Random access to the columns and rows of a feature store file.
+
+    Example:
+    --------
+    ```Python
+        with FeatureStore(path) as store:
+            X = store.read(["RSI_14 period RSI_minmax_scaler"], start=-10000)
+    ```
+    """
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        tail = len(MAGIC) + 8
+        if self._map[:len(MAGIC)] != MAGIC or self._map[-len(MAGIC):] != MAGIC:
+            self._map.close()
+            raise ValueError(f"{self.path} is not a feature store file.")
+        (footer_length,) = struct.unpack("<Q", self._map[-tail:-len(MAGIC)])
+        footer = json.loads(self._map[-tail - footer_length:-tail])
+        self.columns = footer["columns"]
+        self.n_rows = footer["n_rows"]
+        self.block_rows = footer["block_rows"]
+        self._blocks = footer["blocks"]
+        self._position = {column: j for j, column in enumerate(self.columns)}
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @property
+    def shape(self):
+        return self.n_rows, len(self.columns)
+
+    def encodings(self) -> Dict[str, List[str]]:
+        """ Encodings of the chunks of each column."""
+        return {column: sorted({block["chunks"][j][0] for block in self._blocks})
+                for j, column in enumerate(self.columns)}
+
+    def read(self, columns:Optional[List[str]]=None, start:int=0, stop:Optional[int]=None) -> np.ndarray:
+        """
+            Decode columns over a range of rows.
+
+            Parameters
+            ----------
+            columns: list of str, default=None
+                Columns to read, all of them if None
+            start, stop: int
+                Range of rows, as a slice (negative values count from the end)
+
+            Returns
+            -------
+            np.ndarray of float32 of shape (n_rows, n_columns), in Fortran order so that each column is contiguous
+        """
+        columns = self.columns if columns is None else columns
+        missing = [column for column in columns if column not in self._position]
+        if len(missing) > 0:
+            raise KeyError(f"Columns {missing} are not in {self.path}.")
+        start, stop, _ = slice(start, stop).indices(self.n_rows)
+        stop = max(start, stop)
+        out = np.empty((stop - start, len(columns)), dtype=np.float32, order="F")
+        buffer = np.empty(self.block_rows, dtype=np.float32)
+        for block in self._blocks:
+            first, last = block["rows"]
+            if last <= start or first >= stop:
+                continue
+            low, high = max(first, start), min(last, stop)
+            whole = low == first and high == last
+            for k, column in enumerate(columns):
+                encoding, scale, offset, position, length = block["chunks"][self._position[column]]
+                codes = _unshuffle(zlib.decompress(self._map[position:position + length]), ENCODINGS[encoding])
+                target = out[low - start:high - start, k]
+                if whole:
+                    dequantize(codes, encoding, scale, offset, target)
+                else:
+                    # Partial blocks are decoded in a buffer first
+                    decoded = dequantize(codes, encoding, scale, offset, buffer[:last - first])
+                    target[:] = decoded[low - first:high - first]
+        return out
+
+    def read_frame(self, columns:Optional[List[str]]=None, start:int=0, stop:Optional[int]=None) -> pd.DataFrame:
+        """ Decode columns over a range of rows (see `read`) as a DataFrame indexed by row numbers."""
+        columns = self.columns if columns is None else columns
+        start, stop, _ = slice(start, stop).indices(self.n_rows)
+        values = self.read(columns, start, stop)
+        return pd.DataFrame(values, columns=columns, index=pd.RangeIndex(start, start + len(values)))
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_features(path, columns:Optional[List[str]]=None) -> pd.DataFrame:
+    """ Load the columns of a feature store file as a float32 DataFrame."""
+    with FeatureStore(path) as store:
+        return store.read_frame(columns)
+
+
+# ----------- Report -----------
+
+def _throughput(read, n_bytes:int, repeat:int=3) -> float:
+    """ Decoded float32 megabytes per second of the fastest of repeated reads."""
+    seconds = min(_timed(read) for _ in range(repeat))
+    return n_bytes / 2**20 / seconds
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def format_report(X:pd.DataFrame, encodings:Tuple[str, ...]=("auto", "int8", "int16", "float16", "float32"),
+                  directory:Optional[str]=None, block_rows:int=cfg.FEATURE_STORE_BLOCK_ROWS) -> List[dict]:
+    """
+        Size, decode throughput and error of a feature matrix saved as CSV, plain float32 and feature stores.
+
+        Parameters
+        ----------
+        X: pd.DataFrame
+            Feature matrix, i.e the output of FEATURES_PIPELINE
+        encodings: tuple of str
+            Encodings of the feature stores compared
+        directory: str, default=None
+            Directory of the written files, a temporary directory if None
+
+        Returns
+        -------
+        list of dict
+            `format`, `bytes`, `ratio` (CSV size over format size), `read_mb_s` (decoded float32 MB per second)
+            and `max_error` (largest absolute error against the float64 values)
+    """
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        tmp = Path(tmp)
+        values = X.to_numpy(dtype=float)
+        n_bytes = values.size * 4
+        X.to_csv(tmp / "features.csv", index=False)
+        np.save(tmp / "features.npy", values.astype(np.float32))
+        csv_size = (tmp / "features.csv").stat().st_size
+
+        def error(decoded):
+            with np.errstate(invalid="ignore"):
+                diff = np.abs(np.asarray(decoded, dtype=float) - values)
+            return float(np.nanmax(diff)) if np.isfinite(diff).any() else 0.
+
+        reports = [
+            {"format": "csv", "bytes": csv_size,
+             "read_mb_s": _throughput(lambda: pd.read_csv(tmp / "features.csv", dtype=np.float32), n_bytes, repeat=1),
+             "max_error": error(pd.read_csv(tmp / "features.csv").values)},
+            {"format": "float32", "bytes": (tmp / "features.npy").stat().st_size,
+             "read_mb_s": _throughput(lambda: np.load(tmp / "features.npy"), n_bytes),
+             "max_error": error(np.load(tmp / "features.npy"))},
+        ]
+        for encoding in encodings:
+            path = write_features(tmp / f"features_{encoding}{SUFFIX}", X, encoding, block_rows=block_rows)
+            with FeatureStore(path) as store:
+                reports.append({"format": encoding, "bytes": path.stat().st_size,
+                                "read_mb_s": _throughput(store.read, n_bytes), "max_error": error(store.read())})
+    for report in reports:
+        report["ratio"] = csv_size / report["bytes"]
+    return reports
+
+
+@click.command()
+@click.argument('csv_path', type=click.Path(exists=True))
+@click.option('--encoding', default=cfg.FEATURE_STORE_ENCODING, type=click.Choice(list(ENCODINGS) + [AUTO]))
+@click.option('--max-error', default=cfg.FEATURE_STORE_MAX_ERROR, help="Largest decoding error of the auto encoding.")
+@click.option('--output', default=None, help="Path of the feature store, the CSV path with a .feat suffix by default.")
+@click.option('--report', is_flag=True, help="Compare sizes and decode throughputs with CSV and float32.")
+def main(csv_path:str, encoding:str, max_error:float, output:Optional[str], report:bool):
+    X = pd.read_csv(csv_path)
+    path = write_features(Path(csv_path).with_suffix(SUFFIX) if output is None else output, X, encoding, max_error)
+    logging.info(f"{X.shape} features saved in {path} ({path.stat().st_size / 2**20:.1f}MB)")
+    if report:
+        for r in format_report(X):
+            logging.info(f"{r['format']:>8} {r['bytes'] / 2**20:9.1f}MB  ratio {r['ratio']:6.1f}  "
+                         f"read {r['read_mb_s']:8.1f}MB/s  max error {r['max_error']:.2e}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(**cfg.LOGGING_CONFIG)
+    main()
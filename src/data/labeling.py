@@ -0,0 +1,216 @@
+""" Labeling of stock data.
+
+ Labels are computed in time order, whatever the storage order of the data,
+ for several horizons at once. A position is entered at the open of the bar
+ following the labelled one and held for `horizon` bars:
+
+ - forward returns: close of the last held bar over the entry open, minus one,
+ - classes: 1 if the forward return reaches a threshold, 0 otherwise,
+ - triple barrier: 1 if the take profit is hit first, -1 if the stop loss is
+   hit first, 0 if none is hit before the timeout.
+
+ Labels are NaN when the future needed to compute them is not available.
+ Symbols of a universe are stacked in a (bars, symbols) panel so that the
+ whole universe is labelled in one vectorized pass."""
+
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+
+PRICES = [cfg.OPEN, cfg.HIGH, cfg.LOW, cfg.CLOSE]
+
+
+def forward_return_name(horizon:int) -> str:
+    return f"forward_return_{horizon}"
+
+
+def class_name(horizon:int, threshold:float) -> str:
+    return f"{cfg.LABELS}_{horizon}_{threshold}"
+
+
+def barrier_name(horizon:int, take_profit:float, stop_loss:float) -> str:
+    return f"barrier_{horizon}_{take_profit}_{stop_loss}"
+
+
+def _dates(df:pd.DataFrame) -> np.ndarray:
+    return df[cfg.DATE].values if cfg.DATE in df.columns else df.index.values
+
+
+def _to_panel(frames:List[pd.DataFrame]) -> Tuple[Dict[str, np.ndarray], List[np.ndarray]]:
+    """
+        Stack prices of several frames in (bars, symbols) arrays, in time order.
+        Shorter series are padded with NaNs after their last bar.
+
+        Returns
+        -------
+        panel: dict
+            {column: np.ndarray of shape (max length, n_symbols)}
+        orders: list of np.ndarray
+            Positions of the rows of each frame sorted by date
+    """
+    n_rows = max((len(df) for df in frames), default=0)
+    prices = np.full((len(PRICES), n_rows, len(frames)), np.nan)
+    orders = []
+    for s, df in enumerate(frames):
+        order = np.argsort(_dates(df), kind="stable")
+        prices[:, :len(df), s] = df[PRICES].values[order].T
+        orders.append(order)
+    return dict(zip(PRICES, prices)), orders
+
+
+def _lead(a:np.ndarray, k:int) -> np.ndarray:
+    """ Values k bars ahead along the first axis, NaN beyond the end."""
+    out = np.full_like(a, np.nan)
+    if k < len(a):
+        out[:len(a) - k] = a[k:]
+    return out
+
+
+def forward_returns(open_:np.ndarray, close:np.ndarray, horizons:Iterable[int]) -> Dict[int, np.ndarray]:
+    """
+        Returns of positions entered at the next open and exited at the close `horizon` bars later.
+
+        Parameters
+        ----------
+        open_, close: np.ndarray of shape (n_bars, ...)
+            Prices in time order
+        horizons: list of int
+            Amount of held bars
+
+        Returns
+        -------
+        dict
+            {horizon: np.ndarray of returns of the same shape as prices}
+    """
+    entry = _lead(open_, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {h: _lead(close, h) / entry - 1 for h in horizons}
+
+
+def threshold_classes(returns:np.ndarray, thresholds:Iterable[float]) -> Dict[float, np.ndarray]:
+    """ 1 where returns reach the threshold, 0 below, NaN for missing returns."""
+    valid = ~np.isnan(returns)
+    return {th: np.where(valid, (returns >= th).astype(float), np.nan) for th in thresholds}
+
+
+def _first_hit(hits:np.ndarray) -> np.ndarray:
+    """ Index of the first True along the last axis, its length if there is none."""
+    return np.where(hits.any(axis=-1), hits.argmax(axis=-1), hits.shape[-1])
+
+
+def triple_barrier(open_:np.ndarray, high:np.ndarray, low:np.ndarray, horizons:Iterable[int],
+                   take_profit:float, stop_loss:float) -> Dict[int, np.ndarray]:
+    """
+        Triple barrier labels of positions entered at the next open.
+
+        The take profit is hit when a high reaches `entry * (1 + take_profit)`, the stop loss when a low
+        reaches `entry * (1 - stop_loss)`. As intrabar ordering is unknown, a bar hitting both barriers
+        counts as a stop loss.
+
+        Parameters
+        ----------
+        open_, high, low: np.ndarray of shape (n_bars, ...)
+            Prices in time order
+        horizons: list of int
+            Amount of bars before timeout
+        take_profit, stop_loss: float
+            Relative distances of the barriers to the entry price
+
+        Returns
+        -------
+        dict
+            {horizon: np.ndarray of 1, -1, 0 or NaN of the same shape as prices}
+    """
+    horizons = list(horizons)
+    max_horizon = max(horizons)
+    n = len(open_)
+    entry = _lead(open_, 1)
+    # Held bars t+1 ... t+max_horizon of each bar t, on a trailing axis
+    pad = np.full((max_horizon,) + high.shape[1:], np.nan)
+    highs = np.lib.stride_tricks.sliding_window_view(np.concatenate([high[1:], pad]), max_horizon, axis=0)[:n]
+    lows = np.lib.stride_tricks.sliding_window_view(np.concatenate([low[1:], pad]), max_horizon, axis=0)[:n]
+    with np.errstate(invalid="ignore"):
+        first_up = _first_hit(highs >= (entry * (1 + take_profit))[..., None])
+        first_down = _first_hit(lows <= (entry * (1 - stop_loss))[..., None])
+
+    labels = {}
+    for h in horizons:
+        label = np.where(first_down < h, np.where(first_up < first_down, 1., -1.), np.where(first_up < h, 1., 0.))
+        # Positions which are not held for the whole horizon are not labelled
+        label[np.isnan(_lead(high, h)) | np.isnan(entry)] = np.nan
+        labels[h] = label
+    return labels
+
+
+def _label_panel(panel:Dict[str, np.ndarray], horizons:List[int], thresholds:List[float],
+                 barriers:List[Tuple[float, float]]) -> Dict[str, np.ndarray]:
+    labels = {}
+    returns = forward_returns(panel[cfg.OPEN], panel[cfg.CLOSE], horizons)
+    for h in horizons:
+        labels[forward_return_name(h)] = returns[h]
+    for h in horizons:
+        for th, classes in threshold_classes(returns[h], thresholds).items():
+            labels[class_name(h, th)] = classes
+    for take_profit, stop_loss in barriers:
+        for h, label in triple_barrier(panel[cfg.OPEN], panel[cfg.HIGH], panel[cfg.LOW], horizons, take_profit, stop_loss).items():
+            labels[barrier_name(h, take_profit, stop_loss)] = label
+    return labels
+
+
+def compute_universe_labels(universe:Union[Dict[str, pd.DataFrame], Iterable[Tuple[str, pd.DataFrame]]],
+                            horizons:Optional[Iterable[int]]=None, thresholds:Optional[Iterable[float]]=None,
+                            barriers:Optional[Iterable[Tuple[float, float]]]=None) -> Dict[str, pd.DataFrame]:
+    """
+        Label every stock of a universe in one vectorized pass.
+
+        Parameters
+        ----------
+        universe: dict or iterable of (symbol, pd.DataFrame) tuples
+            OHLC data of each symbol, with a `cfg.DATE` column or dates as index, in any order.
+            i.e `generate_universe(...)` or {symbol: Stock(symbol).dohlcv}
+        horizons: list of int, default=None
+            Amount of held bars. Defaults to `cfg.LABEL_HORIZONS`.
+        thresholds: list of float, default=None
+            Thresholds of forward return classes. Defaults to `cfg.LABEL_THRESHOLDS`.
+        barriers: list of (take profit, stop loss) tuples, default=None
+            Triple barriers. Defaults to `cfg.LABEL_BARRIERS`.
+
+        Returns
+        -------
+        dict
+            {symbol: pd.DataFrame of labels with the index and row order of the input data}
+    """
+    horizons = list(cfg.LABEL_HORIZONS if horizons is None else horizons)
+    thresholds = list(cfg.LABEL_THRESHOLDS if thresholds is None else thresholds)
+    barriers = list(cfg.LABEL_BARRIERS if barriers is None else barriers)
+    symbols, frames = zip(*(universe.items() if isinstance(universe, dict) else universe))
+
+    panel, orders = _to_panel(list(frames))
+    labels = _label_panel(panel, horizons, thresholds, barriers)
+
+    stacked = np.stack(list(labels.values()), axis=-1)
+    results = {}
+    for s, (symbol, df, order) in enumerate(zip(symbols, frames, orders)):
+        values = np.empty((len(df), len(labels)))
+        # Back to the row order of the input data
+        values[order] = stacked[:len(df), s]
+        results[symbol] = pd.DataFrame(values, index=df.index, columns=list(labels))
+    return results
+
+
+def compute_labels(dohlcv:pd.DataFrame, horizons:Optional[Iterable[int]]=None, thresholds:Optional[Iterable[float]]=None,
+                   barriers:Optional[Iterable[Tuple[float, float]]]=None) -> pd.DataFrame:
+    """
+        Label a single stock. See `compute_universe_labels`.
+
+        Example:
+        --------
+        ```Python
+            labels = compute_labels(stock.dohlcv, horizons=[1, 5], thresholds=[0.003, 0.01], barriers=[(0.02, 0.01)])
+            labels["labels_5_0.01"]
+        ```
+    """
+    return compute_universe_labels({None: dohlcv}, horizons, thresholds, barriers)[None]
@@ -0,0 +1,271 @@
+""" Metrics of the data layer: API calls, quota usage, storage and cache efficiency.
+
+ Counters and latency histograms are kept in memory by a process-wide registry,
+ `METRICS`, keyed by metric name and labels (i.e mode and symbol of an Alpha Vantage
+ call). Recording a value costs a lock and a dictionary update, histograms have
+ fixed buckets so that their memory does not grow with the amount of observations.
+ Provider quotas are tracked from the times of the calls of the last day.
+
+ Metrics are exposed as JSON, either dumped to a file periodically or served on
+ localhost HTTP:
+
+    GET /metrics  -> {"counters": [...], "histograms": [...], "quota": {...}}
+
+    python -m src.data.make_dataset aapl --metrics-path reports/metrics.json
+"""
+
+import bisect
+import collections
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import src.config as cfg
+
+MINUTE = 60.
+DAY = 24 * 3600.
+
+
+class Histogram:
+    """Count of observations per bucket, with their sum and maximum.
+
+    Parameters
+    ----------
+    bounds: list of float
+        Ascending upper bounds of the buckets, the last bucket holds the observations above the last bound
+    """
+
+    def __init__(self, bounds:List[float]=cfg.METRICS_LATENCY_BUCKETS_MS) -> None:
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+
+    def observe(self, value:float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q:float) -> Optional[float]:
+        """ Upper bound of the bucket holding the q-quantile, the maximum for the last bucket."""
+        if self.count == 0:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count > 0 else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+            "buckets": dict(zip([str(bound) for bound in self.bounds] + ["inf"], self.counts)),
+        }
+
+
+def _key(name:str, labels:dict) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class MetricsRegistry:
+    """Thread-safe counters, histograms and quota usage.
+
+    Parameters
+    ----------
+    calls_per_minute, calls_per_day: int
+        Quotas of the data provider, usage is reported as a fraction of them
+
+    Example:
+    --------
+    ```Python
+        METRICS.inc("api_retries", mode="daily", symbol="aapl")
+        with METRICS.timer("storage_read_ms", kind="dataset"):
+            data = pd.read_csv(path)
+        METRICS.snapshot()
+    ```
+    """
+
+    def __init__(self, calls_per_minute:int=cfg.AV_CALLS_PER_MINUTE, calls_per_day:int=cfg.AV_CALLS_PER_DAY) -> None:
+        self.calls_per_minute = calls_per_minute
+        self.calls_per_day = calls_per_day
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = collections.defaultdict(float)
+            self._histograms = {}
+            self._calls = collections.deque()
+            self._started = time.time()
+
+    def inc(self, name:str, value:float=1, **labels) -> None:
+        """ Add value to the counter of name and labels."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name:str, value:float, **labels) -> None:
+        """ Add an observation to the histogram of name and labels."""
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name:str, **labels):
+        """ Observe the duration of the block in milliseconds, exceptions included."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1e3, **labels)
+
+    def record_call(self, now:Optional[float]=None) -> None:
+        """ Count a call against the provider quotas."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._calls.append(now)
+            while self._calls[0] < now - DAY:
+                self._calls.popleft()
+
+    def quota(self, now:Optional[float]=None) -> dict:
+        """ Calls of the last minute and day, and their fraction of the quotas."""
+        now = time.time() if now is None else now
+        with self._lock:
+            calls = list(self._calls)
+        last_minute = len(calls) - bisect.bisect_left(calls, now - MINUTE)
+        last_day = len(calls) - bisect.bisect_left(calls, now - DAY)
+        return {
+            "calls_last_minute": last_minute,
+            "calls_last_day": last_day,
+            "minute_usage": last_minute / self.calls_per_minute,
+            "day_usage": last_day / self.calls_per_day,
+        }
+
+    def counter(self, name:str, **labels) -> float:
+        """ Value of a counter, summed over the labels not given."""
+        wanted = set(_key(name, labels)[1])
+        with self._lock:
+            return sum(value for (key_name, key_labels), value in self._counters.items()
+                       if key_name == name and wanted <= set(key_labels))
+
+    def histogram(self, name:str, **labels) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get(_key(name, labels))
+
+    def snapshot(self) -> dict:
+        """ JSON serializable state of all the metrics."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [dict(name=name, labels=dict(labels), **histogram.summary())
+                          for (name, labels), histogram in sorted(self._histograms.items())]
+        return {
+            "time": time.time(),
+            "uptime_s": time.time() - self._started,
+            "counters": counters,
+            "histograms": histograms,
+            "quota": self.quota(),
+        }
+
+    def dump(self, path) -> Path:
+        """ Write the snapshot to a JSON file, replaced atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "w") as fp:
+            json.dump(self.snapshot(), fp, indent=2)
+        tmp.replace(path)
+        return path
+
+
+METRICS = MetricsRegistry()
+
+
+class PeriodicDump:
+    """Dump the metrics to a JSON file every interval_s seconds from a daemon thread, and once more when stopped.
+
+    Example:
+    --------
+    ```Python
+        dumper = PeriodicDump("reports/metrics.json").start()
+        ...
+        dumper.stop()
+    ```
+    """
+
+    def __init__(self, path, interval_s:float=cfg.METRICS_DUMP_INTERVAL_S, registry:MetricsRegistry=METRICS) -> None:
+        self.path = path
+        self.interval_s = interval_s
+        self.registry = registry
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.registry.dump(self.path)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval_s):
+            try:
+                self.registry.dump(self.path)
+            except OSError as e:
+                logging.error(f"Metrics could not be dumped to {self.path}")
+                logging.error(repr(e))
+
+
+def _handler(registry:MetricsRegistry):
+    """ HTTP request handler class bound to a metrics registry."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            code, body = (200, registry.snapshot()) if self.path == "/metrics" else \
+                (404, {"error": f"Unknown path {self.path}"})
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    return MetricsHandler
+
+
+def serve_metrics(host:str=cfg.METRICS_HOST, port:int=cfg.METRICS_PORT,
+                  registry:MetricsRegistry=METRICS) -> ThreadingHTTPServer:
+    """
+        Serve the metrics of the process on local HTTP from a daemon thread. `port=0` picks a free port.
+        Call `shutdown` on the returned server to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _handler(registry))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Metrics served on http://{host}:{server.server_address[1]}/metrics")
+    return server
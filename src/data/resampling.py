@@ -0,0 +1,130 @@
+""" Resampling of intraday bars to higher timeframes.
+
+ Higher timeframe bars are derived locally from stored 1-minute data instead of
+ separate API calls. Bars are grouped in a single pass over the ascending dates:
+ each bar gets an integer bucket key (session day and bucket within the session),
+ bucket starts are found where keys change and OHLCV values are aggregated with
+ `np.ufunc.reduceat` over those starts, without pandas groupby.
+
+ Intraday buckets are anchored on the session open (i.e 60min bars start at 09:30,
+ 10:30, ...) and never span two sessions nor the close, the last bucket of a session
+ being truncated at the close. Daily bars aggregate the bars of a session."""
+
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+
+DAILY = "daily"
+NS_PER_DAY = 86400 * 10**9
+
+
+def _time_ns(time:str) -> int:
+    """ Nanoseconds since midnight of a "HH:MM" time."""
+    return pd.Timedelta(f"{time}:00").value
+
+
+def bucket_keys(dates:np.ndarray, freq:str, session_open:str=cfg.SESSION_OPEN,
+                session_close:str=cfg.SESSION_CLOSE) -> np.ndarray:
+    """
+        Integer key of the bucket of each bar, equal for bars of the same higher timeframe bar.
+
+        Parameters
+        ----------
+        dates: np.ndarray of datetime64[ns]
+            Start dates of the bars, as local (exchange) times
+        freq: str
+            "daily" or an intraday frequency understood by pd.Timedelta (i.e "15min")
+        session_open, session_close: str
+            "HH:MM" times on which intraday buckets are anchored: buckets of bars before the close
+            are anchored on the open, buckets of bars after the close on the close.
+
+        Returns
+        -------
+        np.ndarray of int64
+            Keys are the bucket start dates in nanoseconds
+    """
+    ns = dates.astype("datetime64[ns]").view(np.int64)
+    time = ns % NS_PER_DAY
+    days = ns - time
+    if freq == DAILY:
+        return days
+    step = pd.Timedelta(freq).value
+    close = _time_ns(session_close)
+    anchor = np.where(time < close, _time_ns(session_open), close)
+    # Floor division anchors pre-market buckets on the open too
+    return days + anchor + (time - anchor) // step * step
+
+
+def session_mask(dates:np.ndarray, session_open:str=cfg.SESSION_OPEN, session_close:str=cfg.SESSION_CLOSE) -> np.ndarray:
+    """ True for bars starting within the regular session [session_open, session_close)."""
+    ns = dates.astype("datetime64[ns]").view(np.int64)
+    time = ns % NS_PER_DAY
+    return (time >= _time_ns(session_open)) & (time < _time_ns(session_close))
+
+
+def resample_ohlcv(ohlcv:pd.DataFrame, freq:str, extended_hours:bool=False, session_open:str=cfg.SESSION_OPEN,
+                   session_close:str=cfg.SESSION_CLOSE) -> pd.DataFrame:
+    """
+        Aggregate bars to a higher timeframe: first open, highest high, lowest low, last close and summed volume.
+
+        Parameters
+        ----------
+        ohlcv: pd.DataFrame
+            Bars with ascending start dates as index, i.e `Stock.ohlcv` of 1-minute data.
+            Timezone aware dates are grouped on their local time.
+        freq: str
+            "daily" or an intraday frequency (i.e "5min", "15min", "30min", "60min")
+        extended_hours: bool
+            Keep bars outside of the regular session. They form their own buckets, or are
+            aggregated in the daily bar of their day.
+        session_open, session_close: str
+            "HH:MM" bounds of the regular session
+
+        Returns
+        -------
+        pd.DataFrame
+            OHLCV bars indexed by their start date, named `cfg.DATE`. Empty buckets produce no bar.
+
+        Example:
+        --------
+        ```Python
+            stock = Stock("aapl")  # with INTRADAY_1MIN_FULL settings
+            hourly = resample_ohlcv(stock.ohlcv, "60min")
+        ```
+    """
+    if freq != DAILY and pd.Timedelta(freq) <= pd.Timedelta(0):
+        raise ValueError(f"Resampling frequency must be positive, got {freq}.")
+    index = pd.DatetimeIndex(ohlcv.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    if not index.is_monotonic_increasing:
+        ohlcv, index = ohlcv.iloc[np.argsort(index.values, kind="stable")], index.sort_values()
+    # Columns are views of the canonical float block, nothing is copied before the reduction
+    o, h, l, c, v = (ohlcv[col].to_numpy(dtype=float) for col in cfg.OHLCV)
+    dates = index.values
+    if len(dates) == 0:
+        return pd.DataFrame(columns=cfg.OHLCV, index=pd.DatetimeIndex([], name=cfg.DATE), dtype=float)
+
+    keys = bucket_keys(dates, freq, session_open, session_close)
+    boundaries = np.empty(len(keys), dtype=bool)
+    boundaries[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=boundaries[1:])
+    if not extended_hours:
+        # Buckets also break where bars enter or leave the session, and buckets out of it are dropped
+        in_session = session_mask(dates, session_open, session_close)
+        boundaries[1:] |= in_session[1:] != in_session[:-1]
+    starts = np.flatnonzero(boundaries)
+    ends = np.r_[starts[1:], len(keys)] - 1
+    resampled = np.empty((len(starts), len(cfg.OHLCV)), order="F")
+    resampled[:, 0] = o[starts]
+    resampled[:, 1] = np.maximum.reduceat(h, starts)
+    resampled[:, 2] = np.minimum.reduceat(l, starts)
+    resampled[:, 3] = c[ends]
+    resampled[:, 4] = np.add.reduceat(v, starts)
+    bucket_dates = keys[starts]
+    if not extended_hours:
+        kept = in_session[starts]
+        resampled, bucket_dates = resampled[kept], bucket_dates[kept]
+    index = pd.DatetimeIndex(bucket_dates.view("datetime64[ns]"), name=cfg.DATE)
+    return pd.DataFrame(resampled, index=index, columns=cfg.OHLCV)
@@ -1,66 +1,118 @@
 import logging
-from typing import Tuple
+from typing import Iterable, Optional, Tuple
 import pandas as pd
 import json
 from pathlib import Path
 
-from scipy.sparse import data
-
 import src.config as cfg
 from src.data.alpha_vantage_api import get_data_from_alpha_vantage
+from src.data.labeling import compute_labels, class_name
+from src.data.metrics import METRICS
+from src.data.resampling import resample_ohlcv
+from src.data.validation import ingest_ohlcv
 
 default_settings = cfg.STOCK_SETTINGS
 
 class Stock:
+    """ Daily or intraday data of a single symbol.
+
+    Data is stored once, in the canonical layout returned by `src.data.validation.ingest_ohlcv`:
+    ascending dates as index and a contiguous block of float columns. Views and labels are computed
+    on first access and cached until data changes (see `set_data`).
+    Views are shared between accesses and must not be modified in place.
+    """
 
     def __init__(self, symbol:str, save=False) -> None:
         self.symbol = symbol
-        self._dohlcv, metadata = self.load_existing_dataset()
+        dohlcv, metadata = self.load_existing_dataset()
         
-        if self._dohlcv is None:
-            self._dohlcv, metadata = get_data_from_alpha_vantage(symbol= symbol, **default_settings)
-            self._dohlcv.sort_index(ascending=cfg.SORT_STOCK_ASCENDING, inplace=True)
+        if dohlcv is None:
+            METRICS.inc("dataset_source", source="api")
+            dohlcv, metadata = get_data_from_alpha_vantage(symbol= symbol, **default_settings)
+        else:
+            METRICS.inc("dataset_source", source="disk")
+        # A bad row of the provider must not prevent loading the symbol
+        self.set_data(dohlcv, errors=cfg.STOCK_INGEST_ERRORS)
         
         if save:
-            self.save(self._dohlcv, metadata)
+            self.save(self.dohlcv, metadata)
+
+    def set_data(self, dohlcv:pd.DataFrame, errors:str="raise") -> None:
+        """ Validate and store new data, invalidating cached views.
+
+        Parameters
+        ----------
+        dohlcv: pd.DataFrame
+            Open, high, low, close prices with volumes, with a `cfg.DATE` column or dates as index, in any order.
+        errors: str
+            Handling of invalid rows, "raise", "drop" or "warn" (see `ingest_ohlcv`)
+        """
+        self._ohlcv = ingest_ohlcv(dohlcv, errors=errors)
+        self._cache = {}
+
+    def _cached(self, key, compute):
+        name = key if isinstance(key, str) else key[0]
+        if key not in self._cache:
+            METRICS.inc("stock_cache", view=name, result="miss")
+            self._cache[key] = compute()
+        else:
+            METRICS.inc("stock_cache", view=name, result="hit")
+        return self._cache[key]
     
     @property
     def ohlc(self) -> pd.DataFrame:
         """ Open, Low, High, Close with dates as index"""
-        return self.dohlcv[cfg.DOHLC].set_index(cfg.DATE)
+        return self._cached("ohlc", lambda: self._ohlcv[cfg.OHLC])
     
     @property
     def ohlcv(self) -> pd.DataFrame:
         """ Open, Low, High, Close and volumes with dates as index"""
-        return self.dohlcv.set_index(cfg.DATE)
+        return self._ohlcv
     
     @property
     def dohlcv(self) -> pd.DataFrame:
         """ Dates, Open, Low, High, Close and Volumes with integer indexes"""
-        return self._dohlcv
+        return self._cached("dohlcv", lambda: self._ohlcv.reset_index())
     
     @property
     def _daily_evolution(self) -> pd.Series:
-        return self._dohlcv[cfg.CLOSE] - self._dohlcv[cfg.OPEN]
+        return self._cached("daily_evolution", lambda: self._ohlcv[cfg.CLOSE] - self._ohlcv[cfg.OPEN])
 
     @property
     def _next_day_evolution(self) -> pd.Series:
-        return self._daily_evolution.shift(cfg.SHIFT)
+        return self._cached("next_day_evolution", lambda: self._daily_evolution.shift(cfg.SHIFT))
     
     @property
     def _next_day_evolution_ratio(self) -> pd.Series:
-        return self._next_day_evolution/self._dohlcv.shift(cfg.SHIFT)[cfg.OPEN]
+        return self._cached("next_day_evolution_ratio",
+                            lambda: self._next_day_evolution / self._ohlcv[cfg.OPEN].shift(cfg.SHIFT))
     
     # ----------- Data accessors -----------
 
     @property
     def labels(self) -> pd.DataFrame:
-        s_label = self._next_day_evolution_ratio.apply(lambda x : 0 if x < cfg.BREAKEVEN else x/x) # x/x to return nan if needed
-        return pd.DataFrame(s_label)
+        """ 1 if the next day evolution ratio reaches `cfg.BREAKEVEN`, 0 otherwise, NaN for the last day."""
+        def compute():
+            labels = self.compute_labels(horizons=[cfg.LABELS_HORIZON], thresholds=[cfg.BREAKEVEN], barriers=[])
+            return labels[[class_name(cfg.LABELS_HORIZON, cfg.BREAKEVEN)]].set_axis([cfg.LABELS], axis=1)
+        return self._cached("labels", compute)
+
+    def compute_labels(self, horizons:Optional[Iterable[int]]=None, thresholds:Optional[Iterable[float]]=None,
+                       barriers:Optional[Iterable[Tuple[float, float]]]=None) -> pd.DataFrame:
+        """ Forward returns, classes and triple barrier labels of each day (see `src.data.labeling`).
+        Labels are cached by parameters."""
+        key = ("labels",) + tuple(None if param is None else tuple(param) for param in (horizons, thresholds, barriers))
+        return self._cached(key, lambda: compute_labels(self._ohlcv, horizons, thresholds, barriers))
+
+    def resample(self, freq:str, extended_hours:bool=False) -> pd.DataFrame:
+        """ Bars aggregated to a higher timeframe, i.e "15min", "60min" or "daily" bars of 1-minute data
+        (see `src.data.resampling.resample_ohlcv`). Cached by parameters."""
+        return self._cached(("resample", freq, extended_hours),
+                            lambda: resample_ohlcv(self._ohlcv, freq, extended_hours=extended_hours))
 
     @property
     def training_data(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        return self.ohlcv.iloc[:-1], self.labels[:-1]
+        return self._cached("training_data", lambda: (self.ohlcv.iloc[:-1], self.labels.iloc[:-1]))
     
     @property
     def features(self) -> pd.DataFrame:
@@ -80,6 +132,10 @@ class Stock:
     def features_filepath(self) -> Path:
         return Path(cfg.PROCESSED_DATA_DIR) / f"{self.symbol}_all_features.csv"
     
+    @property
+    def features_store_filepath(self) -> Path:
+        return Path(cfg.PROCESSED_DATA_DIR) / f"{self.symbol}_all_features.feat"
+
     @property
     def metadata_filepath(self) -> Path:
         return Path(cfg.RAW_DATA_DIR) / f"{self.symbol}_metadata.json"
@@ -87,19 +143,21 @@ class Stock:
     # ----------- File load & save utils -----------
 
     def load_existing_dataset(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        if self.data_filepath.exists() and self.metadata_filepath.exists():
-            data = pd.read_csv(self.data_filepath)
-            with open(self.metadata_filepath, 'r') as fp:
-                metadata = json.load(fp)
-            return data
-        elif self.data_filepath.exists():
-            return pd.read_csv(self.data_filepath), None
-        else:
+        if not self.data_filepath.exists():
             return None, None
+        data = _timed_read(pd.read_csv, self.data_filepath, "dataset")
+        if self.metadata_filepath.exists():
+            return data, _timed_read(_read_json, self.metadata_filepath, "metadata")
+        return data, None
 
     def load_existing_features(self) -> pd.DataFrame:
+        """ Features of the most recently written features file, the quantized feature store or the CSV file."""
+        if self.features_store_filepath.exists() and (not self.features_filepath.exists() or
+                self.features_store_filepath.stat().st_mtime >= self.features_filepath.stat().st_mtime):
+            from src.data.feature_store import read_features
+            return _timed_read(read_features, self.features_store_filepath, "feature_store")
         try :
-            return pd.read_csv(self.features_filepath)
+            return _timed_read(pd.read_csv, self.features_filepath, "features")
         except FileNotFoundError:
             logging.warning("No features file found.\
                 Processed raw data with `make features` to enable this attribute.")
@@ -107,10 +165,27 @@ class Stock:
 
     def save(self, data, metadata) -> str:
         """Save Raw DOHLCV data"""
-        data.to_csv(self.data_filepath, index=False)
-        with open(self.metadata_filepath, 'w') as fp:
-            json.dump(metadata, fp)
+        with METRICS.timer("storage_write_ms", kind="dataset"):
+            data.to_csv(self.data_filepath, index=False)
+        with METRICS.timer("storage_write_ms", kind="metadata"):
+            with open(self.metadata_filepath, 'w') as fp:
+                json.dump(metadata, fp)
+        METRICS.inc("storage_bytes_written", self.data_filepath.stat().st_size, kind="dataset")
+        METRICS.inc("storage_bytes_written", self.metadata_filepath.stat().st_size, kind="metadata")
         return self.data_filepath
 
+
+def _read_json(path:Path):
+    with open(path, 'r') as fp:
+        return json.load(fp)
+
+
+def _timed_read(read, path:Path, kind:str):
+    """ Read a file with read, recording its duration and size."""
+    with METRICS.timer("storage_read_ms", kind=kind):
+        data = read(path)
+    METRICS.inc("storage_bytes_read", path.stat().st_size, kind=kind)
+    return data
+
 if __name__ == '__main__':
     Stock("aapl", save=True)
@@ -0,0 +1,172 @@
+""" Synthetic market data generator.
+
+ Prices follow a geometric brownian motion. Highs and lows are sampled from the
+ extrema of the brownian bridge between open and close, so that
+ low <= min(open, close) <= max(open, close) <= high always holds.
+ Volumes are lognormal, correlated with absolute returns and follow
+ the U-shaped intraday seasonality for intraday frequencies."""
+
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+
+# Minutes per bar of supported frequencies. Daily bars cover a whole session.
+FREQUENCIES = {
+    "1min": 1,
+    "5min": 5,
+    "15min": 15,
+    "30min": 30,
+    "60min": 60,
+    "daily": None,
+}
+SESSION_OPEN = np.timedelta64(9*60 + 30, 'm')
+SESSION_MINUTES = 390
+TRADING_DAYS_PER_YEAR = 252
+
+
+def generate_ohlcv(n_rows:int, freq:str="daily", seed:Optional[int]=None, start:str="2000-01-03",
+                   s0:float=100., mu:float=0.05, sigma:float=0.2, volume:float=1e6) -> pd.DataFrame:
+    """
+        Generate a synthetic OHLCV series.
+
+        Parameters
+        ----------
+        n_rows: int
+            Amount of bars
+        freq: str
+            One of FREQUENCIES keys ("daily", "1min", "5min", "15min", "30min", "60min")
+        seed: int, default=None
+            Seed of the random generator
+        start: str
+            First trading day of the series
+        s0: float
+            Initial price
+        mu: float
+            Annualized drift
+        sigma: float
+            Annualized volatility
+        volume: float
+            Average volume of a daily bar
+
+        Returns
+        -------
+        pd.DataFrame
+            Time series with [date, open, high, low, close, volume] columns, sorted by ascending dates.
+    """
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Unsupported frequency {freq}. Available frequencies: {list(FREQUENCIES)}")
+    rng = np.random.default_rng(seed)
+    dates, bar_fraction = _bar_dates(n_rows, freq, start)
+
+    # Variance of a bar in log space, overnight gaps carry a tenth of the daily variance
+    dt = bar_fraction / TRADING_DAYS_PER_YEAR
+    bar_sigma = sigma * np.sqrt(dt)
+    gap_sigma = sigma * np.sqrt(0.1 / TRADING_DAYS_PER_YEAR)
+    drift = (mu - 0.5 * sigma ** 2) * dt
+
+    returns = drift + bar_sigma * rng.standard_normal(n_rows)
+    gaps = np.zeros(n_rows)
+    new_session = _new_session_mask(dates, freq)
+    gaps[new_session] = gap_sigma * rng.standard_normal(new_session.sum())
+    gaps[0] = 0.
+
+    log_open = np.log(s0) + np.cumsum(gaps + np.r_[0., returns[:-1]])
+    log_close = log_open + returns
+    high, low = _bridge_extrema(log_open, log_close, bar_sigma, rng)
+
+    open_, close = np.exp(log_open), np.exp(log_close)
+    volumes = _volumes(returns, bar_sigma, bar_fraction, dates, freq, volume, rng)
+
+    return pd.DataFrame({
+        cfg.DATE: dates,
+        cfg.OPEN: open_,
+        cfg.HIGH: np.exp(high),
+        cfg.LOW: np.exp(low),
+        cfg.CLOSE: close,
+        cfg.VOLUME: volumes,
+    })
+
+
+def generate_universe(n_symbols:int, n_rows:int, freq:str="daily", seed:Optional[int]=None, **kwargs) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+        Lazily generate independent synthetic series for a universe of symbols.
+        Series are yielded one at a time to bound memory on large universes.
+
+        Parameters
+        ----------
+        n_symbols: int
+            Amount of symbols
+        n_rows: int
+            Amount of bars per symbol
+        freq: str
+            One of FREQUENCIES keys
+        seed: int, default=None
+            Seed of the universe. Each symbol gets its own child seed.
+        kwargs:
+            Additional keyword arguments passed to `generate_ohlcv`.
+            Initial prices and volatilities are randomized when not provided.
+
+        Yields
+        ------
+        symbol, dohlcv: str, pd.DataFrame
+    """
+    children = np.random.SeedSequence(seed).spawn(n_symbols)
+    for i, child in enumerate(children):
+        rng = np.random.default_rng(child)
+        params = {
+            "s0": float(np.exp(rng.uniform(np.log(5), np.log(500)))),
+            "sigma": float(rng.uniform(0.1, 0.6)),
+            "mu": float(rng.normal(0.05, 0.1)),
+        }
+        params.update(kwargs)
+        yield f"SYN{i:05d}", generate_ohlcv(n_rows, freq=freq, seed=rng.integers(2**32), **params)
+
+
+def _bar_dates(n_rows:int, freq:str, start:str) -> Tuple[np.ndarray, float]:
+    """ Dates of the bars and fraction of a trading day covered by a bar."""
+    minutes = FREQUENCIES[freq]
+    if minutes is None:
+        return pd.bdate_range(start, periods=n_rows).values, 1.
+    bars_per_day = SESSION_MINUTES // minutes
+    n_days = -(-n_rows // bars_per_day)
+    days = pd.bdate_range(start, periods=n_days).values.astype('datetime64[m]')
+    offsets = SESSION_OPEN + np.arange(bars_per_day) * np.timedelta64(minutes, 'm')
+    dates = (days[:, None] + offsets[None, :]).ravel()[:n_rows]
+    return dates.astype('datetime64[ns]'), minutes / SESSION_MINUTES
+
+
+def _new_session_mask(dates:np.ndarray, freq:str) -> np.ndarray:
+    """ True for bars opening a new session (overnight gap before them)."""
+    if FREQUENCIES[freq] is None:
+        return np.ones(len(dates), dtype=bool)
+    days = dates.astype('datetime64[D]')
+    return np.r_[True, days[1:] != days[:-1]]
+
+
+def _bridge_extrema(log_open:np.ndarray, log_close:np.ndarray, bar_sigma:float, rng:np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Sample the maximum and the minimum of a brownian bridge from open to close.
+        For a bridge ending at b with variance s², P(max >= m) = exp(-2m(m-b)/s²).
+    """
+    b = log_close - log_open
+    s2 = bar_sigma ** 2
+    u_high, u_low = rng.random(len(b)), rng.random(len(b))
+    high = (b + np.sqrt(b ** 2 - 2 * s2 * np.log(u_high))) / 2
+    low = (b - np.sqrt(b ** 2 - 2 * s2 * np.log(u_low))) / 2
+    return log_open + high, log_open + low
+
+
+def _volumes(returns:np.ndarray, bar_sigma:float, bar_fraction:float, dates:np.ndarray,
+             freq:str, volume:float, rng:np.random.Generator) -> np.ndarray:
+    """ Lognormal volumes increasing with absolute returns, U-shaped during sessions."""
+    activity = 1 + np.abs(returns) / bar_sigma
+    seasonality = 1.
+    if FREQUENCIES[freq] is not None:
+        minutes = (dates - dates.astype('datetime64[D]')).astype('timedelta64[m]') - SESSION_OPEN
+        x = minutes.astype(float) / SESSION_MINUTES
+        seasonality = 1 + 2 * (2 * x - 1) ** 2
+    noise = rng.lognormal(-0.125, 0.5, len(returns))
+    return np.round(volume * bar_fraction * activity * seasonality * noise / 2)
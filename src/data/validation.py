@@ -0,0 +1,96 @@
+""" Validation of raw OHLCV data before it is stored in a Stock.
+
+ Every rule is checked in a single vectorized sweep over the price array,
+ returning one boolean mask of violating rows per rule, so that invalid rows
+ can be reported, dropped or rejected at ingest."""
+
+import logging
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+
+ERRORS = ("raise", "drop", "warn")
+
+
+def _dates(df:pd.DataFrame) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(df[cfg.DATE] if cfg.DATE in df.columns else df.index)
+
+
+def check_ohlcv(dohlcv:pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+        Check ordering, duplicates and OHLC consistency of stock data.
+
+        Parameters
+        ----------
+        dohlcv: pd.DataFrame
+            Open, high, low, close prices with volumes, with a `cfg.DATE` column or dates as index.
+
+        Returns
+        -------
+        dict
+            {rule: np.ndarray of bool, True for rows violating the rule}. Rules are:
+            `unordered` (date before the previous one), `duplicated_date` (same date as another row, but the last one),
+            `missing` (NaN prices or volume), `non_positive_price`, `negative_volume`,
+            `high_below_low`, `high_below_open_close` and `low_above_open_close`.
+    """
+    dates = _dates(dohlcv).values
+    values = dohlcv[cfg.OHLCV].values.astype(float)
+    o, h, l, c, v = values.T
+    unordered = np.zeros(len(dates), dtype=bool)
+    unordered[1:] = dates[1:] < dates[:-1]
+    with np.errstate(invalid="ignore"):
+        return {
+            "unordered": unordered,
+            "duplicated_date": pd.Index(dates).duplicated(keep="last"),
+            "missing": np.isnan(values).any(axis=1),
+            "non_positive_price": (np.minimum(np.minimum(o, h), np.minimum(l, c)) <= 0),
+            "negative_volume": v < 0,
+            "high_below_low": h < l,
+            "high_below_open_close": h < np.maximum(o, c),
+            "low_above_open_close": l > np.minimum(o, c),
+        }
+
+
+def ingest_ohlcv(dohlcv:pd.DataFrame, errors:str="raise") -> pd.DataFrame:
+    """
+        Validate stock data and turn it into the canonical layout of a Stock:
+        ascending dates as index, open, high, low, close and volume float columns in one contiguous block.
+
+        Unordered rows are sorted and duplicated dates keep their last row.
+        Other violations of `check_ohlcv` rules are handled according to `errors`.
+
+        Parameters
+        ----------
+        dohlcv: pd.DataFrame
+            Open, high, low, close prices with volumes, with a `cfg.DATE` column or dates as index.
+        errors: str
+            "raise" a ValueError, "drop" invalid rows or "warn" and keep them.
+    """
+    if errors not in ERRORS:
+        raise ValueError(f"Unknown errors handling {errors}. Available: {ERRORS}")
+    checks = check_ohlcv(dohlcv)
+    counts = {rule: int(mask.sum()) for rule, mask in checks.items() if mask.any()}
+    if len(counts) > 0:
+        logging.info(f"OHLCV validation: {counts}")
+
+    invalid = np.zeros(len(dohlcv), dtype=bool)
+    for rule, mask in checks.items():
+        if rule not in ("unordered", "duplicated_date"):
+            invalid |= mask
+    if invalid.any():
+        if errors == "raise":
+            raise ValueError(f"Invalid OHLCV rows: {counts}")
+        elif errors == "warn":
+            logging.warning(f"{invalid.sum()} invalid OHLCV rows kept: {counts}")
+            invalid[:] = False
+
+    keep = ~(invalid | checks["duplicated_date"])
+    dates = _dates(dohlcv)[keep]
+    values = dohlcv[cfg.OHLCV].values.astype(float)[keep]
+    order = np.argsort(dates.values, kind="stable")
+    # Fortran order keeps each column contiguous in the single float block of the frame
+    return pd.DataFrame(np.asfortranarray(values[order]), columns=cfg.OHLCV,
+                        index=pd.DatetimeIndex(dates[order], name=cfg.DATE))
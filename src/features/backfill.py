@@ -0,0 +1,248 @@
+""" Backfill of features and scores over a range of past bars.
+
+ Online, each bar goes through `pipeline.transform` alone: the Finta transformer
+ computes every indicator on the window of its last `buffer_size` bars and moving
+ scalers complete the bar with their buffer. Backfilling a range with that loop
+ recomputes the whole window for each bar. The backfill below gives the features
+ of the sequential loop in a single pass over the range:
+
+    - Finta indicators depending on at most `buffer_size` bars are computed once on
+      the range prefixed with the Finta buffer. Indicators with a longer memory
+      (exponential moving averages) are truncated at the window of each bar online,
+      so they are computed on each window, only for the methods kept by the pipeline.
+    - Steps with a buffer (moving scalers, fractional differences) transform the range
+      prefixed with their buffer, exponentially weighted scalers continue their state.
+
+ The fitted pipeline is left untouched and drift monitors are not updated."""
+
+import copy
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.pipeline import FeatureUnion, Pipeline
+from sklearn.preprocessing import FunctionTransformer, MinMaxScaler, StandardScaler
+
+import src.config as cfg
+from src.features.chunked import history_dependent_methods
+from src.features.drift import DriftMonitor
+from src.features.finta_transformer import FintaTransformer, compute_finta_indicator, finta_methods
+from src.features.fractional_diff import FractionalDifferentiator, fracdiff_column, fractional_differences
+from src.features.inference_plan import NAMING_FUNCTIONS
+from src.features.nan_handlers import UnconsistantColumnDroper
+from src.features.passthrough import passthrough
+from src.features.redundancy import RedundantColumnDroper
+from src.features.scalers import EWStandardScaler, MovingMinMaxScaler, MovingRobustScaler, MovingStandardScaler
+
+
+def _method_columns(bars:pd.DataFrame, finta:FintaTransformer, columns:List[str]) -> Dict[str, List[Tuple[int, int]]]:
+    """ {method: (position in its output, position in columns)} of the Finta methods producing kept columns."""
+    position = {col: i for i, col in enumerate(columns)}
+    layout = {}
+    for name, method in finta_methods():
+        if finta.methods is not None and name not in finta.methods:
+            continue
+        try:
+            outputs = compute_finta_indicator(name, method, bars.iloc[-finta.buffer_size:].copy()).columns
+        except Exception:
+            continue
+        pairs = [(j, position[col]) for j, col in enumerate(outputs) if col in position]
+        if len(pairs) > 0:
+            layout[name] = pairs
+    return layout
+
+
+def _window_indicators(bars:pd.DataFrame, rows:range, window:int, layout:Dict[str, List[Tuple[int, int]]],
+                       n_columns:int) -> np.ndarray:
+    """ Indicators of the last bar of the window ending at each row, as computed online."""
+    methods = dict(finta_methods())
+    out = np.full((len(rows), n_columns), np.nan)
+    for i, row in enumerate(rows):
+        # Methods share a copy of the window, as in `compute_finta_metrics`
+        df = bars.iloc[row - window + 1:row + 1].copy()
+        for name, pairs in layout.items():
+            src, dst = zip(*pairs)
+            try:
+                out[i, list(dst)] = compute_finta_indicator(name, methods[name], df).values[-1, list(src)]
+            except Exception as e:
+                logging.debug(f"Fail during processing of {name} method")
+                logging.debug(e)
+    return out
+
+
+def backfill_finta(finta:FintaTransformer, ohlcv:pd.DataFrame, columns:List[str], n_jobs:int=1) -> np.ndarray:
+    """
+        Finta indicators of each bar of ohlcv as computed by consecutive `finta.transform` calls on single bars.
+
+        Parameters
+        ----------
+        finta: FintaTransformer
+            Fitted transformer whose buffer ends right before the first bar of ohlcv
+        ohlcv: pd.DataFrame
+            Bars of the range, in time order
+        columns: list of str
+            Output columns (raw OHLCV or Finta columns), i.e the columns selected by the pipeline
+        n_jobs: int
+            Amount of parallel processes computing the indicators with a long memory
+
+        Returns
+        -------
+        np.ndarray of shape (len(ohlcv), len(columns))
+    """
+    window = finta.buffer_size
+    bars = pd.concat([finta._buffer.iloc[len(finta._buffer) - (window - 1):], ohlcv[list(finta._buffer.columns)]])
+    bars = bars.astype(float)
+    n_history = len(bars) - len(ohlcv)
+    out = np.full((len(ohlcv), len(columns)), np.nan)
+    for j, col in enumerate(columns):
+        if col in bars.columns:
+            out[:, j] = bars[col].values[n_history:]
+
+    layout = _method_columns(bars, finta, columns)
+    methods = dict(finta_methods())
+    dependent = history_dependent_methods(bars, {name: methods[name] for name in layout}, window - 1)
+    # Indicators of bounded memory: a single computation over the range
+    df = bars.copy()
+    for name, pairs in layout.items():
+        if name in dependent:
+            continue
+        src, dst = zip(*pairs)
+        try:
+            out[:, list(dst)] = compute_finta_indicator(name, methods[name], df).values[n_history:][:, list(src)]
+        except Exception as e:
+            logging.debug(f"Fail during processing of {name} method")
+            logging.debug(e)
+
+    # Indicators truncated at the window of each bar
+    if len(dependent) > 0:
+        windowed = {name: layout[name] for name in dependent}
+        rows = range(n_history, len(bars))
+        n_chunks = max(min(abs(n_jobs) * 4 if n_jobs != 1 else 1, len(rows)), 1)
+        chunks = np.array_split(np.arange(len(rows)), n_chunks)
+        parts = Parallel(n_jobs=n_jobs)(delayed(_window_indicators)(bars, rows[chunk[0]:chunk[-1] + 1], window,
+                                                                     windowed, len(columns))
+                                        for chunk in chunks if len(chunk) > 0)
+        dependent_columns = [dst for pairs in windowed.values() for _, dst in pairs]
+        out[:, dependent_columns] = np.vstack(parts)[:, dependent_columns]
+    logging.info(f"{len(layout)} Finta methods backfilled, {len(dependent)} of them window by window: {dependent}")
+    return out
+
+
+def _prefixed(history:np.ndarray, values:np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame(np.vstack([np.asarray(history, dtype=float), values]))
+
+
+def _backfill_union(union:FeatureUnion, values:np.ndarray, columns:List[str]) -> Tuple[np.ndarray, List[str]]:
+    n = len(values)
+    outputs, names = [], []
+    for name, transformer in union.transformer_list:
+        transformer = copy.deepcopy(transformer)
+        if isinstance(transformer, EWStandardScaler):
+            X_tr = transformer.partial_transform(pd.DataFrame(values)).values
+        elif isinstance(transformer, (MovingStandardScaler, MovingMinMaxScaler)):
+            X_tr = transformer.transform(_prefixed(transformer.buffer_.values, values)).values[-n:]
+        elif isinstance(transformer, MovingRobustScaler):
+            X_tr = transformer.transform(_prefixed(transformer.window_.values(), values)).values[-n:]
+        elif isinstance(transformer, (StandardScaler, MinMaxScaler)):
+            X_tr = transformer.transform(values)
+        elif isinstance(transformer, FunctionTransformer) and transformer.func is passthrough:
+            X_tr = values
+        else:
+            raise TypeError(f"{name} ({transformer.__class__.__name__}) can not be backfilled.")
+        outputs.append(np.asarray(X_tr, dtype=float))
+        names += columns if name == cfg.PASSTHROUGH_NAME else [f"{col}_{name}" for col in columns]
+    return np.hstack(outputs), names
+
+
+def _select(values:np.ndarray, columns:List[str], selected:Optional[List[str]]) -> Tuple[np.ndarray, List[str]]:
+    if selected is None:
+        return values, columns
+    position = {col: i for i, col in enumerate(columns)}
+    return values[:, [position[col] for col in selected]], list(selected)
+
+
+def backfill_features(pipeline:Pipeline, ohlcv:pd.DataFrame, start=None, end=None, n_jobs:int=1) -> pd.DataFrame:
+    """
+        Features of a range of bars, as returned by `pipeline.transform` called on each bar in turn.
+
+        Parameters
+        ----------
+        pipeline: sklearn.pipeline.Pipeline
+            Fitted features pipeline (i.e FEATURES_PIPELINE after `fit_transform`), whose buffers end
+            right before the range, as for the online loop. It is left untouched.
+        ohlcv: pd.DataFrame
+            Bars with dates as index, i.e `Stock.ohlcv`
+        start, end: date or str, default=None
+            Range of dates, included, as `ohlcv.loc[start:end]`
+        n_jobs: int
+            Amount of parallel processes computing the indicators with a long memory
+
+        Returns
+        -------
+        pd.DataFrame
+            Features of each bar of the range, with its dates as index
+
+        Example:
+        --------
+        ```Python
+            FEATURES_PIPELINE.fit_transform(stock.ohlcv.loc[:"2021-06-30"])
+            features = backfill_features(FEATURES_PIPELINE, stock.ohlcv, start="2021-07-01")
+        ```
+    """
+    start_time = time.perf_counter()
+    bars = ohlcv.loc[start:end]
+    steps = [step for _, step in pipeline.steps]
+    values, columns = None, None
+    for i, step in enumerate(steps):
+        if isinstance(step, FintaTransformer):
+            next_step = steps[i + 1] if i + 1 < len(steps) else None
+            if isinstance(next_step, UnconsistantColumnDroper) and next_step.col_slot is not None:
+                columns = list(next_step.col_slot)
+            else:
+                columns = list(cfg.FINTA_COLS)
+            values = backfill_finta(step, bars, columns, n_jobs=n_jobs)
+        elif isinstance(step, UnconsistantColumnDroper):
+            values, columns = _select(values, columns, step.col_slot)
+        elif isinstance(step, FeatureUnion):
+            values, columns = _backfill_union(step, values, columns)
+        elif isinstance(step, FractionalDifferentiator):
+            history = step.buffer_.values
+            values = fractional_differences(np.vstack([history, values]), step.weights_)[len(history):]
+            columns = [fracdiff_column(col, d) for d in step.d_values for col in columns]
+        elif isinstance(step, FunctionTransformer) and step.func.__name__ in NAMING_FUNCTIONS:
+            continue
+        elif isinstance(step, RedundantColumnDroper):
+            values, columns = _select(values, columns, step.selected_columns_)
+        elif isinstance(step, DriftMonitor):
+            continue
+        else:
+            raise TypeError(f"{step.__class__.__name__} step can not be backfilled.")
+    logging.info(f"{len(bars)} bars backfilled in {time.perf_counter() - start_time:.2f}s")
+    return pd.DataFrame(values, index=bars.index, columns=columns)
+
+
+def backfill_scores(pipeline:Pipeline, estimator, ohlcv:pd.DataFrame, start=None, end=None, n_jobs:int=1) -> pd.Series:
+    """
+        Scores of a range of bars by a fitted estimator, as `InferencePlan.score` of each bar in turn.
+
+        Parameters
+        ----------
+        pipeline, ohlcv, start, end, n_jobs:
+            See `backfill_features`
+        estimator: sklearn estimator
+            Fitted model, implementing `predict_proba` or `predict`
+
+        Returns
+        -------
+        pd.Series
+            Probability of the last class (or prediction) of each bar, with its dates as index
+    """
+    features = backfill_features(pipeline, ohlcv, start, end, n_jobs=n_jobs)
+    if hasattr(estimator, "predict_proba"):
+        scores = estimator.predict_proba(features.values)[:, -1]
+    else:
+        scores = estimator.predict(features.values)
+    return pd.Series(scores, index=features.index, name="score")
@@ -1,7 +1,5 @@
 import logging
 
-from dotenv.main import find_dotenv, load_dotenv
-from src.data.stock import Stock
 import click
 import pandas as pd
 from sklearn.pipeline import Pipeline
@@ -10,17 +8,18 @@ from sklearn.preprocessing import FunctionTransformer
 from src.features.scalers import SCALERS_TRANSFORMERS,SCALER_OUTPUT_FORMATER
 from src.features.finta_transformer import FINTA_TRANSFORMER
 from src.features.nan_handlers import OFFSET_NAN_DROPER, UnconsistantColumnDroper
+from src.features.redundancy import REDUNDANT_COLUMNS_DROPER
 from src.features.distances import DISTANCES_OUTPUT_FORMATER, DISTANCES_TRANSFORMERS
 import src.config as cfg
 
 
 def log_step(o):
     if isinstance(o, pd.DataFrame):
-        print("--- Shape of dataset: ",  o.shape)
+        logging.debug(f"--- Shape of dataset: {o.shape}")
     elif isinstance(o, tuple):
-        print("--- Shape of dataset: ",  o[0].shape)
+        logging.debug(f"--- Shape of dataset: {o[0].shape}")
         if o[1] is not None:
-            print("--- Shape of labels: ",  o[1].shape)
+            logging.debug(f"--- Shape of labels: {o[1].shape}")
     return o
 LOGGING_STEP = FunctionTransformer(log_step)
 
@@ -41,25 +40,51 @@ FEATURES_PIPELINE = Pipeline([
     #("distance_output_formater", DISTANCES_OUTPUT_FORMATER),
     #("clean_distances", UnconsistantColumnDroper(cfg.DISTANCED_COLS)),
     ("nan offset", OFFSET_NAN_DROPER),
+    ("prune_redundant", REDUNDANT_COLUMNS_DROPER),
     ], 
-    verbose=True,
     )
 
 @click.command()
-@click.argument('symbol', type=click.String)
-def build_features(symbol:str, save=True):
+@click.argument('symbol', type=click.STRING)
+@click.option('--trace', 'trace_path', default=None, help="Export a Chrome trace of the pipeline steps to this path.")
+@click.option('--block-size', default=None, type=int, help="Run the pipeline by blocks of rows, streamed to the features file.")
+@click.option('--n-jobs', default=1, help="Amount of parallel processes of the chunked run.")
+@click.option('--store', is_flag=True, help="Save features in a quantized feature store file instead of CSV.")
+def build_features(symbol:str, save=True, trace_path=None, block_size=None, n_jobs=1, store=False):
+    # Only needed by the CLI, imported here to keep the pipeline import light
+    from src.data.stock import Stock
+    from src.features.profiling import instrument_pipeline, trace_summary
+
     stock = Stock(symbol)
     X, y = stock.training_data
-    X_tr = FEATURES_PIPELINE.fit_transform(X,y)
-    if save:
+    if block_size is not None:
+        from src.features.chunked import CSVSink, chunked_fit_transform
+        if store:
+            from src.data.feature_store import FeatureStoreWriter
+            sink = FeatureStoreWriter(stock.features_store_filepath)
+        else:
+            sink = CSVSink(stock.features_filepath)
+        path = chunked_fit_transform(FEATURES_PIPELINE, X, block_size=block_size, n_jobs=n_jobs, sink=sink)
+        logging.info(f"Features saved in {path}")
+        return path
+    if trace_path is not None:
+        pipeline = instrument_pipeline(FEATURES_PIPELINE)
+        X_tr = pipeline.fit_transform(X,y)
+        pipeline.trace.to_chrome_trace(trace_path)
+        for s in trace_summary(pipeline.trace):
+            logging.info(f"{s['step']:>30} {s['method']:<14} {s['wall_time']:.3f}s wall {s['cpu_time']:.3f}s cpu")
+    else:
+        X_tr = FEATURES_PIPELINE.fit_transform(X,y)
+    if save and store:
+        from src.data.feature_store import write_features
+        logging.info(f"Features saved in {write_features(stock.features_store_filepath, X_tr)}")
+    elif save:
         X_tr.to_csv(index=False)
     return X_tr
 
 
 if __name__ == "__main__":
     logging.basicConfig(**cfg.LOGGING_CONFIG)
-    load_dotenv(find_dotenv())
-
     build_features()
 
 
@@ -0,0 +1,439 @@
+""" Chunked execution of the features pipeline on long histories.
+
+ `FEATURES_PIPELINE.fit_transform` holds the OHLCV frame, the whole Finta output and
+ every scaled copy in memory at once. The chunked execution below splits the time
+ axis in blocks and fits and transforms the same pipeline in a few passes, keeping
+ intermediate matrices in memory maps on disk:
+
+    1. Finta indicators of each block, computed on the block prefixed with a halo of
+       `FintaTransformer.buffer_size + max scaler window` past rows so that rolling
+       windows are complete at block boundaries. Indicators with an infinite memory
+       (exponential moving averages, cumulative sums) or rounding depending on the
+       first rows are detected on a probe and computed once over the whole history
+       instead, one indicator at a time.
+    2. Scalers fitting: `partial_fit` block by block, moving scalers keep the last rows.
+       Exponentially weighted scalers, whose state summarizes the whole history, are
+       fitted sequentially and their state is copied at the first halo row of each block.
+    3. Scaled features of each block, with a halo of the scalers window, exponentially
+       weighted scalers continuing their copied state (`partial_transform`).
+    4. Redundancy pruning fitted on the memory mapped scaled matrix.
+    5. Output blocks streamed to a sink (i.e a CSV file, or a feature store of `src.data.feature_store`).
+
+ Column drops of the `UnconsistantColumnDroper` steps and the NaN offset only depend
+ on the first valid and last NaN rows of each column, which are merged across blocks.
+ Blocks of passes 1 and 3 are independent and processed in parallel processes.
+ Peak memory is bounded by the block size and the `memory_budget` of the redundancy
+ pruner. The output is exactly the in-memory run output: Finta indicators whose values
+ on a block differ from their values on the whole history, even by the rounding of the
+ running sums of pandas rolling windows, are computed over the whole history."""
+
+import copy
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.pipeline import FeatureUnion, Pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+import src.config as cfg
+from src.features.finta_transformer import FintaTransformer, compute_finta_indicator, finta_methods
+from src.features.nan_handlers import UnconsistantColumnDroper
+from src.features.redundancy import RedundantColumnDroper
+from src.features.scalers import EWStandardScaler
+
+NO_ROW = np.iinfo(np.int64).max
+
+
+# ----------- Sinks -----------
+
+class FrameSink:
+    """Collect output blocks in memory and concatenate them, for small histories and tests."""
+
+    def __init__(self) -> None:
+        self.blocks = []
+
+    def write(self, block:pd.DataFrame) -> None:
+        self.blocks.append(block)
+
+    def close(self) -> pd.DataFrame:
+        return pd.concat(self.blocks)
+
+
+class CSVSink:
+    """Append output blocks to a CSV file, with the header of the first block."""
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._header = True
+
+    def write(self, block:pd.DataFrame) -> None:
+        block.to_csv(self.path, mode="w" if self._header else "a", header=self._header, index=False)
+        self._header = False
+
+    def close(self) -> Path:
+        return self.path
+
+
+# ----------- Helpers -----------
+
+def _memmap(path:str, shape:Tuple[int, int], mode:str="r+") -> np.memmap:
+    return np.memmap(path, dtype=np.float64, mode=mode, shape=shape, order="F")
+
+
+def _blocks(n_rows:int, block_size:int) -> List[Tuple[int, int]]:
+    return [(start, min(start + block_size, n_rows)) for start in range(0, n_rows, block_size)]
+
+
+def nan_bounds(values:np.ndarray, offset:int=0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        First valid and last NaN rows of each column of a block.
+
+        Parameters
+        ----------
+        values: np.ndarray of shape (n_rows, n_features)
+        offset: int
+            Row of the first row of the block in the whole matrix
+
+        Returns
+        -------
+        first_valid: np.ndarray of int
+            NO_ROW for columns without valid values
+        last_nan: np.ndarray of int
+            -1 for columns without NaN
+    """
+    nans = np.isnan(values)
+    first_valid = np.where(~nans.all(axis=0), np.argmin(nans, axis=0) + offset, NO_ROW)
+    last_nan = np.where(nans.any(axis=0), len(values) - 1 - np.argmax(nans[::-1], axis=0) + offset, -1)
+    return first_valid, last_nan
+
+
+def _merge_bounds(bounds:List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    return np.min([b[0] for b in bounds], axis=0), np.max([b[1] for b in bounds], axis=0)
+
+
+def consistent_columns(first_valid:np.ndarray, last_nan:np.ndarray) -> np.ndarray:
+    """ Columns kept by `drop_unconsistant_columns`: with valid values and no NaN after the first of them."""
+    return (first_valid != NO_ROW) & (last_nan < first_valid)
+
+
+def _select(columns:List[str], kept:np.ndarray, slot:Optional[List[str]]) -> List[int]:
+    """ Positions of the columns selected by a column dropping step, as `UnconsistantColumnDroper.transform`."""
+    names = [col for col, keep in zip(columns, kept) if keep]
+    position = {col: i for i, col in enumerate(columns)}
+    return [position[col] for col in (names if slot is None else slot)]
+
+
+def _finta_columns(ohlcv:pd.DataFrame, methods:Dict[str, object]) -> Dict[str, List[str]]:
+    """ Output columns of each Finta method on a sample of rows. Failing methods are skipped, as in `compute_finta_metrics`."""
+    columns = {}
+    for name, method in methods.items():
+        try:
+            columns[name] = list(compute_finta_indicator(name, method, ohlcv.copy()).columns)
+        except Exception as e:
+            logging.debug(f"Fail during processing of {name} method")
+            logging.debug(e)
+    return columns
+
+
+def history_dependent_methods(ohlcv:pd.DataFrame, methods:Dict[str, object], halo:int, n_probe:int=500,
+                              rtol:float=1e-9, atol:float=1e-12) -> List[str]:
+    """
+        Finta methods whose values depend on more than `halo` past rows (exponential moving averages,
+        cumulative sums), found by comparing the last rows of a probe computed with and without its beginning.
+    """
+    n_probe = min(n_probe, len(ohlcv) - halo)
+    if n_probe <= 0:
+        return []
+    full, part = ohlcv.iloc[:halo + n_probe * 2], ohlcv.iloc[n_probe:halo + n_probe * 2]
+    dependent = []
+    for name, method in methods.items():
+        try:
+            expected = compute_finta_indicator(name, method, full.copy()).values[-n_probe:]
+            values = compute_finta_indicator(name, method, part.copy()).values[-n_probe:]
+        except Exception:
+            continue
+        if expected.shape != values.shape or not np.allclose(values, expected, rtol=rtol, atol=atol, equal_nan=True):
+            dependent.append(name)
+    return dependent
+
+
+# ----------- Block tasks -----------
+
+def _write_finta(ohlcv:pd.DataFrame, n_skip:int, start:int, layout:List[Tuple[str, List[int]]], out:np.memmap) -> int:
+    """ Write the Finta indicators of ohlcv rows following the first n_skip (halo) rows in the memory map from row start."""
+    methods = dict(finta_methods())
+    # Methods share a copy of their input, as in `compute_finta_metrics`
+    ohlcv = ohlcv.copy()
+    n = len(ohlcv) - n_skip
+    for name, positions in layout:
+        try:
+            values = compute_finta_indicator(name, methods[name], ohlcv).values[n_skip:]
+        except Exception:
+            values = np.nan
+        out[start:start + n, positions] = values
+    out.flush()
+    return n
+
+
+def _finta_block(ohlcv:pd.DataFrame, n_skip:int, start:int, layout:List[Tuple[str, List[int]]],
+                 path:str, shape:Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """ Finta indicators of a block prefixed by n_skip halo rows, written in the rows of the block of the memory map."""
+    out = _memmap(path, shape)
+    out[start:start + len(ohlcv) - n_skip, :len(cfg.OHLCV)] = ohlcv[cfg.OHLCV].values[n_skip:]
+    n = _write_finta(ohlcv, n_skip, start, layout, out)
+    return nan_bounds(np.asarray(out[start:start + n]), start)
+
+
+def _scaled_block(union:FeatureUnion, columns:List[str], n_skip:int, start:int, stop:int,
+                  finta_path:str, finta_shape:Tuple[int, int], positions:List[int],
+                  path:str, shape:Tuple[int, int], states:Dict[int, object]) -> Tuple[np.ndarray, np.ndarray]:
+    """ Scaled features of the rows [start, stop), computed with n_skip halo rows, written in the memory map.
+
+    states: {position in the union: transformer fitted on the rows before the halo}"""
+    finta = _memmap(finta_path, finta_shape, mode="r")
+    X = pd.DataFrame(np.asarray(finta[start - n_skip:stop])[:, positions], columns=columns)
+    # Moving scalers roll their buffer during transform, the fitted union is left untouched
+    transformed = []
+    for i, (_, transformer) in enumerate(copy.deepcopy(union).transformer_list):
+        if i in states:
+            transformed.append(states[i].partial_transform(X))
+        else:
+            transformed.append(transformer.transform(X))
+    # Concatenated as by FeatureUnion.transform
+    values = np.hstack([np.asarray(X_tr) for X_tr in transformed])[n_skip:]
+    out = _memmap(path, shape)
+    out[start:stop] = values
+    out.flush()
+    return nan_bounds(values, start)
+
+
+def _frame(finta:np.memmap, start:int, stop:int, positions:List[int], columns:List[str]) -> pd.DataFrame:
+    """ Selected Finta columns of the rows [start, stop) of the memory map."""
+    return pd.DataFrame(np.asarray(finta[start:stop])[:, positions], columns=columns)
+
+
+def _fit_ew_states(scaler:EWStandardScaler, finta:np.memmap, positions:List[int], columns:List[str],
+                   blocks:List[Tuple[int, int]], window:int) -> List[EWStandardScaler]:
+    """ Fit an exponentially weighted scaler on the whole history, returning copies of its state
+    at the first halo row of each block, in time order."""
+    states, row = [], 0
+    for start, _ in blocks:
+        halo_start = max(start - window, 0)
+        scaler.partial_fit(_frame(finta, row, halo_start, positions, columns))
+        row = halo_start
+        states.append(copy.deepcopy(scaler))
+    scaler.partial_fit(_frame(finta, row, len(finta), positions, columns))
+    return states
+
+
+# ----------- Chunked execution -----------
+
+def _check_steps(pipeline:Pipeline) -> list:
+    kinds = [FintaTransformer, UnconsistantColumnDroper, FeatureUnion, FunctionTransformer,
+             UnconsistantColumnDroper, FunctionTransformer, RedundantColumnDroper]
+    steps = [step for _, step in pipeline.steps]
+    if len(steps) not in (len(kinds) - 1, len(kinds)) or not all(isinstance(s, k) for s, k in zip(steps, kinds)):
+        raise TypeError("Chunked execution supports pipelines shaped as FEATURES_PIPELINE: Finta, column cleaning, "
+                        "scalers union, naming, column cleaning, NaN offset and optional redundancy pruning steps.")
+    return steps
+
+
+def scalers_window(union:FeatureUnion) -> int:
+    """ Largest rolling window of the scalers of a union."""
+    return max([getattr(transformer, "window", 0) for _, transformer in union.transformer_list] + [0])
+
+
+# ----------- Passes -----------
+
+class _Matrix:
+    """ Memory mapped matrix of a pass, with the positions and names of its selected columns."""
+
+    def __init__(self, path:str, shape:Tuple[int, int], positions:List[int], columns:List[str]) -> None:
+        self.path = path
+        self.shape = shape
+        self.positions = positions
+        self.columns = columns
+
+
+def _finta_pass(finta_step:FintaTransformer, clean_finta:UnconsistantColumnDroper, ohlcv:pd.DataFrame,
+                blocks:List[Tuple[int, int]], halo:int, parallel:Parallel, tmp:str) -> _Matrix:
+    """ 1. Finta indicators, history dependent ones over the whole history first, and Finta columns cleaning."""
+    start_time = time.perf_counter()
+    methods = {name: method for name, method in finta_methods()
+               if finta_step.methods is None or name in finta_step.methods}
+    method_columns = _finta_columns(ohlcv.iloc[:blocks[0][1]], methods)
+    raw_columns, layout = list(cfg.OHLCV), []
+    for name, columns in method_columns.items():
+        layout.append((name, list(range(len(raw_columns), len(raw_columns) + len(columns)))))
+        raw_columns += columns
+    # Methods whose values on a block with its halo are not exactly the values on the whole history
+    # (rounding of running sums included) are computed over the whole history
+    dependent = history_dependent_methods(ohlcv, methods, halo, rtol=0., atol=0.) if len(blocks) > 1 else []
+    path, shape = os.path.join(tmp, "finta.dat"), (len(ohlcv), len(raw_columns))
+    finta = _memmap(path, shape, mode="w+")
+    _write_finta(ohlcv, 0, 0, [(name, positions) for name, positions in layout if name in dependent], finta)
+    del finta
+    windowed = [(name, positions) for name, positions in layout if name not in dependent]
+    bounds = parallel(delayed(_finta_block)(ohlcv.iloc[max(start - halo, 0):stop], start - max(start - halo, 0),
+                                            start, windowed, path, shape)
+                      for start, stop in blocks)
+    finta_kept = consistent_columns(*_merge_bounds(bounds))
+    if finta_step.methods is None and cfg.FINTA_COLS is not None:
+        positions = _select(raw_columns, finta_kept, cfg.FINTA_COLS)
+    else:
+        positions = _select(raw_columns, finta_kept, None)
+    cfg.CURRENT_COLS = [raw_columns[i] for i in positions]
+    if finta_step.methods is None and cfg.FINTA_COLS is None:
+        cfg.FINTA_COLS = list(cfg.CURRENT_COLS)
+    finta_step.fit(ohlcv.iloc[-finta_step.buffer_size:])
+    logging.info(f"Finta indicators of {len(blocks)} blocks computed in {time.perf_counter() - start_time:.2f}s "
+                 f"({len(dependent)} methods over the whole history: {dependent})")
+
+    # Column cleaning of the Finta output: a consistent column stays consistent on its selected columns
+    if clean_finta.col_slot is None:
+        clean_finta.col_slot = list(cfg.CURRENT_COLS)
+    positions = [positions[cfg.CURRENT_COLS.index(col)] for col in clean_finta.col_slot]
+    return _Matrix(path, shape, positions, list(clean_finta.col_slot))
+
+
+def _fit_scalers(union:FeatureUnion, finta:_Matrix, blocks:List[Tuple[int, int]], window:int) -> Dict[int, list]:
+    """ 2. Scalers fitting. Returns the states of the exponentially weighted scalers at the halo of each block."""
+    start_time = time.perf_counter()
+    values = _memmap(finta.path, finta.shape, mode="r")
+    n_rows = finta.shape[0]
+    states = {}
+    for i, (_, transformer) in enumerate(union.transformer_list):
+        if isinstance(transformer, EWStandardScaler):
+            states[i] = _fit_ew_states(transformer, values, finta.positions, finta.columns, blocks, window)
+        elif hasattr(transformer, "partial_fit"):
+            for start, stop in blocks:
+                transformer.partial_fit(_frame(values, start, stop, finta.positions, finta.columns))
+        else:
+            # Moving scalers keep the last rows as buffer, functions are stateless
+            transformer.fit(_frame(values, n_rows - max(window, 1), n_rows, finta.positions, finta.columns))
+    del values
+    logging.info(f"Scalers fitted in {time.perf_counter() - start_time:.2f}s")
+    return states
+
+
+def _scaled_pass(union:FeatureUnion, naming:FunctionTransformer, clean_scaled:UnconsistantColumnDroper,
+                 finta:_Matrix, blocks:List[Tuple[int, int]], window:int, parallel:Parallel, tmp:str,
+                 states:Dict[int, list]) -> _Matrix:
+    """ 3. Scaled features named as by the naming step, their column cleaning and NaN offset."""
+    start_time = time.perf_counter()
+    sample = pd.DataFrame(np.ones((window + 1, len(finta.columns))), columns=finta.columns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n_scaled = copy.deepcopy(union).transform(sample).shape[1]
+    scaled_columns = list(naming.transform(pd.DataFrame(np.empty((0, n_scaled)))).columns)
+    path, shape = os.path.join(tmp, "scaled.dat"), (finta.shape[0], n_scaled)
+    _memmap(path, shape, mode="w+").flush()
+    bounds = parallel(delayed(_scaled_block)(union, finta.columns, start - max(start - window, 0), start, stop,
+                                             finta.path, finta.shape, finta.positions, path, shape,
+                                             {i: block_states[b] for i, block_states in states.items()})
+                      for b, (start, stop) in enumerate(blocks))
+    first_valid, last_nan = _merge_bounds(bounds)
+    os.remove(finta.path)
+    logging.info(f"Scaled features computed in {time.perf_counter() - start_time:.2f}s")
+
+    positions = _select(scaled_columns, consistent_columns(first_valid, last_nan), clean_scaled.col_slot)
+    cfg.CURRENT_COLS = [scaled_columns[i] for i in positions]
+    if clean_scaled.col_slot is None:
+        clean_scaled.col_slot = list(cfg.CURRENT_COLS)
+    cfg.NAN_OFFSET = int(first_valid[positions].max())
+    return _Matrix(path, shape, positions, list(cfg.CURRENT_COLS))
+
+
+def _compact_scaled(scaled:_Matrix, block_size:int, tmp:str) -> Tuple[np.memmap, List[str]]:
+    """ Memory map of the selected columns of the scaled features, from the NaN offset."""
+    values = _memmap(scaled.path, scaled.shape, mode="r")
+    if scaled.positions == list(range(scaled.shape[1])):
+        return values[cfg.NAN_OFFSET:], scaled.columns
+    n_out = scaled.shape[0] - cfg.NAN_OFFSET
+    compact_path = os.path.join(tmp, "compact.dat")
+    compact = _memmap(compact_path, (n_out, len(scaled.positions)), mode="w+")
+    for start, stop in _blocks(n_out, block_size):
+        compact[start:stop] = np.asarray(values[cfg.NAN_OFFSET + start:cfg.NAN_OFFSET + stop])[:, scaled.positions]
+    compact.flush()
+    del values
+    os.remove(scaled.path)
+    return _memmap(compact_path, (n_out, len(scaled.positions)), mode="r"), scaled.columns
+
+
+def _fit_pruner(pruner:Optional[RedundantColumnDroper], scaled:np.memmap, columns:List[str],
+                tmp:str) -> Tuple[List[int], List[str]]:
+    """ 4. Redundancy pruning fitted on the memory mapped scaled features. Returns the positions and names of the output columns."""
+    if pruner is None:
+        return list(range(len(columns))), columns
+    start_time = time.perf_counter()
+    mmap_dir = pruner.mmap_dir
+    pruner.mmap_dir = tmp if mmap_dir is None else mmap_dir
+    try:
+        pruner.fit(pd.DataFrame(scaled, columns=columns, copy=False))
+    finally:
+        pruner.mmap_dir = mmap_dir
+    position = {col: i for i, col in enumerate(columns)}
+    cfg.CURRENT_COLS = list(pruner.selected_columns_)
+    logging.info(f"Redundancy pruning fitted in {time.perf_counter() - start_time:.2f}s")
+    return [position[col] for col in pruner.selected_columns_], list(pruner.selected_columns_)
+
+
+def chunked_fit_transform(pipeline:Pipeline, ohlcv:pd.DataFrame, block_size:int=cfg.CHUNK_SIZE, n_jobs:int=1,
+                          sink=None, workdir:Optional[str]=None):
+    """
+        Fit an unfitted features pipeline on a long history and transform it block by block.
+
+        Parameters
+        ----------
+        pipeline: sklearn.pipeline.Pipeline
+            Unfitted features pipeline shaped as FEATURES_PIPELINE, i.e `clone(FEATURES_PIPELINE)`.
+            It is fitted in place, as by `fit_transform`, and can then transform new bars or be compiled in an InferencePlan.
+        ohlcv: pd.DataFrame
+            History in time order, i.e `Stock.ohlcv`
+        block_size: int
+            Amount of rows per block, at least the halo (Finta buffer and scalers window)
+        n_jobs: int
+            Amount of parallel processes for blocks, -1 for all cores
+        sink: object with `write(block)` and `close()` methods, default=None
+            Destination of output blocks (i.e CSVSink). Blocks are collected in a DataFrame if None.
+        workdir: str, default=None
+            Directory of the temporary memory maps, the system temporary directory if None
+
+        Returns
+        -------
+        The value returned by `sink.close()`, the output DataFrame by default
+
+        Example:
+        --------
+        ```Python
+            pipeline = clone(FEATURES_PIPELINE)
+            chunked_fit_transform(pipeline, stock.ohlcv, block_size=100000, n_jobs=-1,
+                                  sink=CSVSink(stock.features_filepath))
+        ```
+    """
+    finta_step, clean_finta, union, naming, clean_scaled, offset, *pruner = _check_steps(pipeline)
+    window = scalers_window(union)
+    halo = finta_step.buffer_size + window
+    if block_size < halo:
+        raise ValueError(f"block_size must be at least the halo of {halo} rows.")
+    sink = FrameSink() if sink is None else sink
+    blocks = _blocks(len(ohlcv), block_size)
+    parallel = Parallel(n_jobs=n_jobs)
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        finta = _finta_pass(finta_step, clean_finta, ohlcv, blocks, halo, parallel, tmp)
+        states = _fit_scalers(union, finta, blocks, window)
+        scaled = _scaled_pass(union, naming, clean_scaled, finta, blocks, window, parallel, tmp, states)
+        scaled, columns = _compact_scaled(scaled, block_size, tmp)
+        output_positions, columns = _fit_pruner(pruner[0] if len(pruner) > 0 else None, scaled, columns, tmp)
+        for start, stop in _blocks(len(scaled), block_size):
+            values = np.asarray(scaled[start:stop])[:, output_positions]
+            sink.write(pd.DataFrame(values, columns=columns, index=pd.RangeIndex(start, stop)))
+        del scaled
+    return sink.close()
@@ -0,0 +1,218 @@
+""" Cross-sectional features: statistics of each feature across the universe on the same date.
+
+ Per-symbol features of many symbols are aligned in a (dates, symbols, columns)
+ array, missing symbols of a date holding NaN. Ranks, percentiles, demeaned values
+ and z-scores are computed along the symbols axis for all dates at once: ranks come
+ from a single sort of each date, ties getting the average rank of their run of
+ equal values, without per-date groupby. Dates are processed by chunks fitting a
+ memory budget so that thousands of symbols over decades of bars fit in memory."""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+import src.config as cfg
+
+STATS = ["rank", "percentile", "demeaned", "zscore"]
+SUFFIX = "cs" # Output columns are named `{column}_cs_{stat}`
+
+
+def align_panel(frames:Dict[str, pd.DataFrame], columns:Optional[List[str]]=None,
+                dtype=np.float64) -> Tuple[np.ndarray, pd.DatetimeIndex, List[str], List[str]]:
+    """
+        Align per-symbol features on the union of their dates.
+
+        Parameters
+        ----------
+        frames: dict
+            {symbol: pd.DataFrame of features with a DatetimeIndex}. FEATURES_PIPELINE outputs have a
+            RangeIndex and must be re-indexed on the last dates of their OHLCV first.
+        columns: list of str, default=None
+            Columns to align, the columns of the first frame if None
+        dtype: numpy dtype
+            Type of the aligned values, float32 halves the memory of large universes
+
+        Returns
+        -------
+        values: np.ndarray of shape (n_dates, n_symbols, n_columns)
+            NaN where a symbol has no bar on a date
+        dates: pd.DatetimeIndex
+        symbols, columns: list of str
+    """
+    symbols = list(frames)
+    for symbol in symbols:
+        if not isinstance(frames[symbol].index, pd.DatetimeIndex):
+            raise ValueError(f"Features of {symbol} are indexed by {type(frames[symbol].index).__name__}, "
+                             f"dates are expected: re-index them on their OHLCV dates, i.e ohlcv.index[-len(X):]")
+    columns = list(frames[symbols[0]].columns) if columns is None else list(columns)
+    dates = pd.DatetimeIndex(sorted(set().union(*(frames[symbol].index for symbol in symbols))), name=cfg.DATE)
+    values = np.full((len(dates), len(symbols), len(columns)), np.nan, dtype=dtype)
+    for i, symbol in enumerate(symbols):
+        frame = frames[symbol]
+        rows = dates.get_indexer(frame.index)
+        if (rows < 0).any():
+            raise ValueError(f"Dates of {symbol} could not be aligned on the dates of the universe.")
+        values[rows, i] = frame[columns].to_numpy(dtype=dtype)
+    return values, dates, symbols, columns
+
+
+def average_ranks(values:np.ndarray) -> np.ndarray:
+    """
+        1-based ranks along the second axis, ties getting the average rank of their run. NaN are not ranked.
+
+        Parameters
+        ----------
+        values: np.ndarray of shape (n_dates, n_symbols) or (n_dates, n_symbols, n_columns)
+
+        Returns
+        -------
+        np.ndarray of float of the same shape, as `pd.DataFrame.rank(axis=1)` of each column
+    """
+    n_symbols = values.shape[1]
+    # NaN are sorted last, beyond the ranks of valid values
+    order = np.argsort(values, axis=1, kind="stable")
+    ordered = np.take_along_axis(values, order, axis=1)
+    position = np.arange(n_symbols).reshape((1, n_symbols) + (1,) * (values.ndim - 2))
+    run_start = np.ones(values.shape, dtype=bool)
+    np.not_equal(ordered[:, 1:], ordered[:, :-1], out=run_start[:, 1:])
+    run_end = np.ones(values.shape, dtype=bool)
+    run_end[:, :-1] = run_start[:, 1:]
+    # First and last positions of the run of each sorted value
+    first = np.maximum.accumulate(np.where(run_start, position, 0), axis=1)
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(run_end, position, n_symbols - 1), axis=1), axis=1), axis=1)
+    ranks = np.empty(values.shape, dtype=float)
+    np.put_along_axis(ranks, order, (first + last) / 2 + 1, axis=1)
+    ranks[np.isnan(values)] = np.nan
+    return ranks
+
+
+def _chunk_size(n_cells:int, memory_budget:int) -> int:
+    """ Amount of dates per chunk so that about 8 arrays of 8 bytes per cell of a date fit in the budget."""
+    return max(int(memory_budget // (8 * 8 * n_cells)), 1)
+
+
+def cross_sectional_stats(values:np.ndarray, stats:List[str]=STATS, min_symbols:int=2,
+                          memory_budget:int=2**28) -> Dict[str, np.ndarray]:
+    """
+        Statistics of each value among the values of the other symbols of its date.
+
+        Parameters
+        ----------
+        values: np.ndarray of shape (n_dates, n_symbols) or (n_dates, n_symbols, n_columns)
+            Aligned features (see `align_panel`), NaN for missing symbols
+        stats: list of str
+            Among STATS:
+            "rank": 1-based average rank, as `pd.DataFrame.rank(axis=1)`
+            "percentile": rank divided by the amount of symbols of the date, as `rank(axis=1, pct=True)`
+            "demeaned": value minus the mean of the date
+            "zscore": demeaned value divided by the standard deviation (ddof=1) of the date
+        min_symbols: int
+            Dates with fewer valid values get NaN statistics
+        memory_budget: int
+            Memory in bytes available for the intermediate arrays of a chunk of dates
+
+        Returns
+        -------
+        dict
+            {stat: np.ndarray of float of the shape of values}, NaN where values are NaN
+    """
+    unknown = set(stats) - set(STATS)
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown cross-sectional statistics {sorted(unknown)}. Available statistics: {STATS}")
+    outputs = {stat: np.empty(values.shape, dtype=float) for stat in stats}
+    n_dates = values.shape[0]
+    step = _chunk_size(int(np.prod(values.shape[1:])), memory_budget)
+    for start in range(0, n_dates, step):
+        chunk = np.asarray(values[start:start + step], dtype=float)
+        valid = ~np.isnan(chunk)
+        counts = valid.sum(axis=1, keepdims=True)
+        too_few = np.broadcast_to(counts < min_symbols, chunk.shape) | ~valid
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if "rank" in stats or "percentile" in stats:
+                ranks = average_ranks(chunk)
+                if "rank" in stats:
+                    outputs["rank"][start:start + step] = ranks
+                if "percentile" in stats:
+                    outputs["percentile"][start:start + step] = ranks / counts
+            if "demeaned" in stats or "zscore" in stats:
+                demeaned = chunk - np.where(valid, chunk, 0.).sum(axis=1, keepdims=True) / counts
+                if "demeaned" in stats:
+                    outputs["demeaned"][start:start + step] = demeaned
+                if "zscore" in stats:
+                    std = np.sqrt(np.where(valid, demeaned ** 2, 0.).sum(axis=1, keepdims=True) / (counts - 1))
+                    # Dates whose values are all equal have no z-score
+                    outputs["zscore"][start:start + step] = np.where(std > 0, demeaned / std, np.nan)
+        for stat in stats:
+            outputs[stat][start:start + step][too_few] = np.nan
+    return outputs
+
+
+def stat_column(column:str, stat:str) -> str:
+    return f"{column}_{SUFFIX}_{stat}"
+
+
+class CrossSectionalTransformer(TransformerMixin, BaseEstimator):
+    """Add cross-sectional statistics of selected columns to the features of each symbol.
+
+    The transformer is stateless: statistics of a date only depend on the values of
+    the symbols on that date, so fitting does nothing.
+
+    Parameters
+    ----------
+    columns: list of str, default=None
+        Columns whose statistics are computed, all the columns if None
+    stats: list of str
+        Statistics among STATS (see `cross_sectional_stats`)
+    min_symbols: int
+        Dates with fewer valid values get NaN statistics
+    memory_budget: int
+        Memory in bytes available for the intermediate arrays of a chunk of dates
+
+    Example:
+    --------
+    ```Python
+        features = {}
+        for symbol in symbols:
+            ohlcv = Stock(symbol).ohlcv
+            X = clone(FEATURES_PIPELINE).fit_transform(ohlcv)
+            # Pipeline outputs have a RangeIndex, their rows are the last dates of ohlcv
+            X.index = ohlcv.index[-len(X):]
+            features[symbol] = X
+        features = CrossSectionalTransformer(columns=["RSI_14 period RSI"]).fit_transform(features)
+    ```
+    """
+
+    def __init__(self, columns:Optional[List[str]]=None, stats:List[str]=STATS, min_symbols:int=2,
+                 memory_budget:int=2**28) -> None:
+        self.columns = columns
+        self.stats = stats
+        self.min_symbols = min_symbols
+        self.memory_budget = memory_budget
+
+    def fit(self, X:Dict[str, pd.DataFrame], y=None):
+        return self
+
+    def transform(self, X:Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """
+            Parameters
+            ----------
+            X: dict
+                {symbol: pd.DataFrame of features with a DatetimeIndex} (see `align_panel`)
+
+            Returns
+            -------
+            dict
+                {symbol: features with the `{column}_cs_{stat}` columns appended}, on the dates of the input frame
+        """
+        values, dates, symbols, columns = align_panel(X, self.columns)
+        outputs = cross_sectional_stats(values, self.stats, self.min_symbols, self.memory_budget)
+        names = [stat_column(column, stat) for stat in self.stats for column in columns]
+        transformed = {}
+        for i, symbol in enumerate(symbols):
+            rows = dates.get_indexer(X[symbol].index)
+            stats = np.hstack([outputs[stat][rows, i] for stat in self.stats])
+            transformed[symbol] = pd.concat([X[symbol], pd.DataFrame(stats, index=X[symbol].index, columns=names)],
+                                            axis=1)
+        return transformed
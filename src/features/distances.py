@@ -2,6 +2,7 @@
  between the current data points and various features 
  such as moving average or smoothed curve"""
 
+import logging
 import pandas as pd
 from typing import Callable
 from sklearn.preprocessing import FunctionTransformer
@@ -33,10 +34,9 @@ def signed_distance(df:pd.DataFrame, func:Callable, args:tuple=(), kwds:dict={})
 
 
     """
-    print(f"--- transform {func.__name__} ---")
-    print(df.shape)
+    logging.debug(f"--- transform {func.__name__} ---")
     df_ref = func(df, args=args, kwds=kwds)
-    print(df_ref.shape)
+    logging.debug(f"--- Shape of reference: {df_ref.shape}")
     return df - df_ref
 
 LOWESS_SIGNED_DISTANCE = FunctionTransformer(signed_distance, kw_args={"func":lowess_agf})
@@ -0,0 +1,262 @@
+""" Streaming drift monitoring of features against their training distribution.
+
+ A DriftMonitor is a pass-through step of the features pipeline. When the pipeline
+ is fitted, it sketches the distribution of each column of its input: quantile bin
+ edges with the share of training rows of each bin, mean and variance. Rows
+ transformed afterwards (or pushed in an InferencePlan) update constant memory
+ statistics: weighted counts of the same bins and weighted Welford moments, decayed
+ with a half-life so that recent rows dominate. Columns are compared to their
+ reference with the population stability index (PSI) and a Kolmogorov-Smirnov
+ statistic approximated on the bin edges. An update costs a few vectorized
+ comparisons per column, whatever the amount of rows seen."""
+
+import logging
+import warnings
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.pipeline import Pipeline
+
+import src.config as cfg
+
+EPSILON = 1e-4 # Floor of bin shares in the PSI, for empty bins
+
+
+def bin_weights(values:np.ndarray, edges:np.ndarray, weights:Optional[np.ndarray]=None) -> np.ndarray:
+    """
+        Weighted amount of values of each column in each bin.
+
+        Parameters
+        ----------
+        values: np.ndarray of shape (n_rows, n_features)
+            NaN are not counted
+        edges: np.ndarray of shape (n_bins - 1, n_features)
+            Ascending inner edges of the bins of each column. A value belongs to the bin
+            whose index is the amount of edges strictly lower than it.
+        weights: np.ndarray of shape (n_rows,), default=None
+            Weights of the rows, 1 if None
+
+        Returns
+        -------
+        np.ndarray of shape (n_bins, n_features)
+    """
+    weights = np.ones(len(values)) if weights is None else weights
+    # Weight of the values above each edge, the first row being the weight of all valid values
+    above = np.empty((len(edges) + 2, values.shape[1]))
+    above[0] = weights @ ~np.isnan(values)
+    for b, edge in enumerate(edges):
+        above[b + 1] = weights @ (values > edge)
+    above[-1] = 0.
+    return above[:-1] - above[1:]
+
+
+def psi(reference:np.ndarray, current:np.ndarray) -> np.ndarray:
+    """ Population stability index of each column from bin shares of shape (n_bins, n_features)."""
+    reference, current = np.maximum(reference, EPSILON), np.maximum(current, EPSILON)
+    return ((current - reference) * np.log(current / reference)).sum(axis=0)
+
+
+def binned_ks(reference:np.ndarray, current:np.ndarray) -> np.ndarray:
+    """ Largest gap between the distribution functions of each column on the bin edges."""
+    return np.abs(np.cumsum(current - reference, axis=0)[:-1]).max(axis=0, initial=0.)
+
+
+def _weighted_moments(values:np.ndarray, weights:np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Total weight, weighted mean and weighted sum of squared deviations of each column, NaN excluded."""
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.)
+    total = weights @ valid
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(total > 0, (weights @ filled) / total, 0.)
+    deviations = np.where(valid, filled - mean, 0.)
+    return total, mean, weights @ (deviations * deviations)
+
+
+class DriftMonitor(TransformerMixin, BaseEstimator):
+    """Pass-through step sketching the distribution of its input columns and monitoring their drift.
+
+    `fit` (and `fit_transform`) captures the reference of each column: quantile bin edges,
+    bin shares, mean and variance of the training rows. `transform` and `update` return their
+    input unchanged and fold it in the streaming statistics.
+
+    This class is design to be used in scikit-learn pipeline
+
+    Parameters
+    ----------
+    n_bins: int
+        Amount of quantile bins of the reference distributions
+    halflife: float, default=None
+        Amount of rows after which the weight of a row is halved, no decay if None
+    psi_threshold, ks_threshold: float
+        Columns whose PSI or binned KS statistic is above the threshold are drifting
+    min_count: int
+        Amount of rows seen before columns are flagged
+
+    Example:
+    --------
+    ```Python
+        pipeline = add_drift_monitors(FEATURES_PIPELINE)
+        pipeline.fit_transform(stock.ohlcv)
+        plan = InferencePlan(pipeline)
+        for bar in bars:
+            plan.update(bar)
+        plan.drift_monitors["drift_clean_finta"].drifting()
+    ```
+    """
+
+    def __init__(self, n_bins:int=cfg.DRIFT_BINS, halflife:Optional[float]=None, psi_threshold:float=cfg.DRIFT_PSI_THRESHOLD,
+                 ks_threshold:float=cfg.DRIFT_KS_THRESHOLD, min_count:int=cfg.DRIFT_MIN_COUNT) -> None:
+        self.n_bins = n_bins
+        self.halflife = halflife
+        self.psi_threshold = psi_threshold
+        self.ks_threshold = ks_threshold
+        self.min_count = min_count
+
+    def fit(self, X:pd.DataFrame, y=None):
+        """Sketch the reference distribution of the columns of X.
+        Parameters
+        ----------
+        X : pd.DataFrame of shape (n_samples, n_features)
+            Training rows of the monitored step.
+        y : None
+            Ignored.
+        Returns
+        -------
+        self : object
+            Fitted monitor.
+        """
+        values = X.to_numpy(dtype=float)
+        self.columns_ = list(X.columns)
+        with warnings.catch_warnings():
+            # Columns without valid values get NaN edges and no counts
+            warnings.simplefilter("ignore", RuntimeWarning)
+            self.edges_ = np.nanquantile(values, np.arange(1, self.n_bins) / self.n_bins, axis=0)
+        counts = bin_weights(values, self.edges_)
+        self.reference_shares_ = counts / np.maximum(counts.sum(axis=0), 1)
+        total, self.reference_mean_, squares = _weighted_moments(values, np.ones(len(values)))
+        self.reference_std_ = np.sqrt(squares / np.maximum(total - 1, 1))
+        self.reset()
+        return self
+
+    def fit_transform(self, X:pd.DataFrame, y=None, **fit_params) -> pd.DataFrame:
+        # The training rows are the reference, not monitored rows
+        self.fit(X)
+        return X
+
+    def reset(self) -> None:
+        """Forget the rows seen since fitting."""
+        n_features = len(self.columns_)
+        self.counts_ = np.zeros((self.n_bins, n_features))
+        self.weight_ = np.zeros(n_features)
+        self.mean_ = np.zeros(n_features)
+        self.squares_ = np.zeros(n_features)
+        self.n_rows_ = 0
+
+    @property
+    def decay(self) -> float:
+        return 1. if self.halflife is None else 0.5 ** (1 / self.halflife)
+
+    def update(self, values:np.ndarray) -> None:
+        """Fold rows in the streaming statistics.
+        Parameters
+        ----------
+        values : np.ndarray of shape (n_features,) or (n_samples, n_features)
+            Rows in time order, with the columns of the reference.
+        """
+        values = np.atleast_2d(values)
+        n = len(values)
+        weights = self.decay ** np.arange(n - 1, -1, -1)
+        past = self.decay ** n
+        if n == 1:
+            # Single bars, as pushed by an InferencePlan, are counted in their bin directly
+            valid = ~np.isnan(values[0])
+            self.counts_ *= past
+            self.counts_[(values[0] > self.edges_).sum(axis=0)[valid], np.flatnonzero(valid)] += 1.
+        else:
+            self.counts_ = past * self.counts_ + bin_weights(values, self.edges_, weights)
+        # Decayed statistics of the past rows merged with the weighted moments of the new rows (Chan et al.)
+        weight, mean, squares = _weighted_moments(values, weights)
+        previous = past * self.weight_
+        total = previous + weight
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = np.where(weight > 0, mean - self.mean_, 0.)
+            ratio = np.where(total > 0, weight / total, 0.)
+        self.mean_ = self.mean_ + delta * ratio
+        self.squares_ = past * self.squares_ + squares + delta * delta * previous * ratio
+        self.weight_ = total
+        self.n_rows_ += n
+
+    def transform(self, X:pd.DataFrame) -> pd.DataFrame:
+        """Fold the rows of X in the streaming statistics and return X unchanged."""
+        self.update(X.to_numpy(dtype=float))
+        return X
+
+    # ----------- Statistics -----------
+
+    def shares(self) -> np.ndarray:
+        """ Bin shares of the rows seen, of shape (n_bins, n_features)."""
+        return self.counts_ / np.maximum(self.counts_.sum(axis=0), 1e-12)
+
+    def report(self) -> pd.DataFrame:
+        """
+            Drift statistics of each column.
+
+            Returns
+            -------
+            pd.DataFrame indexed by column
+                psi, ks, mean, std, reference mean and std, mean shift in reference standard
+                deviations and the drifting flag
+        """
+        shares = self.shares()
+        std = np.sqrt(self.squares_ / np.maximum(self.weight_, 1e-12))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shift = (self.mean_ - self.reference_mean_) / self.reference_std_
+        report = pd.DataFrame({
+            "psi": psi(self.reference_shares_, shares),
+            "ks": binned_ks(self.reference_shares_, shares),
+            "mean": self.mean_,
+            "std": std,
+            "reference_mean": self.reference_mean_,
+            "reference_std": self.reference_std_,
+            "mean_shift": shift,
+        }, index=pd.Index(self.columns_, name="column"))
+        seen = (self.n_rows_ >= self.min_count) & (self.weight_ > 0)
+        report["drifting"] = seen & ((report["psi"] > self.psi_threshold) | (report["ks"] > self.ks_threshold))
+        return report
+
+    def drifting(self) -> List[str]:
+        """ Columns drifting from their reference distribution."""
+        report = self.report()
+        columns = list(report.index[report["drifting"]])
+        if len(columns) > 0:
+            logging.warning(f"{len(columns)} drifting features: {columns[:10]}")
+        return columns
+
+
+def add_drift_monitors(pipeline:Pipeline, after:Tuple[str, ...]=("clean_finta", "nan offset"), **params) -> Pipeline:
+    """
+        Unfitted copy of a features pipeline with a DriftMonitor after the given steps.
+
+        Parameters
+        ----------
+        pipeline: sklearn.pipeline.Pipeline
+            Features pipeline, i.e FEATURES_PIPELINE. Its steps are cloned.
+        after: tuple of str
+            Names of the steps whose output is monitored, by default the Finta indicators
+            and the scaled features
+        params:
+            Parameters of the monitors
+
+        Returns
+        -------
+        sklearn.pipeline.Pipeline
+            Monitors are named `drift_{step}`
+    """
+    steps = []
+    for name, step in pipeline.steps:
+        steps.append((name, clone(step)))
+        if name in after:
+            steps.append((f"drift_{name}", DriftMonitor(**params)))
+    return Pipeline(steps)
@@ -1,18 +1,52 @@
 import inspect
+from functools import lru_cache
+from typing import List, Optional
 import pandas as pd
 import logging
 
-from finta import TA
-
-from sklearn.preprocessing import FunctionTransformer
 from sklearn.base import BaseEstimator, TransformerMixin
 
 import src.config as cfg
 from src.features.nan_handlers import drop_unconsistant_columns
 
-FINTA_METHODS = inspect.getmembers(TA, predicate=inspect.isfunction)
 
-def compute_finta_metrics(ohlcv: pd.DataFrame) -> pd.DataFrame:
+@lru_cache(maxsize=None)
+def finta_methods() -> list:
+    """ (name, function) tuples of the Finta TA methods, listed on first call so that importing this module stays cheap."""
+    from finta import TA
+    return inspect.getmembers(TA, predicate=inspect.isfunction)
+
+
+def __getattr__(name):
+    # FINTA_METHODS stays available as a module attribute, computed on first access
+    if name == "FINTA_METHODS":
+        return finta_methods()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def compute_finta_indicator(name:str, method, ohlcv: pd.DataFrame) -> pd.DataFrame:
+    """
+        Apply a single Finta method to ohlcv data and name its output columns
+        as `{name}_{column}` (or `{name}` when the method returns a column named after itself).
+
+    Parameters
+    ----------
+    name: str
+        Name of the Finta method (i.e "MACD")
+    method: python function
+        The Finta method, taken from `finta_methods()`
+    ohlcv: pd.DataFrame
+        Open, high, low, close stock prices with volumes.
+    """
+    ind_df = method(ohlcv)
+    if name.lower() not in ind_df.columns :
+        ind_df = ind_df.add_prefix(f"{name}_")
+    elif len(ind_df.columns)>1:
+        #Change only columns name if different than indicator name
+        ind_df.columns = [col if col.lower()==name.lower() else f"{name}_{col}" for col in ind_df.columns]
+    return ind_df
+
+def compute_finta_metrics(ohlcv: pd.DataFrame, methods: Optional[List[str]] = None) -> pd.DataFrame:
     """
         Generates Financial Technical Analysis features.
         More information on the methods implemented in Finta librairy documentation: 
@@ -22,6 +56,9 @@ def compute_finta_metrics(ohlcv: pd.DataFrame) -> pd.DataFrame:
     ----------
     ohlcv: pd.DataFrame
         Open, high, low, close stock prices with volumes and with dates as indexes.
+    methods: list of str, default=None
+        Names of the Finta methods to compute. All methods are computed if None.
+        Partial computations do not update nor filter on `cfg.FINTA_COLS`.
 
     Example:
     --------
@@ -34,26 +71,26 @@ def compute_finta_metrics(ohlcv: pd.DataFrame) -> pd.DataFrame:
     """
     if isinstance(ohlcv, pd.Series):
         ohlcv = pd.DataFrame(ohlcv).T
+    else:
+        # Some Finta methods add columns to their input, which may be a view shared by a Stock
+        ohlcv = ohlcv.copy()
 
+    selected = finta_methods() if methods is None else [(name, method) for name, method in finta_methods() if name in methods]
     inds = [ohlcv]
     error_count = 0
-    for name, method in FINTA_METHODS:
+    for name, method in selected:
         try:
-            ind_df = method(ohlcv)
-            if name.lower() not in ind_df.columns :
-                ind_df = ind_df.add_prefix(f"{name}_")
-            elif len(ind_df.columns)>1:
-                #Change only columns name if different than indicator name
-                ind_df.columns = [col if col.lower()==name.lower() else f"{name}_{col}" for col in ind_df.columns]
-            inds.append(ind_df)
+            inds.append(compute_finta_indicator(name, method, ohlcv))
         except Exception as e:
             logging.debug(f"Fail during processing of {name} method")
             logging.debug(e)
             error_count += 1
-    logging.info(f"{error_count} errors occured during finta features generation ({round(error_count/len(FINTA_METHODS)*100,2)}% of methods).")
+    logging.info(f"{error_count} errors occured during finta features generation ({round(error_count/max(len(selected), 1)*100,2)}% of methods).")
     
     finta_ind = pd.concat(inds, axis=1, ignore_index=False)
     finta_ind = drop_unconsistant_columns(finta_ind)
+    if methods is not None:
+        return finta_ind
     
     #Set up columns filter to enjure output shape consistency
     if cfg.FINTA_COLS is None:
@@ -72,9 +109,10 @@ class FintaTransformer(TransformerMixin, BaseEstimator):
         This class is design to be used in scikit-learn pipeline
 
     """
-    def __init__(self, buffer_size:int=98) -> None:
+    def __init__(self, buffer_size:int=98, methods:Optional[List[str]]=None) -> None:
         super().__init__()
         self.buffer_size = buffer_size # Amount of past values needed to compute all indicators
+        self.methods = methods # Finta methods to compute, all of them if None
         self._buffer = []
         self.input_columns = None
         self.output_columns = None
@@ -116,11 +154,13 @@ class FintaTransformer(TransformerMixin, BaseEstimator):
         Xt : ndarray of shape (n_samples, n_features)
             Transformed data.
         """
-        print(f"--- transform {self.__class__.__name__} ---")
-        if not isinstance(X, pd.DataFrame) and not isinstance(X, pd.Series):
+        logging.debug(f"--- transform {self.__class__.__name__} ---")
+        if isinstance(X, pd.Series):
+            X = pd.DataFrame(X).T
+        elif not isinstance(X, pd.DataFrame):
             X = pd.DataFrame(X, columns=self.input_columns)
 
-        n = len(X) if not isinstance(X, pd.Series) else 1
+        n = len(X)
 
         if n < self.buffer_size:
             missing_values_count = self.buffer_size - n
@@ -128,10 +168,11 @@ class FintaTransformer(TransformerMixin, BaseEstimator):
             X_tr = previous_values.append(X)
         else :
             X_tr = X.copy()
-                
-        self._buffer = X.iloc[-self.buffer_size:]
+        
+        # Roll the buffer forward so that consecutive partial transforms see the full window
+        self._buffer = X_tr.iloc[-self.buffer_size:]
 
-        X_tr = compute_finta_metrics(X_tr)
+        X_tr = compute_finta_metrics(X_tr, methods=self.methods)
         return X_tr.iloc[-n:]
 
 FINTA_TRANSFORMER = FintaTransformer()
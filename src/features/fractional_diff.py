@@ -0,0 +1,175 @@
+""" Fractional differencing of features, stationary while keeping the memory of their levels.
+
+ The fractional difference of order d of a series is its convolution with the
+ weights of the binomial expansion of (1 - B)^d, B being the backshift operator.
+ Weights are cut off once they fall below a tolerance, giving a fixed-width kernel
+ (0 < d < 1 keeps a long memory, d = 0 is the series itself, d = 1 the first
+ difference). Instead of a sliding dot product in O(n·w) per column, the kernels of
+ all orders are applied to all columns with FFT convolutions in O(n·log n): the
+ transform of the input columns is computed once and multiplied by the transform of
+ each kernel."""
+
+import logging
+from typing import List
+
+import numpy as np
+import pandas as pd
+from scipy.fft import irfft, next_fast_len, rfft
+from sklearn.base import BaseEstimator, TransformerMixin
+
+import src.config as cfg
+
+SUFFIX = "fracdiff" # Output columns are named `{column}_fracdiff_{d}`
+
+
+def fractional_weights(d:float, threshold:float=cfg.FRACDIFF_THRESHOLD, max_width:int=cfg.FRACDIFF_MAX_WIDTH) -> np.ndarray:
+    """
+        Weights of the fractional difference of order d, from the current value backward.
+
+        Parameters
+        ----------
+        d: float
+            Order of the difference
+        threshold: float
+            Weights are kept until the first one whose absolute value is below threshold
+        max_width: int
+            Largest amount of weights
+
+        Returns
+        -------
+        np.ndarray of shape (width,)
+            w_0 = 1, w_k = -w_{k-1} * (d - k + 1) / k
+    """
+    weights = [1.]
+    for k in range(1, max_width):
+        weight = -weights[-1] * (d - k + 1) / k
+        if abs(weight) < threshold:
+            break
+        weights.append(weight)
+    return np.array(weights)
+
+
+def fractional_differences(values:np.ndarray, weights:List[np.ndarray]) -> np.ndarray:
+    """
+        Fractional differences of all columns for several kernels, by FFT convolution.
+
+        Parameters
+        ----------
+        values: np.ndarray of shape (n_rows, n_features)
+            Features in time order, NaN allowed
+        weights: list of np.ndarray
+            Kernels returned by `fractional_weights`
+
+        Returns
+        -------
+        np.ndarray of shape (n_rows, len(weights) * n_features)
+            Differences of each kernel in turn. Rows whose window is incomplete or holds a NaN are NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    n, n_features = values.shape
+    nans = np.isnan(values)
+    counts = (~nans).sum(axis=0)
+    # Centered columns: the rounding errors of the FFT scale with the levels of the columns
+    centers = np.where(counts > 0, np.where(nans, 0., values).sum(axis=0) / np.maximum(counts, 1), 0.)
+    filled = np.where(nans, 0., values - centers)
+    nfft = next_fast_len(n + max(len(w) for w in weights) - 1, real=True)
+    spectrum = rfft(filled, nfft, axis=0)
+    nan_counts = np.vstack([np.zeros((1, n_features), dtype=np.int64), np.cumsum(nans, axis=0)])
+
+    out = np.empty((n, len(weights) * n_features))
+    for i, w in enumerate(weights):
+        width = len(w)
+        diffs = out[:, i * n_features:(i + 1) * n_features]
+        diffs[:] = irfft(spectrum * rfft(w, nfft)[:, None], nfft, axis=0)[:n]
+        diffs += centers * w.sum()
+        diffs[:width - 1] = np.nan
+        window_nans = nan_counts[width:] - nan_counts[:n - width + 1]
+        diffs[width - 1:][window_nans > 0] = np.nan
+    return out
+
+
+def fracdiff_column(column:str, d:float) -> str:
+    return f"{column}_{SUFFIX}_{d:g}"
+
+
+class FractionalDifferentiator(TransformerMixin, BaseEstimator):
+    """Replace features by their fractional differences of several orders.
+
+    As moving scalers, the end of the training rows is kept as buffer: inputs shorter than
+    the kernel are completed with the previous rows, so that single bars get their
+    differences, and the buffer is rolled forward by each transform.
+    As column cleaning steps, the output columns are published in `cfg.CURRENT_COLS`
+    so that the naming step of the scalers follows them. The order 0 gives the features themselves.
+
+    This class is design to be used in scikit-learn pipeline
+
+    Parameters
+    ----------
+    d_values: list of float
+        Orders of the differences
+    threshold: float
+        Tolerance of the weights cut off (see `fractional_weights`)
+    max_width: int
+        Largest width of the kernels
+
+    Example:
+    --------
+    ```Python
+        pipeline = clone(FEATURES_PIPELINE)
+        pipeline.steps.insert(2, ("fracdiff", FractionalDifferentiator(d_values=[0., 0.4])))
+        X = pipeline.fit_transform(stock.ohlcv)
+    ```
+    """
+
+    def __init__(self, d_values:List[float]=cfg.FRACDIFF_D_VALUES, threshold:float=cfg.FRACDIFF_THRESHOLD,
+                 max_width:int=cfg.FRACDIFF_MAX_WIDTH) -> None:
+        self.d_values = d_values
+        self.threshold = threshold
+        self.max_width = max_width
+
+    def fit(self, X:pd.DataFrame, y=None):
+        """Compute the kernels and save the end of the training rows as buffer.
+        Parameters
+        ----------
+        X : pd.DataFrame of shape (n_samples, n_features)
+            Features in time order.
+        y : None
+            Ignored.
+        Returns
+        -------
+        self : object
+            Fitted transformer.
+        """
+        self.weights_ = [fractional_weights(d, self.threshold, self.max_width) for d in self.d_values]
+        self.width_ = max(len(w) for w in self.weights_)
+        self.buffer_ = X.iloc[max(len(X) - (self.width_ - 1), 0):]
+        logging.debug(f"Fractional differencing kernels of {[len(w) for w in self.weights_]} weights")
+        return self
+
+    def transform(self, X) -> pd.DataFrame:
+        """Fractional differences of the features of X.
+        If X contains less values than the kernel width, X is completed with previous values saved in buffer.
+        Parameters
+        ----------
+        X : pd.DataFrame or pd.Series of shape (n_samples, n_features)
+            Input data that will be transformed.
+        Returns
+        -------
+        Xt : pd.DataFrame of shape (n_samples, len(d_values) * n_features)
+            `{column}_fracdiff_{d}` columns of each order in turn.
+        """
+        logging.debug(f"--- transform {self.__class__.__name__} ---")
+        if isinstance(X, pd.Series):
+            X = X.to_frame().T
+        n = len(X)
+        if n < self.width_:
+            X_tr = pd.concat([self.buffer_.iloc[max(len(self.buffer_) - (self.width_ - 1), 0):], X])
+        else:
+            X_tr = X
+        # Roll the buffer forward so that consecutive partial transforms see the full kernel
+        self.buffer_ = X_tr.iloc[max(len(X_tr) - (self.width_ - 1), 0):].copy()
+
+        values = fractional_differences(X_tr.to_numpy(dtype=float), self.weights_)[len(X_tr) - n:]
+        columns = [fracdiff_column(col, d) for d in self.d_values for col in X.columns]
+        cfg.CURRENT_COLS = list(columns)
+        return pd.DataFrame(values, index=X.index, columns=columns)
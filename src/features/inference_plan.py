@@ -0,0 +1,359 @@
+""" This file describes the compiled inference path of a fitted features pipeline.
+
+ Scoring a single bar through `FEATURES_PIPELINE.transform` converts the row into
+ one-row DataFrames at each step, dispatches through FeatureUnion and rebuilds
+ column names. The InferencePlan below reads the fitted state once and then
+ scores bars on preallocated numpy arrays.
+
+ Finta indicators computed from a few reductions of the window (pivots, bands,
+ Ichimoku lines) are compiled into the numpy kernels of FINTA_KERNELS. The other
+ kept Finta methods still run through pandas on a DataFrame of the window at each
+ bar: they dominate the latency of the plan (about 65ms p50 and 90ms p99 for the
+ default pipeline on synthetic daily bars, against the INFERENCE_P99_TARGET_MS
+ target, see `src/benchmarks/latency.py`)."""
+
+import copy
+import logging
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline, FeatureUnion
+from sklearn.preprocessing import FunctionTransformer, StandardScaler, MinMaxScaler
+
+import src.config as cfg
+from src.features.drift import DriftMonitor
+from src.features.fractional_diff import FractionalDifferentiator, fracdiff_column
+from src.features.finta_transformer import FintaTransformer, finta_methods, compute_finta_indicator
+from src.features.nan_handlers import UnconsistantColumnDroper
+from src.features.passthrough import passthrough
+from src.features.redundancy import RedundantColumnDroper
+from src.features.scalers import (MovingStandardScaler, MovingMinMaxScaler, EWStandardScaler, MovingRobustScaler,
+                                  rolling_moments)
+
+
+# FunctionTransformer functions which only rename columns or log: no-op on arrays
+NAMING_FUNCTIONS = ["reformat_scaling_output", "log_step", "passthrough", "offset_nan"]
+
+
+def _pivot(high:np.ndarray, low:np.ndarray, close:np.ndarray) -> np.ndarray:
+    """ Classic pivot points of the previous bar: pivot, s1-s4, r1-r4."""
+    h, l = high[-2], low[-2]
+    pivot = (h + l + close[-2]) / 3
+    return np.array([pivot, pivot * 2 - h, pivot - (h - l), l - 2 * (h - pivot), l - 3 * (h - pivot),
+                     pivot * 2 - l, pivot + (h - l), h + 2 * (pivot - l), h + 3 * (pivot - l)])
+
+
+def _pivot_fib(high:np.ndarray, low:np.ndarray, close:np.ndarray) -> np.ndarray:
+    """ Fibonacci pivot points of the previous bar: pivot, s1-s4, r1-r4."""
+    h, l = high[-2], low[-2]
+    pivot = (h + l + close[-2]) / 3
+    levels = np.array([0.382, 0.618, 1., 1.382]) * (h - l)
+    return np.concatenate([[pivot], pivot - levels, pivot + levels])
+
+
+def _bbands(close:np.ndarray, period:int, std_multiplier:float) -> np.ndarray:
+    """ Upper, middle and lower Bollinger bands."""
+    window = close[-period:]
+    middle = window.mean()
+    std = window.std(ddof=1)
+    return np.array([middle + std_multiplier * std, middle, middle - std_multiplier * std])
+
+
+def _midrange(high:np.ndarray, low:np.ndarray, period:int, shift:int=0) -> float:
+    stop = len(high) - shift
+    return (high[stop - period:stop].max() + low[stop - period:stop].min()) / 2
+
+
+def _ichimoku(high:np.ndarray, low:np.ndarray, close:np.ndarray) -> np.ndarray:
+    """ Tenkan, kijun, senkou spans a and b (shifted by 26 bars) and chikou (always NaN on the last bar)."""
+    senkou_a = (_midrange(high, low, 9, 26) + _midrange(high, low, 26, 26)) / 2
+    return np.array([_midrange(high, low, 9), _midrange(high, low, 26), senkou_a, _midrange(high, low, 52, 26), np.nan])
+
+
+# Finta methods computed on the high, low and close arrays of the window: {name: kernel returning
+# the last row of the method outputs}. Kernels must match `compute_finta_indicator` on the window.
+FINTA_KERNELS = {
+    "PIVOT": _pivot,
+    "PIVOT_FIB": _pivot_fib,
+    "BBANDS": lambda high, low, close: _bbands(close, 20, 2),
+    "MOBO": lambda high, low, close: _bbands(close, 10, 0.8),
+    "ICHIMOKU": _ichimoku,
+}
+
+
+class InferencePlan:
+    """Scoring of the latest bar through a fitted features pipeline on preallocated arrays.
+
+    The plan is compiled from a fitted pipeline (i.e `FEATURES_PIPELINE` after `fit_transform`).
+    It copies the buffers of the fitted transformers in ring buffers and only runs the
+    Finta methods producing the columns kept by the pipeline. Steps following Finta run on
+    numpy arrays, as the methods of FINTA_KERNELS, but the other Finta methods still build a
+    DataFrame of the window and run through pandas at each bar. Methods failing on the fit
+    buffer are not compiled, a warning lists them if kept columns are left NaN.
+    Drift monitors of the pipeline are copied in `drift_monitors` ({step name: DriftMonitor})
+    and updated by each bar. The pipeline itself is left untouched.
+
+    Parameters
+    ----------
+    pipeline: sklearn.pipeline.Pipeline
+        Fitted features pipeline
+    estimator: sklearn estimator, default=None
+        Fitted model used by `score`. Must implement `predict_proba` or `predict`.
+
+    Example:
+    --------
+    ```Python
+        from src.features.build_features import FEATURES_PIPELINE
+        X, y = stock.training_data
+        FEATURES_PIPELINE.fit_transform(X, y)
+        plan = InferencePlan(FEATURES_PIPELINE)
+        features = plan.update(stock.last_data)
+    ```
+    """
+
+    def __init__(self, pipeline:Pipeline, estimator=None) -> None:
+        self.estimator = estimator
+        self._stages = []
+        self.input_columns = None
+        self.output_columns = None
+        self.drift_monitors = {}
+        self._compile(pipeline)
+
+    # ----------- Compilation -----------
+
+    def _compile(self, pipeline:Pipeline):
+        steps = [step for _, step in pipeline.steps]
+        columns = None
+        for i, (name, step) in enumerate(pipeline.steps):
+            if isinstance(step, FintaTransformer):
+                next_step = steps[i+1] if i+1 < len(steps) else None
+                columns = self._compile_finta(step, next_step)
+            elif isinstance(step, UnconsistantColumnDroper):
+                columns = self._compile_selection(columns, step.col_slot)
+            elif isinstance(step, FeatureUnion):
+                columns = self._compile_union(step, columns)
+            elif isinstance(step, FractionalDifferentiator):
+                columns = self._compile_fracdiff(step, columns)
+            elif isinstance(step, FunctionTransformer) and step.func.__name__ in NAMING_FUNCTIONS:
+                continue
+            elif isinstance(step, RedundantColumnDroper):
+                columns = self._compile_selection(columns, step.selected_columns_)
+            elif isinstance(step, DriftMonitor):
+                self._compile_monitor(name, step)
+            else:
+                raise TypeError(f"{step.__class__.__name__} step can not be compiled in an inference plan.")
+        self.output_columns = columns
+        self._out = np.empty(len(columns))
+        logging.info(f"Inference plan compiled with {len(self._stages)} stages and {len(columns)} output features.")
+
+    def _compile_finta(self, finta:FintaTransformer, next_step) -> List[str]:
+        buffer = finta._buffer
+        self.input_columns = list(buffer.columns)
+        if isinstance(next_step, UnconsistantColumnDroper) and next_step.col_slot is not None:
+            columns = list(next_step.col_slot)
+        else:
+            columns = list(cfg.FINTA_COLS)
+
+        self._ohlcv = np.array(buffer.values, dtype=float)
+        self._ohlcv_frame_index = pd.RangeIndex(len(self._ohlcv))
+        position = {col: i for i, col in enumerate(columns)}
+
+        # Raw columns are copied from the input row
+        self._raw_src = np.array([self.input_columns.index(c) for c in columns if c in self.input_columns], dtype=int)
+        self._raw_dst = np.array([position[c] for c in columns if c in self.input_columns], dtype=int)
+
+        # Keep only Finta methods feeding at least one of the selected columns
+        self._finta_methods = []
+        dropped = []
+        df = pd.DataFrame(self._ohlcv, columns=self.input_columns, index=self._ohlcv_frame_index)
+        for name, method in finta_methods():
+            if finta.methods is not None and name not in finta.methods:
+                continue
+            try:
+                ind_df = compute_finta_indicator(name, method, df)
+            except Exception as e:
+                dropped.append(name)
+                logging.debug(repr(e))
+                continue
+            src = [j for j, col in enumerate(ind_df.columns) if col in position]
+            if len(src) > 0:
+                dst = [position[ind_df.columns[j]] for j in src]
+                self._finta_methods.append((name, method, np.array(src, dtype=int), np.array(dst, dtype=int)))
+        # Kept columns produced by none of the compiled methods stay NaN
+        filled = set(self._raw_dst).union(*(dst for _, _, _, dst in self._finta_methods))
+        missing = [col for col in columns if position[col] not in filled]
+        if len(missing) > 0:
+            logging.warning(f"Finta methods {dropped} failed on the fit buffer and are not compiled: "
+                            f"columns {missing} of the plan are NaN, unlike pipeline.transform.")
+        elif len(dropped) > 0:
+            logging.info(f"Finta methods {dropped} failed on the fit buffer, they produce none of the kept columns.")
+
+        self._kernels = [(FINTA_KERNELS[name], src, dst) for name, _, src, dst in self._finta_methods
+                         if name in FINTA_KERNELS]
+        self._finta_methods = [method for method in self._finta_methods if method[0] not in FINTA_KERNELS]
+        self._hlc = [self.input_columns.index(col) for col in (cfg.HIGH, cfg.LOW, cfg.CLOSE)]
+        self._finta_row = np.full(len(columns), np.nan)
+        self._stages.append(self._run_finta)
+        return columns
+
+    def _compile_selection(self, columns:List[str], selected:List[str]) -> List[str]:
+        if selected is None:
+            return columns
+        position = {col: i for i, col in enumerate(columns)}
+        idx = np.array([position[col] for col in selected], dtype=int)
+        out = np.empty(len(idx))
+        def select(x):
+            return np.take(x, idx, out=out)
+        self._stages.append(select)
+        return list(selected)
+
+    def _compile_union(self, union:FeatureUnion, columns:List[str]) -> List[str]:
+        n = len(columns)
+        history = self._union_history(union, n)
+        names = []
+        ops = []
+        for name, transformer in union.transformer_list:
+            ops.append(self._compile_scaler(name, transformer, n, history))
+            names += columns if name == cfg.PASSTHROUGH_NAME else [f"{col}_{name}" for col in columns]
+
+        out = np.empty(n * len(ops))
+        def union_stage(x):
+            if history is not None:
+                history[:-1] = history[1:]
+                history[-1] = x
+            for i, op in enumerate(ops):
+                out[i*n:(i+1)*n] = op(x)
+            return out
+        self._stages.append(union_stage)
+        return names
+
+    @staticmethod
+    def _union_history(union:FeatureUnion, n:int):
+        """ History of union inputs shared by moving scalers, initialised from their largest buffer."""
+        moving = [t for _, t in union.transformer_list if isinstance(t, (MovingStandardScaler, MovingMinMaxScaler))]
+        if len(moving) == 0:
+            return None
+        history = np.full((max(t.window for t in moving), n), np.nan)
+        buffer = max((t.buffer_ for t in moving), key=len).values[-len(history):]
+        history[len(history)-len(buffer):] = buffer
+        return history
+
+    def _compile_scaler(self, name:str, transformer, n:int, history:np.ndarray):
+        """ Function scaling an input row as the fitted transformer of the union."""
+        if isinstance(transformer, FunctionTransformer) and transformer.func is passthrough:
+            return lambda x: x
+        if isinstance(transformer, (StandardScaler, MinMaxScaler)):
+            return self._compile_static_scaler(transformer, n)
+        if isinstance(transformer, MovingStandardScaler):
+            return lambda x, t=transformer: self._moving_standard(history[-t.window:], x, t)
+        if isinstance(transformer, MovingMinMaxScaler):
+            return lambda x, w=transformer.window: self._moving_minmax(history[-w:], x)
+        if isinstance(transformer, (EWStandardScaler, MovingRobustScaler)):
+            # Streaming scalers update their own state, on a copy
+            return copy.deepcopy(transformer).update
+        raise TypeError(f"{name} ({transformer.__class__.__name__}) can not be compiled in an inference plan.")
+
+    @staticmethod
+    def _compile_static_scaler(transformer, n:int):
+        if isinstance(transformer, MinMaxScaler):
+            return lambda x, t=transformer: x * t.scale_ + t.min_
+        mean = transformer.mean_ if transformer.with_mean else np.zeros(n)
+        scale = transformer.scale_ if transformer.with_std else np.ones(n)
+        return lambda x: (x - mean) / scale
+
+    def _compile_fracdiff(self, fracdiff:FractionalDifferentiator, columns:List[str]) -> List[str]:
+        n = len(columns)
+        history = np.full((fracdiff.width_, n), np.nan)
+        buffer = fracdiff.buffer_.values
+        history[len(history)-len(buffer):] = buffer
+        # Kernels in time order, applied to the end of the history
+        kernels = [w[::-1].copy() for w in fracdiff.weights_]
+        out = np.empty(n * len(kernels))
+        def fracdiff_stage(x):
+            history[:-1] = history[1:]
+            history[-1] = x
+            for i, kernel in enumerate(kernels):
+                np.dot(kernel, history[len(history)-len(kernel):], out=out[i*n:(i+1)*n])
+            return out
+        self._stages.append(fracdiff_stage)
+        return [fracdiff_column(col, d) for d in fracdiff.d_values for col in columns]
+
+    def _compile_monitor(self, name:str, monitor:DriftMonitor) -> None:
+        monitor = copy.deepcopy(monitor)
+        self.drift_monitors[name] = monitor
+        def monitor_stage(x):
+            monitor.update(x)
+            return x
+        self._stages.append(monitor_stage)
+
+    # ----------- Stages -----------
+
+    def _run_finta(self, row:np.ndarray) -> np.ndarray:
+        self._ohlcv[:-1] = self._ohlcv[1:]
+        self._ohlcv[-1] = row
+        df = pd.DataFrame(self._ohlcv, columns=self.input_columns, index=self._ohlcv_frame_index)
+        out = self._finta_row
+        out[self._raw_dst] = row[self._raw_src]
+        high, low, close = (self._ohlcv[:, j] for j in self._hlc)
+        for kernel, src, dst in self._kernels:
+            out[dst] = kernel(high, low, close)[src]
+        for name, method, src, dst in self._finta_methods:
+            try:
+                out[dst] = compute_finta_indicator(name, method, df).values[-1, src]
+            except Exception as e:
+                logging.debug(f"Fail during processing of {name} method")
+                logging.debug(e)
+                out[dst] = np.nan
+        return out
+
+    @staticmethod
+    def _moving_standard(window:np.ndarray, x:np.ndarray, scaler:MovingStandardScaler) -> np.ndarray:
+        means, stds = rolling_moments(window, len(window))
+        x_tr = x
+        if scaler.with_mean:
+            x_tr = x_tr - means[-1]
+        if scaler.with_std:
+            x_tr = x_tr / stds[-1]
+        return x_tr
+
+    @staticmethod
+    def _moving_minmax(window:np.ndarray, x:np.ndarray) -> np.ndarray:
+        mins = window.min(axis=0)
+        return (x - mins) / (window.max(axis=0) - mins)
+
+    # ----------- Scoring -----------
+
+    def update(self, bar) -> np.ndarray:
+        """Push a new bar in the plan and return its features.
+
+        Parameters
+        ----------
+        bar: np.ndarray, pd.Series or dict
+            Open, high, low, close and volume of the bar. Arrays must follow `input_columns` order.
+
+        Returns
+        -------
+        features: np.ndarray of shape (n_features,)
+            Features of the bar, ordered as `output_columns`.
+            The array is reused by the next call: copy it to keep it.
+        """
+        if isinstance(bar, np.ndarray):
+            x = bar.astype(float, copy=False)
+        else:
+            x = np.array([bar[col] for col in self.input_columns], dtype=float)
+        # Constant windows of moving scalers give NaNs, as in the pipeline
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for stage in self._stages:
+                x = stage(x)
+        self._out[:] = x
+        return self._out
+
+    def score(self, bar):
+        """Push a new bar in the plan and return the estimator prediction for it."""
+        if self.estimator is None:
+            raise ValueError("An estimator must be provided to score bars.")
+        features = self.update(bar)[None, :]
+        if hasattr(self.estimator, "predict_proba"):
+            return self.estimator.predict_proba(features)[0, -1]
+        return self.estimator.predict(features)[0]
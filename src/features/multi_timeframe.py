@@ -0,0 +1,143 @@
+""" Multi-timeframe features: higher timeframe context attached to each bar.
+
+ Features are computed at each configured timeframe on bars resampled from the
+ stored bars (see `src.data.resampling`), each timeframe by its own clone of the
+ features pipeline. Higher timeframe features are then joined onto the bars with
+ an as-of join: each bar gets the features of the last higher timeframe bar
+ completed when the bar closes, so that no bar sees a higher timeframe bar still
+ in progress. The join is a single `np.searchsorted` of the bar close times
+ among the completion times of the higher timeframe bars, followed by a take."""
+
+import logging
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+import src.config as cfg
+from src.data.resampling import DAILY, NS_PER_DAY, _time_ns, resample_ohlcv
+
+SUFFIX = "tf" # Higher timeframe columns are named `{column}_tf_{timeframe}`
+
+
+def completion_times(dates:np.ndarray, freq:str, extended_hours:bool=False, session_open:str=cfg.SESSION_OPEN,
+                     session_close:str=cfg.SESSION_CLOSE) -> np.ndarray:
+    """
+        Times at which resampled bars are complete.
+
+        Parameters
+        ----------
+        dates: np.ndarray of datetime64[ns]
+            Start dates of bars returned by `resample_ohlcv` with the same parameters
+        freq, extended_hours, session_open, session_close:
+            Parameters of `resample_ohlcv`
+
+        Returns
+        -------
+        np.ndarray of int64
+            Completion times in nanoseconds, in ascending order: the session close for daily bars
+            (the end of the day with extended hours), the end of the bucket for intraday bars,
+            truncated at the close for buckets of the session.
+    """
+    ns = dates.astype("datetime64[ns]").view(np.int64)
+    days = ns - ns % NS_PER_DAY
+    if freq == DAILY:
+        return days + (NS_PER_DAY if extended_hours else _time_ns(session_close))
+    close = days + _time_ns(session_close)
+    ends = ns + pd.Timedelta(freq).value
+    return np.where(ns < close, np.minimum(ends, close), ends)
+
+
+def asof_indexer(bar_ends:np.ndarray, completed:np.ndarray) -> np.ndarray:
+    """
+        Index of the last higher timeframe bar completed at the end of each bar, -1 if none.
+
+        Parameters
+        ----------
+        bar_ends: np.ndarray of int64
+            Close times of the bars in nanoseconds
+        completed: np.ndarray of int64
+            Ascending completion times of the higher timeframe bars (see `completion_times`)
+    """
+    return np.searchsorted(completed, bar_ends, side="right") - 1
+
+
+def asof_join(values:np.ndarray, indexer:np.ndarray) -> np.ndarray:
+    """ Rows of values at indexer positions, NaN rows for -1 positions."""
+    # The NaN row appended last is the row taken by -1 positions
+    padded = np.vstack([np.asarray(values, dtype=float), np.full((1, values.shape[1]), np.nan)])
+    return padded[indexer]
+
+
+def bar_duration(index:pd.DatetimeIndex) -> pd.Timedelta:
+    """ Smallest interval between consecutive bars, i.e 1 minute for 1-minute bars."""
+    return pd.Timedelta(np.diff(index.values).min())
+
+
+def _fit_features(pipeline:Pipeline, ohlcv:pd.DataFrame) -> pd.DataFrame:
+    """ Fit a clone of the pipeline, whose output rows are re-indexed on the last dates of ohlcv."""
+    # Columns validated by the fit of another timeframe must not filter this one
+    cfg.FINTA_COLS = None
+    features = clone(pipeline).fit_transform(ohlcv)
+    features.index = ohlcv.index[len(ohlcv) - len(features):]
+    return features
+
+
+def multi_timeframe_features(ohlcv:pd.DataFrame, timeframes:List[str]=cfg.TIMEFRAMES, pipeline:Optional[Pipeline]=None,
+                             extended_hours:bool=False, duration:Optional[str]=None) -> pd.DataFrame:
+    """
+        Features of the bars joined with the features of higher timeframes.
+
+        The `src.config` globals filled by the pipeline are left as after fitting it on the bars alone.
+
+        Parameters
+        ----------
+        ohlcv: pd.DataFrame
+            Bars with ascending start dates as index, i.e `Stock.ohlcv` of 1-minute data
+        timeframes: list of str
+            Higher timeframes understood by `resample_ohlcv` (i.e "60min", "daily")
+        pipeline: sklearn.pipeline.Pipeline, default=None
+            Unfitted features pipeline, cloned for each timeframe. Defaults to FEATURES_PIPELINE.
+        extended_hours: bool
+            Build higher timeframe bars with bars outside of the regular session
+        duration: str, default=None
+            Duration of the bars (i.e "1min"), the smallest interval between bars if None
+
+        Returns
+        -------
+        pd.DataFrame
+            Features of the bars (rows dropped by the pipeline excluded) followed by `{column}_tf_{timeframe}`
+            columns, NaN until the first higher timeframe bar with features is completed
+
+        Example:
+        --------
+        ```Python
+            stock = Stock("aapl")  # with INTRADAY_1MIN_FULL settings
+            X = multi_timeframe_features(stock.ohlcv, ["60min", "daily"])
+        ```
+    """
+    if pipeline is None:
+        from src.features.build_features import FEATURES_PIPELINE
+        pipeline = FEATURES_PIPELINE
+    duration = bar_duration(ohlcv.index) if duration is None else pd.Timedelta(duration)
+
+    higher = []
+    for timeframe in timeframes:
+        bars = resample_ohlcv(ohlcv, timeframe, extended_hours=extended_hours)
+        features = _fit_features(pipeline, bars)
+        logging.info(f"{len(features.columns)} features of {len(features)} {timeframe} bars.")
+        higher.append((timeframe, features))
+
+    # Fitted last so that the configuration globals are the ones of the bars
+    X = _fit_features(pipeline, ohlcv)
+    index = X.index if X.index.tz is None else X.index.tz_localize(None)
+    bar_ends = (index + duration).values.view(np.int64)
+    joined = [X]
+    for timeframe, features in higher:
+        completed = completion_times(features.index.values, timeframe, extended_hours)
+        values = asof_join(features.values, asof_indexer(bar_ends, completed))
+        joined.append(pd.DataFrame(values, index=X.index,
+                                   columns=[f"{column}_{SUFFIX}_{timeframe}" for column in features.columns]))
+    return pd.concat(joined, axis=1)
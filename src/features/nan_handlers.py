@@ -1,3 +1,4 @@
+import logging
 from typing import Tuple
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
@@ -15,7 +16,7 @@ def drop_unconsistant_columns(df:pd.DataFrame) -> pd.DataFrame:
         nans = df[col].isna()
         first_valid_idx = df[col].first_valid_index()
         if nans.loc[first_valid_idx:].sum()>0:
-            print(f"{col} -> DROPED")
+            logging.debug(f"{col} -> DROPED")
             cols_to_drop.append(col)
 
     df.drop(columns=cols_to_drop, inplace=True)
@@ -24,6 +25,7 @@ def drop_unconsistant_columns(df:pd.DataFrame) -> pd.DataFrame:
 
 class UnconsistantColumnDroper(TransformerMixin, BaseEstimator):
     def __init__(self, col_config_slot=cfg.CURRENT_COLS):
+        self.col_config_slot = col_config_slot
         self.col_slot = col_config_slot
     
     def fit(self, X:pd.DataFrame, y=None)->pd.DataFrame:
@@ -31,13 +33,12 @@ class UnconsistantColumnDroper(TransformerMixin, BaseEstimator):
     
     def transform(self, X:pd.DataFrame, y=None)-> pd.DataFrame:
         X = drop_unconsistant_columns(X)
-        print(X)
         if self.col_slot is None:
             self.col_slot = list(X.columns)
         return X[self.col_slot]
 
 def offset_nan(X:pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    print("--- Offset NaNs ---")
+    logging.debug("--- Offset NaNs ---")
     first_valid_indexes = []
     for col in X.columns:
         nans = X[col].isna()
@@ -0,0 +1,256 @@
+""" This file describes the instrumentation layer of the features pipeline.
+
+ Any step of a scikit-learn pipeline can be wrapped in a ProfiledStep which records
+ wall time, CPU time, peak memory delta, input and output shapes and dtypes in a
+ PipelineTrace. Traces can be exported as JSON or in Chrome trace-event format
+ (open it in chrome://tracing or https://ui.perfetto.dev)."""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline, FeatureUnion
+
+from src.features.finta_transformer import FintaTransformer, finta_methods
+
+
+def describe_data(X) -> dict:
+    """ Shape and dtypes of a step input or output."""
+    if isinstance(X, tuple):
+        X = X[0]
+    if isinstance(X, pd.DataFrame):
+        dtypes = {str(k): int(v) for k, v in X.dtypes.astype(str).value_counts().items()}
+    elif isinstance(X, pd.Series):
+        dtypes = {str(X.dtype): 1}
+    elif isinstance(X, np.ndarray):
+        dtypes = {str(X.dtype): X.shape[1] if X.ndim > 1 else 1}
+    else:
+        return {"shape": None, "dtypes": None}
+    return {"shape": list(X.shape), "dtypes": dtypes}
+
+
+def finta_column_counts(X:pd.DataFrame) -> dict:
+    """
+        Count the columns generated by each Finta indicator and the valid (not NaN) values of each column.
+        Raw price and volume columns are gathered under the `ohlcv` key.
+    """
+    names = sorted([name for name, _ in finta_methods()], key=len, reverse=True)
+    per_indicator = {}
+    for col in X.columns:
+        indicator = next((name for name in names if col == name or col.startswith(f"{name}_")), "ohlcv")
+        per_indicator[indicator] = per_indicator.get(indicator, 0) + 1
+    valid_counts = {str(col): int(count) for col, count in X.notna().sum().items()}
+    return {"columns_per_indicator": per_indicator, "valid_counts": valid_counts}
+
+
+class PipelineTrace:
+    """Records of profiled pipeline steps.
+
+    Parameters
+    ----------
+    enabled: bool, default=True
+        When False, profiled steps call the wrapped step directly and nothing is recorded.
+    memory: bool, default=True
+        Track peak memory with tracemalloc. It slows down the traced steps.
+    """
+
+    def __init__(self, enabled:bool=True, memory:bool=True) -> None:
+        self.enabled = enabled
+        self.memory = memory
+        self.records = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def running(self) -> list:
+        """ [name, peak memory] of the profiled calls in progress in this thread, outermost first."""
+        if not hasattr(self._local, "running"):
+            self._local.running = []
+        return self._local.running
+
+    def add(self, record:dict):
+        with self._lock:
+            self.records.append(record)
+
+    def clear(self):
+        self.records = []
+        self._origin = time.perf_counter()
+
+    def to_json(self, path:Optional[str]=None) -> str:
+        """ Dump records as a JSON list, in a file if path is given."""
+        dump = json.dumps(self.records, indent=2)
+        if path is not None:
+            with open(path, 'w') as fp:
+                fp.write(dump)
+        return dump
+
+    def to_chrome_trace(self, path:Optional[str]=None) -> dict:
+        """ Convert records in Chrome trace-event format, in a file if path is given."""
+        events = []
+        for record in self.records:
+            events.append({
+                "name": record["step"],
+                "cat": record["method"],
+                "ph": "X",
+                "ts": (record["start"] - self._origin) * 1e6,
+                "dur": record["wall_time"] * 1e6,
+                "pid": record["pid"],
+                "tid": record["tid"],
+                "args": {k: v for k, v in record.items() if k not in ("step", "method", "start", "pid", "tid")},
+            })
+        trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+        if path is not None:
+            with open(path, 'w') as fp:
+                json.dump(trace, fp)
+        return trace
+
+
+class ProfiledStep(TransformerMixin, BaseEstimator):
+    """Wrap a pipeline step to record its fit and transform calls in a PipelineTrace.
+
+    The wrapped step keeps its state: fitting the profiled step fits the wrapped one.
+
+    Parameters
+    ----------
+    step: estimator
+        The wrapped pipeline step
+    name: str
+        Name of the step in records
+    trace: PipelineTrace
+        Trace collecting the records
+    """
+
+    def __init__(self, step, name:str, trace:PipelineTrace) -> None:
+        self.step = step
+        self.name = name
+        self.trace = trace
+
+    def fit(self, X, y=None, **fit_params):
+        if not self.trace.enabled:
+            self.step.fit(X, y, **fit_params)
+            return self
+        self._profile("fit", self.step.fit, X, y, **fit_params)
+        return self
+
+    def transform(self, X):
+        if not self.trace.enabled:
+            return self.step.transform(X)
+        return self._profile("transform", self.step.transform, X)
+
+    def fit_transform(self, X, y=None, **fit_params):
+        if not self.trace.enabled:
+            return self.step.fit_transform(X, y, **fit_params)
+        return self._profile("fit_transform", self.step.fit_transform, X, y, **fit_params)
+
+    def _profile(self, method:str, func, X, *args, **kwargs):
+        running = self.trace.running
+        parent = running[-1] if len(running) > 0 else None
+        memory = _start_memory(parent) if self.trace.memory else None
+        running.append([self.name, 0])
+
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            X_tr = func(X, *args, **kwargs)
+        finally:
+            wall_time, cpu_time = time.perf_counter() - start, time.process_time() - cpu_start
+            _, children_peak = running.pop()
+
+        record = {
+            "step": self.name,
+            "method": method,
+            "parent": None if parent is None else parent[0],
+            "start": start,
+            "wall_time": wall_time,
+            "cpu_time": cpu_time,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "input": describe_data(X),
+        }
+        if memory is not None:
+            record["peak_memory_delta"] = _stop_memory(parent, children_peak, *memory)
+        if method != "fit":
+            record["output"] = describe_data(X_tr)
+            if isinstance(self.step, FintaTransformer) and isinstance(X_tr, pd.DataFrame):
+                record["finta"] = finta_column_counts(X_tr)
+        self.trace.add(record)
+        return X_tr
+
+
+def _start_memory(parent:Optional[list]) -> tuple:
+    """ Start tracking the peak memory of a call. Returns the traced memory before the call and
+    whether tracemalloc was started for it."""
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    memory_before, peak = tracemalloc.get_traced_memory()
+    # Peak is reset so that the delta only accounts for this call,
+    # the peak reached so far by the enclosing call is kept aside
+    if parent is not None:
+        parent[1] = max(parent[1], peak)
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    return memory_before, started_tracing
+
+
+def _stop_memory(parent:Optional[list], children_peak:int, memory_before:int, started_tracing:bool) -> int:
+    """ Peak memory delta of a call, whose peak is passed on to the enclosing call."""
+    peak = max(tracemalloc.get_traced_memory()[1], children_peak)
+    if parent is not None:
+        parent[1] = max(parent[1], peak)
+    if started_tracing:
+        tracemalloc.stop()
+    return peak - memory_before
+
+
+def instrument_pipeline(pipeline:Pipeline, trace:Optional[PipelineTrace]=None, recursive:bool=True) -> Pipeline:
+    """
+        Build a pipeline whose steps are wrapped in ProfiledStep.
+        The instrumented pipeline shares its steps with the original one,
+        so fitting either of them fits both.
+
+        Parameters
+        ----------
+        pipeline: sklearn.pipeline.Pipeline
+            i.e FEATURES_PIPELINE
+        trace: PipelineTrace, default=None
+            Trace collecting the records. A new enabled trace is created if None.
+        recursive: bool, default=True
+            Also wrap the transformers of FeatureUnion steps (i.e each scaler).
+
+        Returns
+        -------
+        pipeline: sklearn.pipeline.Pipeline
+            The instrumented pipeline. Its trace is available as `pipeline.trace`.
+    """
+    trace = PipelineTrace() if trace is None else trace
+    steps = [(name, _wrap(name, step, trace, recursive)) for name, step in pipeline.steps]
+    instrumented = Pipeline(steps)
+    instrumented.trace = trace
+    return instrumented
+
+
+def _wrap(name:str, step, trace:PipelineTrace, recursive:bool) -> ProfiledStep:
+    if recursive and isinstance(step, FeatureUnion):
+        transformers = [(f"{name}.{sub_name}", ProfiledStep(sub_step, f"{name}.{sub_name}", trace))
+                        for sub_name, sub_step in step.transformer_list]
+        step = FeatureUnion(transformers, n_jobs=step.n_jobs, transformer_weights=step.transformer_weights)
+    return ProfiledStep(step, name, trace)
+
+
+def trace_summary(trace:PipelineTrace) -> List[dict]:
+    """ Total wall time, CPU time and calls per step and method."""
+    summary = {}
+    for record in trace.records:
+        key = (record["step"], record["method"])
+        s = summary.setdefault(key, {"step": key[0], "method": key[1], "calls": 0, "wall_time": 0., "cpu_time": 0.})
+        s["calls"] += 1
+        s["wall_time"] += record["wall_time"]
+        s["cpu_time"] += record["cpu_time"]
+    return sorted(summary.values(), key=lambda s: s["wall_time"], reverse=True)
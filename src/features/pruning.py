@@ -0,0 +1,182 @@
+""" This file describes the demand-driven pruning of the features pipeline.
+
+ Output columns are named `{indicator}_{scaler}_{distance}`, the passthrough
+ scaler and distance adding no suffix. Given the columns a model needs
+ (i.e `cfg.SELECTED_COLS`), their lineage is traced back through this naming
+ scheme so that a pruned pipeline only runs the Finta methods, scalers and
+ distances feeding them."""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.pipeline import Pipeline
+
+import src.config as cfg
+from src.features.finta_transformer import FintaTransformer, finta_methods
+from src.features.nan_handlers import UnconsistantColumnDroper, OFFSET_NAN_DROPER
+from src.features.scalers import SCALERS
+from src.features.distances import DISTANCES
+
+
+def _strip_suffix(column:str, names:List[str]) -> Tuple[str, str]:
+    """ Split `{prefix}_{name}` for the longest matching name, passthrough otherwise."""
+    for name in sorted(names, key=len, reverse=True):
+        if name != cfg.PASSTHROUGH_NAME and column.endswith(f"_{name}"):
+            return column[:-len(name)-1], name
+    return column, cfg.PASSTHROUGH_NAME
+
+
+def parse_feature_name(column:str) -> Dict[str, Optional[str]]:
+    """
+        Trace the lineage of an output column of the features pipeline.
+
+        Parameters
+        ----------
+        column: str
+            i.e "MACD_SIGNAL_moving_standard_scaler_sma3_distance"
+
+        Returns
+        -------
+        dict
+            `finta_column` (i.e "MACD_SIGNAL"), `method` (i.e "MACD", None for raw OHLCV columns),
+            `scaled_column` (i.e "MACD_SIGNAL_moving_standard_scaler"), `scaler` and `distance` names.
+    """
+    scaled_column, distance = _strip_suffix(column, [name for name, _ in DISTANCES])
+    finta_column, scaler = _strip_suffix(scaled_column, [name for name, _ in SCALERS])
+    method_names = sorted([name for name, _ in finta_methods()], key=len, reverse=True)
+    method = next((name for name in method_names if finta_column == name or finta_column.startswith(f"{name}_")), None)
+    if method is None and finta_column not in cfg.OHLC + cfg.OHLCV:
+        # Some Finta methods name their only column in lower case (i.e "psar", "pivot")
+        method = next((name for name in method_names if finta_column.upper() == name), None)
+    if method is None and finta_column not in cfg.OHLC + cfg.OHLCV:
+        logging.warning(f"{column} does not come from a known Finta method.")
+    return {
+        "finta_column": finta_column,
+        "method": method,
+        "scaled_column": scaled_column,
+        "scaler": scaler,
+        "distance": distance,
+    }
+
+
+def trace_lineage(columns:List[str]) -> Dict[str, object]:
+    """
+        Gather the upstream work needed to produce the given output columns.
+
+        Returns
+        -------
+        dict
+            `methods`: Finta methods to run,
+            `finta_columns`: Finta columns to keep,
+            `scalers`: {scaler name: Finta columns to scale},
+            `distances`: {distance name: scaled columns to compare with their reference}
+    """
+    methods, finta_columns, scalers, distances = [], [], {}, {}
+    for column in columns:
+        lineage = parse_feature_name(column)
+        if lineage["method"] is not None and lineage["method"] not in methods:
+            methods.append(lineage["method"])
+        if lineage["finta_column"] not in finta_columns:
+            finta_columns.append(lineage["finta_column"])
+        scaled = scalers.setdefault(lineage["scaler"], [])
+        if lineage["finta_column"] not in scaled:
+            scaled.append(lineage["finta_column"])
+        distanced = distances.setdefault(lineage["distance"], [])
+        if lineage["scaled_column"] not in distanced:
+            distanced.append(lineage["scaled_column"])
+    return {"methods": methods, "finta_columns": finta_columns, "scalers": scalers, "distances": distances}
+
+
+class ColumnSubsetUnion(TransformerMixin, BaseEstimator):
+    """Apply each transformer only to the columns it feeds and concatenate their outputs.
+
+    Output columns follow the naming scheme of the features pipeline: `{column}_{name}`,
+    or `{column}` for the passthrough transformer.
+    This class is design to be used in scikit-learn pipeline
+
+    Parameters
+    ----------
+    transformers: list of (str, transformer) tuples
+        i.e SCALERS or DISTANCES. Transformers are cloned before fitting.
+    columns: dict
+        {transformer name: list of input columns}
+    """
+
+    def __init__(self, transformers:List[tuple], columns:Dict[str, List[str]]) -> None:
+        self.transformers = transformers
+        self.columns = columns
+
+    def fit(self, X:pd.DataFrame, y=None):
+        transformers = dict(self.transformers)
+        self.transformers_ = {name: clone(transformers[name]).fit(X[cols]) for name, cols in self.columns.items()}
+        return self
+
+    def transform(self, X:pd.DataFrame) -> pd.DataFrame:
+        outputs = []
+        for name, cols in self.columns.items():
+            X_tr = self.transformers_[name].transform(X[cols])
+            values = X_tr.values if isinstance(X_tr, pd.DataFrame) else X_tr
+            names = cols if name == cfg.PASSTHROUGH_NAME else [f"{col}_{name}" for col in cols]
+            outputs.append(pd.DataFrame(values, columns=names))
+        # Integer index, as the numpy output of FeatureUnion formatted by the features pipeline
+        return pd.concat(outputs, axis=1)
+
+
+class ColumnSelector(TransformerMixin, BaseEstimator):
+    """Select and order columns of a DataFrame."""
+
+    def __init__(self, columns:List[str]) -> None:
+        self.columns = columns
+
+    def fit(self, X:pd.DataFrame, y=None):
+        return self
+
+    def transform(self, X:pd.DataFrame) -> pd.DataFrame:
+        return X[self.columns]
+
+
+def build_pruned_pipeline(columns:Optional[List[str]]=None, buffer_size:int=98) -> Pipeline:
+    """
+        Build a features pipeline computing only the given output columns.
+
+        Parameters
+        ----------
+        columns: list of str, default=None
+            Output columns of the features pipeline needed downstream.
+            Defaults to the columns selected by selectors (`cfg.SELECTED_COLS`).
+        buffer_size: int
+            Buffer size of the Finta transformer
+
+        Returns
+        -------
+        pipeline: sklearn.pipeline.Pipeline
+            Unfitted pipeline whose output columns are `columns`, in this order.
+
+        Example:
+        --------
+        ```Python
+            pipeline = build_pruned_pipeline(["MACD_SIGNAL_moving_standard_scaler", "close_minmax_scaler"])
+            X_tr = pipeline.fit_transform(stock.ohlcv)
+        ```
+    """
+    columns = cfg.SELECTED_COLS if columns is None else columns
+    if columns is None:
+        raise ValueError("No columns given and no columns selected in cfg.SELECTED_COLS.")
+    lineage = trace_lineage(columns)
+    logging.info(f"Pruned pipeline: {len(lineage['methods'])} Finta methods, "
+                 f"{len(lineage['finta_columns'])} Finta columns, {len(lineage['scalers'])} scalers.")
+
+    steps = [
+        ("finta", FintaTransformer(buffer_size=buffer_size, methods=lineage["methods"])),
+        ("clean_finta", UnconsistantColumnDroper(col_config_slot=lineage["finta_columns"])),
+        ("scalers", ColumnSubsetUnion(SCALERS, lineage["scalers"])),
+    ]
+    if set(lineage["distances"]) != {cfg.PASSTHROUGH_NAME}:
+        steps.append(("distances", ColumnSubsetUnion(DISTANCES, lineage["distances"])))
+    steps += [
+        ("select", ColumnSelector(list(columns))),
+        ("nan offset", OFFSET_NAN_DROPER),
+    ]
+    return Pipeline(steps)
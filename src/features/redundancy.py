@@ -0,0 +1,203 @@
+""" This file describes the pruning of redundant columns of the features pipeline.
+
+ Scaling every Finta column several ways produces exact duplicates and
+ affine copies of the same indicator. Exact duplicates are dropped first by
+ hashing columns. Correlations are then computed in float32 blocks sized
+ to a memory budget, so that the full correlation matrix is never held in
+ memory, and columns correlated above a threshold with an already kept
+ column are greedily dropped."""
+
+import hashlib
+import logging
+import os
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+import src.config as cfg
+
+
+def duplicate_columns(X:np.ndarray) -> np.ndarray:
+    """
+        Find exact duplicated columns, NaNs included.
+
+        Returns
+        -------
+        np.ndarray of bool of shape (n_features,)
+            True for columns equal to a previous column
+    """
+    def normalized(j):
+        # Adding 0. turns -0. into 0. so that equal values share their bytes
+        column = np.ascontiguousarray(X[:, j], dtype=np.float64) + 0.
+        column[np.isnan(column)] = np.nan
+        return column
+
+    duplicated = np.zeros(X.shape[1], dtype=bool)
+    seen = {}
+    for j in range(X.shape[1]):
+        column = normalized(j)
+        digest = hashlib.blake2b(column.tobytes(), digest_size=16).digest()
+        candidates = seen.setdefault(digest, [])
+        # Hash collisions are checked against actual values, read again so that only one column is held in memory
+        if any(np.array_equal(column, normalized(i), equal_nan=True) for i in candidates):
+            duplicated[j] = True
+        else:
+            candidates.append(j)
+    return duplicated
+
+
+def standardize(X:np.ndarray, dtype=np.float32, mmap_dir:Optional[str]=None, chunk_size:int=1024) -> np.ndarray:
+    """
+        Center and scale columns to unit norm so that dot products are correlations.
+        NaNs are replaced by the column mean, constant columns become zeros.
+
+        Parameters
+        ----------
+        X: np.ndarray of shape (n_samples, n_features)
+        dtype: numpy dtype
+            Precision of the standardized matrix
+        mmap_dir: str, default=None
+            If given, the standardized matrix is a memory map in this directory instead of an in-memory array.
+        chunk_size: int
+            Amount of columns standardized at once
+    """
+    n, p = X.shape
+    if mmap_dir is None:
+        Z = np.empty((n, p), dtype=dtype, order="F")
+    else:
+        fd, path = tempfile.mkstemp(suffix=".dat", dir=mmap_dir)
+        os.close(fd)
+        Z = np.memmap(path, dtype=dtype, mode="w+", shape=(n, p), order="F")
+    for start in range(0, p, chunk_size):
+        block = np.asarray(X[:, start:start + chunk_size], dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            block = block - np.nanmean(block, axis=0)
+        block[np.isnan(block)] = 0.
+        norms = np.linalg.norm(block, axis=0)
+        norms[norms == 0] = 1.
+        Z[:, start:start + chunk_size] = block / norms
+    return Z
+
+
+def _block_size(n_rows:int, memory_budget:int, itemsize:int) -> int:
+    """ Amount of columns per block so that two blocks of data and their correlations fit in the budget."""
+    # 2 * n * b + b * b items must fit in the budget
+    items = memory_budget // itemsize
+    b = int(-n_rows + np.sqrt(n_rows ** 2 + items))
+    return max(b, 1)
+
+
+def correlated_columns(Z:np.ndarray, threshold:float=0.95, memory_budget:int=2**28, candidates:Optional[np.ndarray]=None) -> np.ndarray:
+    """
+        Greedily drop columns correlated above threshold with a previous kept column.
+
+        Parameters
+        ----------
+        Z: np.ndarray of shape (n_samples, n_features)
+            Standardized matrix (see `standardize`)
+        threshold: float
+            Absolute correlation above which a column is redundant
+        memory_budget: int
+            Memory in bytes available for blocks of data and correlations
+        candidates: np.ndarray of bool, default=None
+            Columns to consider, all of them if None
+
+        Returns
+        -------
+        np.ndarray of bool of shape (n_features,)
+            True for dropped columns
+    """
+    n, p = Z.shape
+    candidates = np.ones(p, dtype=bool) if candidates is None else candidates
+    block = _block_size(n, memory_budget, Z.dtype.itemsize)
+    kept = []
+    dropped = ~candidates
+    for start in range(0, p, block):
+        idx = np.flatnonzero(candidates[start:start + block]) + start
+        if len(idx) == 0:
+            continue
+        Z_block = np.asarray(Z[:, idx])
+        alive = np.ones(len(idx), dtype=bool)
+        # Correlations with kept columns, one block of kept columns at a time
+        for k_start in range(0, len(kept), block):
+            Z_kept = np.asarray(Z[:, kept[k_start:k_start + block]])
+            corr = Z_kept.T @ Z_block
+            alive &= ~(np.abs(corr) > threshold).any(axis=0)
+        # Greedy pruning within the block, in column order
+        corr = np.abs(Z_block.T @ Z_block) > threshold
+        for j in range(len(idx)):
+            if alive[j]:
+                alive[j+1:] &= ~corr[j, j+1:]
+        kept += list(idx[alive])
+        dropped[idx[~alive]] = True
+    return dropped
+
+
+class RedundantColumnDroper(TransformerMixin, BaseEstimator):
+    """Drop exact duplicates and highly correlated columns.
+
+    Columns are kept in order of appearance (or of `priority`): a column is dropped when its absolute
+    correlation with an already kept column exceeds `threshold`.
+    This class is design to be used in scikit-learn pipeline
+
+    Parameters
+    ----------
+    threshold: float
+        Absolute correlation above which a column is redundant
+    memory_budget: int
+        Memory in bytes available for correlation blocks
+    mmap_dir: str, default=None
+        Directory of the memory mapped standardized matrix, in-memory if None
+    priority: list of str, default=None
+        Columns to keep first (i.e sorted by a selector score). Others follow in order of appearance.
+    """
+
+    def __init__(self, threshold:float=cfg.CORRELATION_THRESHOLD, memory_budget:int=2**28,
+                 mmap_dir:Optional[str]=None, priority:Optional[List[str]]=None) -> None:
+        self.threshold = threshold
+        self.memory_budget = memory_budget
+        self.mmap_dir = mmap_dir
+        self.priority = priority
+
+    def fit(self, X, y=None):
+        columns = list(X.columns) if isinstance(X, pd.DataFrame) else list(range(X.shape[1]))
+        order = self._order(columns)
+        values = X.values if isinstance(X, pd.DataFrame) else X
+        if order != list(range(len(columns))):
+            values = values[:, order]
+
+        duplicated = duplicate_columns(values)
+        # Columns standardized at once fit in the budget with their centered copy
+        chunk_size = max(int(self.memory_budget // (2 * 8 * max(len(values), 1))), 1)
+        Z = standardize(values, mmap_dir=self.mmap_dir, chunk_size=chunk_size)
+        dropped = correlated_columns(Z, self.threshold, self.memory_budget, candidates=~duplicated)
+        if isinstance(Z, np.memmap):
+            path = Z.filename
+            del Z
+            os.remove(path)
+
+        kept = set(np.array(order)[~dropped])
+        self.selected_columns_ = [col for i, col in enumerate(columns) if i in kept]
+        logging.info(f"{duplicated.sum()} duplicated and {dropped.sum() - duplicated.sum()} correlated columns dropped, "
+                     f"{len(self.selected_columns_)} columns kept.")
+        return self
+
+    def transform(self, X):
+        if isinstance(X, pd.DataFrame):
+            cfg.CURRENT_COLS = list(self.selected_columns_)
+            return X[self.selected_columns_]
+        return X[:, self.selected_columns_]
+
+    def _order(self, columns:list) -> List[int]:
+        if self.priority is None:
+            return list(range(len(columns)))
+        position = {col: i for i, col in enumerate(columns)}
+        first = [position[col] for col in self.priority if col in position]
+        prioritized = set(first)
+        return first + [i for i in range(len(columns)) if i not in prioritized]
+
+
+REDUNDANT_COLUMNS_DROPER = RedundantColumnDroper()
@@ -0,0 +1,244 @@
+""" This file describes filters selecting features from the output of the features pipeline.
+
+ Scores are computed on chunks of columns, vectorized within a chunk and
+ parallelized across chunks, so that matrices with tens of thousands of
+ columns are scored in seconds. Selected columns can be fed back into
+ `src.features.pruning.build_pruned_pipeline`."""
+
+import logging
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.stats import rankdata
+from sklearn.base import BaseEstimator, TransformerMixin
+
+import src.config as cfg
+
+
+def align_labels(y, offset:Optional[int]=None) -> pd.Series:
+    """
+        Align labels of the training data with the output of the features pipeline,
+        which drops the first `cfg.NAN_OFFSET` rows and resets the index.
+
+        Parameters
+        ----------
+        y: pd.DataFrame or pd.Series
+            Labels of `Stock.training_data`
+        offset: int, default=None
+            Amount of first rows dropped by the pipeline. Defaults to `cfg.NAN_OFFSET`.
+    """
+    offset = cfg.NAN_OFFSET if offset is None else offset
+    if isinstance(y, pd.DataFrame):
+        y = y.iloc[:, 0]
+    return y.iloc[offset or 0:].reset_index(drop=True)
+
+
+def _column_chunks(n_cols:int, chunk_size:int) -> List[slice]:
+    return [slice(i, min(i + chunk_size, n_cols)) for i in range(0, n_cols, chunk_size)]
+
+
+def _map_chunks(func:Callable, X:np.ndarray, chunk_size:int, n_jobs:int, **kwargs) -> np.ndarray:
+    """ Apply func on chunks of columns of X in parallel and concatenate the scores."""
+    chunks = _column_chunks(X.shape[1], chunk_size)
+    if n_jobs == 1 or len(chunks) == 1:
+        scores = [func(X[:, chunk], **kwargs) for chunk in chunks]
+    else:
+        scores = Parallel(n_jobs=n_jobs, prefer="threads")(delayed(func)(X[:, chunk], **kwargs) for chunk in chunks)
+    return np.concatenate(scores)
+
+
+def _quantile_bins(X:np.ndarray, n_bins:int) -> np.ndarray:
+    """ Equal frequency bins of each column. NaNs fall in an extra bin `n_bins`."""
+    nans = np.isnan(X)
+    if not nans.any():
+        # Quantiles only need partial sorts of the columns
+        edges = np.quantile(X, np.linspace(0, 1, n_bins + 1)[1:-1], axis=0)
+        bins = np.zeros(X.shape, dtype=np.int64)
+        for edge in edges:
+            bins += X > edge
+        return bins
+    n_valid = (~nans).sum(axis=0)
+    # Ties share their minimum rank, NaNs are ranked last so that they do not shift valid ranks
+    ranks = rankdata(np.where(nans, np.inf, X), method="min", axis=0).astype(np.int64) - 1
+    bins = ranks * n_bins // np.maximum(n_valid, 1)
+    bins[nans] = n_bins
+    return bins
+
+
+def _mutual_information_chunk(X:np.ndarray, y_codes:np.ndarray, n_classes:int, n_bins:int) -> np.ndarray:
+    n, c = X.shape
+    cells = (n_bins + 1) * n_classes
+    codes = _quantile_bins(X, n_bins) * n_classes + y_codes[:, None] + np.arange(c) * cells
+    joint = np.bincount(codes.ravel(), minlength=c * cells).reshape(c, n_bins + 1, n_classes) / n
+    p_x = joint.sum(axis=2, keepdims=True)
+    p_y = joint.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = joint * np.log(joint / (p_x * p_y))
+    return np.nansum(terms, axis=(1, 2))
+
+
+def mutual_information(X:np.ndarray, y:np.ndarray, n_bins:int=10, chunk_size:int=1024, n_jobs:int=-1) -> np.ndarray:
+    """
+        Mutual information (in nats) between each column of X, discretized in quantile bins, and the labels.
+
+        Parameters
+        ----------
+        X: np.ndarray of shape (n_samples, n_features)
+        y: np.ndarray of shape (n_samples,)
+            Class labels
+        n_bins: int
+            Amount of equal frequency bins of each column
+        chunk_size: int
+            Amount of columns scored at once
+        n_jobs: int
+            Amount of parallel jobs, -1 for all cores
+    """
+    classes, y_codes = np.unique(y, return_inverse=True)
+    return _map_chunks(_mutual_information_chunk, X, chunk_size, n_jobs,
+                       y_codes=y_codes, n_classes=len(classes), n_bins=n_bins)
+
+
+def _auc_chunk(X:np.ndarray, positives:np.ndarray) -> np.ndarray:
+    # NaNs are replaced by the column median so that they do not carry information
+    if np.isnan(X).any():
+        X = np.where(np.isnan(X), np.nanmedian(X, axis=0), X)
+    ranks = rankdata(X, axis=0)
+    n_pos = positives.sum()
+    n_neg = len(positives) - n_pos
+    return (ranks[positives].sum(axis=0) - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+
+def auc_scores(X:np.ndarray, y:np.ndarray, chunk_size:int=1024, n_jobs:int=-1) -> np.ndarray:
+    """
+        Area under the ROC curve of each column of X used as a score of binary labels,
+        computed with the Mann-Whitney U statistic.
+
+        Returns
+        -------
+        np.ndarray of shape (n_features,)
+            AUC of each column, 0.5 for uninformative columns.
+    """
+    positives = np.asarray(y) == 1
+    if positives.all() or not positives.any():
+        raise ValueError("AUC filter needs both positive and negative labels.")
+    return _map_chunks(_auc_chunk, X, chunk_size, n_jobs, positives=positives)
+
+
+def _auc_strength(X:np.ndarray, y:np.ndarray, chunk_size:int, n_jobs:int) -> np.ndarray:
+    return np.abs(auc_scores(X, y, chunk_size, n_jobs) - 0.5)
+
+
+def stability_scores(X:np.ndarray, y:np.ndarray, k:int, scorer:Callable=_auc_strength, n_resamples:int=50,
+                     sample_fraction:float=0.5, random_state:Optional[int]=None, chunk_size:int=1024, n_jobs:int=-1) -> np.ndarray:
+    """
+        Stability selection: frequency at which each column ranks in the top k of `scorer`
+        over random subsamples of the rows.
+
+        Parameters
+        ----------
+        X: np.ndarray of shape (n_samples, n_features)
+        y: np.ndarray of shape (n_samples,)
+        k: int
+            Amount of columns selected on each subsample
+        scorer: python function
+            `scorer(X, y, chunk_size, n_jobs)` returning a score per column, the higher the better
+        n_resamples: int
+            Amount of subsamples
+        sample_fraction: float
+            Fraction of rows of each subsample
+
+        Returns
+        -------
+        np.ndarray of shape (n_features,)
+            Selection frequencies in [0, 1]
+    """
+    rng = np.random.default_rng(random_state)
+    n, p = X.shape
+    k = min(k, p)
+    counts = np.zeros(p)
+    for _ in range(n_resamples):
+        rows = np.sort(rng.choice(n, int(n * sample_fraction), replace=False))
+        scores = scorer(X[rows], y[rows], chunk_size, n_jobs)
+        counts[np.argpartition(-scores, k - 1)[:k]] += 1
+    return counts / n_resamples
+
+
+class FeatureSelector(TransformerMixin, BaseEstimator):
+    """Select the best columns of the features pipeline output according to a filter.
+
+    Selected columns are saved in `selected_columns_` and in `cfg.SELECTED_COLS`.
+    This class is design to be used in scikit-learn pipeline
+
+    Parameters
+    ----------
+    method: str
+        "mutual_information", "auc" or "stability"
+    k: int
+        Amount of selected columns
+    n_bins: int
+        Amount of bins of the mutual information filter
+    n_resamples: int
+        Amount of subsamples of stability selection
+    sample_fraction: float
+        Fraction of rows of each stability selection subsample
+    chunk_size: int
+        Amount of columns scored at once
+    n_jobs: int
+        Amount of parallel jobs, -1 for all cores
+    random_state: int, default=None
+        Seed of stability selection subsamples
+
+    Example:
+    --------
+    ```Python
+        X, y = stock.training_data
+        X_tr = FEATURES_PIPELINE.fit_transform(X)
+        selector = FeatureSelector("auc", k=200).fit(X_tr, align_labels(y))
+        pipeline = build_pruned_pipeline(selector.selected_columns_)
+    ```
+    """
+
+    METHODS = ("mutual_information", "auc", "stability")
+
+    def __init__(self, method:str="mutual_information", k:int=200, n_bins:int=10, n_resamples:int=50,
+                 sample_fraction:float=0.5, chunk_size:int=1024, n_jobs:int=-1, random_state:Optional[int]=None) -> None:
+        self.method = method
+        self.k = k
+        self.n_bins = n_bins
+        self.n_resamples = n_resamples
+        self.sample_fraction = sample_fraction
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X:pd.DataFrame, y):
+        """Score every column of X against the labels y and keep the k best ones.
+        Rows with missing labels are ignored.
+        """
+        if self.method not in self.METHODS:
+            raise ValueError(f"Unknown selection method {self.method}. Available methods: {self.METHODS}")
+        y = np.asarray(y, dtype=float).ravel()
+        labelled = ~np.isnan(y)
+        values = np.asarray(X, dtype=float)[labelled]
+        y = y[labelled]
+
+        if self.method == "mutual_information":
+            scores = mutual_information(values, y, self.n_bins, self.chunk_size, self.n_jobs)
+        elif self.method == "auc":
+            scores = _auc_strength(values, y, self.chunk_size, self.n_jobs)
+        else:
+            scores = stability_scores(values, y, self.k, n_resamples=self.n_resamples, sample_fraction=self.sample_fraction,
+                                      random_state=self.random_state, chunk_size=self.chunk_size, n_jobs=self.n_jobs)
+
+        columns = list(X.columns) if isinstance(X, pd.DataFrame) else list(range(values.shape[1]))
+        self.scores_ = pd.Series(scores, index=columns).sort_values(ascending=False)
+        self.selected_columns_ = list(self.scores_.index[:self.k])
+        cfg.SELECTED_NAMES = [self.method]
+        cfg.SELECTED_COLS = self.selected_columns_
+        logging.info(f"{len(self.selected_columns_)} columns selected out of {len(columns)} with {self.method} filter.")
+        return self
+
+    def transform(self, X:pd.DataFrame) -> pd.DataFrame:
+        return X[self.selected_columns_]
@@ -0,0 +1,159 @@
+""" Vectorized backtest of trading signals over a universe and a grid of parameters.
+
+ Signals (i.e model scores) form a (dates, symbols) matrix. For a threshold and a
+ holding period h, a long position is entered at the next open of every date
+ and symbol whose signal reaches the threshold, and exited at the close h bars
+ later, as forward returns of `src.data.labeling`. Each date invests 1/h of the
+ capital, equally split among symbols, so that positions of overlapping dates
+ stack into an equally weighted book.
+
+ All (threshold, holding period) combinations are evaluated in one broadcasted
+ computation over (thresholds, holding periods, dates, symbols) arrays, thresholds
+ being processed by chunks fitting a memory budget."""
+
+import logging
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+from src.data.labeling import forward_returns
+
+METRICS = ["n_trades", "mean_return", "total_return", "hit_rate", "turnover", "exposure"]
+
+
+def signals_from_predictions(predictions:pd.DataFrame, column:str="score") -> pd.DataFrame:
+    """ (dates, symbols) signals matrix of walk-forward predictions (see `src.models.train_model.walk_forward`)."""
+    return predictions.pivot_table(index=cfg.DATE, columns="symbol", values=column).sort_index()
+
+
+def price_panels(ohlcvs:Dict[str, pd.DataFrame], dates:pd.Index) -> Dict[str, np.ndarray]:
+    """ Open and close prices of each symbol aligned on dates, as (dates, symbols) arrays."""
+    return {col: np.column_stack([ohlcvs[symbol][col].reindex(dates).values for symbol in ohlcvs])
+            for col in (cfg.OPEN, cfg.CLOSE)}
+
+
+def _lag(a:np.ndarray, k:int) -> np.ndarray:
+    """ Values k dates before along the first axis, NaN before the start."""
+    out = np.full_like(a, np.nan)
+    out[k:] = a[:len(a) - k]
+    return out
+
+
+def _chunk_size(n_cells:int, memory_budget:int) -> int:
+    """ Amount of thresholds per chunk so that a few float32 arrays of n_cells per threshold fit in the budget."""
+    return max(int(memory_budget // (4 * 4 * n_cells)), 1)
+
+
+def grid_metrics(signals:np.ndarray, open_:np.ndarray, close:np.ndarray, thresholds:np.ndarray,
+                 holding_periods:np.ndarray, cost:float=cfg.TRANSACTION_COST, breakeven:float=cfg.BREAKEVEN,
+                 memory_budget:int=2**28) -> Dict[str, np.ndarray]:
+    """
+        Backtest metrics of every (threshold, holding period) combination.
+
+        Parameters
+        ----------
+        signals, open_, close: np.ndarray of shape (n_dates, n_symbols)
+            Signals and prices in time order. NaN signals never trade.
+        thresholds: np.ndarray of shape (n_thresholds,)
+            Signals reaching a threshold enter a position
+        holding_periods: np.ndarray of int of shape (n_holding_periods,)
+            Amount of bars positions are held
+        cost: float
+            Round trip transaction cost, as a fraction of traded capital
+        breakeven: float
+            Gross return a trade needs to count as a hit
+        memory_budget: int
+            Memory in bytes available for the broadcasted arrays of a chunk of thresholds
+
+        Returns
+        -------
+        dict
+            {metric: np.ndarray of shape (n_thresholds, n_holding_periods)} with metrics
+            `n_trades`, `mean_return` (net return per trade), `total_return` (net simple return of the book),
+            `hit_rate`, `turnover` (fraction of the book traded per date) and `exposure` (mean invested fraction).
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    holding_periods = np.asarray(holding_periods, dtype=int)
+    n_dates, n_symbols = signals.shape
+    returns = forward_returns(open_, close, holding_periods)
+
+    # (holding periods, dates * symbols) arrays shared by all thresholds
+    R = np.stack([returns[h] for h in holding_periods]).reshape(len(holding_periods), -1)
+    valid = ~np.isnan(R)
+    net = np.where(valid, R - cost, 0.).astype(np.float32)
+    hits = (valid & (R >= breakeven)).astype(np.float32)
+    S = np.where(valid, signals.reshape(1, -1), np.nan)
+    # Signals of the positions exited at each date, for turnover
+    S_exit = np.stack([np.where(np.isnan(_lag(returns[h], h)), np.nan, _lag(signals, h)) for h in holding_periods])
+    S_exit = S_exit.reshape(len(holding_periods), -1)
+    slots = (holding_periods * n_symbols).astype(float)[None, :]
+
+    metrics = {name: np.empty((len(thresholds), len(holding_periods))) for name in METRICS}
+    chunk = _chunk_size(R.size, memory_budget)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for start in range(0, len(thresholds), chunk):
+            th = thresholds[start:start + chunk, None, None]
+            entries = (S[None] >= th).astype(np.float32)
+            exits = (S_exit[None] >= th).astype(np.float32)
+            n_trades = entries.sum(axis=2, dtype=np.float64)
+            gains = np.einsum("chn,hn->ch", entries, net, dtype=np.float64)
+            rows = slice(start, start + chunk)
+            metrics["n_trades"][rows] = n_trades
+            metrics["mean_return"][rows] = gains / n_trades
+            metrics["total_return"][rows] = gains / slots
+            metrics["hit_rate"][rows] = np.einsum("chn,hn->ch", entries, hits, dtype=np.float64) / n_trades
+            metrics["turnover"][rows] = np.abs(entries - exits).sum(axis=2, dtype=np.float64) / slots / n_dates
+            metrics["exposure"][rows] = n_trades / (n_dates * n_symbols)
+    return metrics
+
+
+def backtest_grid(signals:pd.DataFrame, ohlcvs:Dict[str, pd.DataFrame], thresholds:Iterable[float],
+                  holding_periods:Iterable[int], cost:float=cfg.TRANSACTION_COST, breakeven:Optional[float]=None,
+                  memory_budget:int=2**28) -> pd.DataFrame:
+    """
+        Backtest signals of a universe over a grid of thresholds and holding periods.
+
+        Parameters
+        ----------
+        signals: pd.DataFrame
+            Signals with dates as index and symbols as columns (see `signals_from_predictions`)
+        ohlcvs: dict
+            {symbol: ohlcv with dates as index}, i.e `Stock.ohlcv`
+        thresholds, holding_periods:
+            Grid of parameters, every combination is evaluated
+        cost: float
+            Round trip transaction cost, as a fraction of traded capital
+        breakeven: float, default=None
+            Gross return a trade needs to count as a hit. Defaults to `cfg.BREAKEVEN`.
+
+        Returns
+        -------
+        pd.DataFrame
+            Metrics (see `grid_metrics`) indexed by threshold and holding period
+
+        Example:
+        --------
+        ```Python
+            report, predictions = walk_forward(ohlcvs, labels)
+            grid = backtest_grid(signals_from_predictions(predictions), ohlcvs,
+                                 thresholds=np.linspace(0.4, 0.7, 1000), holding_periods=[1, 2, 5, 10])
+            grid.sort_values("total_return").tail()
+        ```
+    """
+    breakeven = cfg.BREAKEVEN if breakeven is None else breakeven
+    signals = signals.sort_index()
+    ohlcvs = {symbol: ohlcvs[symbol] for symbol in signals.columns}
+    # Prices of all dates, so that positions can be held after the last signal
+    dates = signals.index.union(pd.Index(np.unique(np.concatenate([df.index.values for df in ohlcvs.values()]))))
+    prices = price_panels(ohlcvs, dates)
+    values = signals.reindex(dates).values.astype(float)
+
+    thresholds, holding_periods = list(thresholds), list(holding_periods)
+    metrics = grid_metrics(values, prices[cfg.OPEN], prices[cfg.CLOSE], np.array(thresholds), np.array(holding_periods),
+                           cost=cost, breakeven=breakeven, memory_budget=memory_budget)
+    logging.info(f"{len(thresholds) * len(holding_periods)} combinations backtested over {len(dates)} dates "
+                 f"and {len(ohlcvs)} symbols.")
+    index = pd.MultiIndex.from_product([thresholds, holding_periods], names=["threshold", "holding_period"])
+    return pd.DataFrame({name: values.ravel() for name, values in metrics.items()}, index=index)
@@ -0,0 +1,146 @@
+""" Persistence of fitted pipelines and models.
+
+ Fitted objects are pickled with protocol 5: large contiguous arrays (numpy arrays
+ and the blocks of pandas objects, i.e transformers buffers and scalers statistics)
+ are stored out-of-band after the pickle payload, aligned so that they can be
+ memory mapped. Loading maps the file and rebuilds objects around views of the map,
+ so it only costs the unpickling of the small payload, and worker processes
+ loading the same file share its pages.
+
+ The pipeline state kept in `src.config` globals is saved along the objects.
+
+ File layout:
+
+    MAGIC | header length (uint64) | JSON header | payload | buffer 0 | buffer 1 | ...
+"""
+
+import datetime
+import json
+import mmap
+import os
+import pickle
+import struct
+from pathlib import Path
+from typing import Optional
+
+import src.config as cfg
+
+MAGIC = b"SAFMODEL"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+# `src.config` globals filled by the features pipeline during fit
+CONFIG_STATE = ["CURRENT_COLS", "FINTA_COLS", "SCALERS_NAMES", "SCALED_COLS", "DISTANCES_NAMES",
+                "DISTANCED_COLS", "NAN_OFFSET", "SELECTED_NAMES", "SELECTED_COLS"]
+MMAP_MODES = {"r": mmap.ACCESS_READ, "c": mmap.ACCESS_COPY}
+
+
+def config_snapshot() -> dict:
+    """ Values of the `src.config` globals filled by the features pipeline."""
+    return {name: getattr(cfg, name) for name in CONFIG_STATE}
+
+
+def restore_config(snapshot:dict) -> None:
+    for name, value in snapshot.items():
+        setattr(cfg, name, value)
+
+
+def _padding(offset:int) -> int:
+    return -offset % ALIGNMENT
+
+
+def save(obj, path, metadata:Optional[dict]=None) -> Path:
+    """
+        Save fitted objects (i.e a pipeline, or a (pipeline, estimator) tuple) with the state of `src.config`.
+
+        Parameters
+        ----------
+        obj: python object
+            Picklable object
+        path: str or Path
+            Destination file, replaced atomically
+        metadata: dict, default=None
+            JSON serializable information stored in the header (see `read_header`)
+    """
+    path = Path(path)
+    buffers = []
+    payload = pickle.dumps({"object": obj, "config": config_snapshot()}, protocol=5, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+
+    header = {
+        "version": FORMAT_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "metadata": metadata or {},
+    }
+    # Offsets depend on the header length, which depends on offsets: reserve room for them first
+    sections = [len(payload)] + [raw.nbytes for raw in raws]
+    header["sections"] = [[0, 0]] * len(sections)
+    reserved = len(json.dumps(header)) + 24 * len(sections) + 64
+    offset = len(MAGIC) + 8 + reserved
+    for i, size in enumerate(sections):
+        offset += _padding(offset)
+        header["sections"][i] = [offset, size]
+        offset += size
+    header_bytes = json.dumps(header).encode().ljust(reserved)
+
+    tmp = path.with_name(f".{path.name}.tmp")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp, "wb") as fp:
+        fp.write(MAGIC + struct.pack("<Q", reserved) + header_bytes)
+        for (start, _), data in zip(header["sections"], [payload] + raws):
+            fp.write(b"\0" * (start - fp.tell()))
+            fp.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+def _read_header(fp) -> dict:
+    magic = fp.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError(f"{fp.name} is not a saved model file.")
+    (length,) = struct.unpack("<Q", fp.read(8))
+    header = json.loads(fp.read(length).decode().rstrip())
+    if header["version"] > FORMAT_VERSION:
+        raise ValueError(f"{fp.name} was saved with a newer format version ({header['version']}).")
+    return header
+
+
+def read_header(path) -> dict:
+    """ Version, creation date, metadata and sections of a saved file, without loading objects."""
+    with open(path, "rb") as fp:
+        return _read_header(fp)
+
+
+def load(path, mmap_mode:str="c", restore:bool=True):
+    """
+        Load objects saved with `save`.
+
+        Parameters
+        ----------
+        path: str or Path
+        mmap_mode: str
+            "c" (copy-on-write): arrays are writable, written pages are private to the process.
+            "r": arrays are read-only views of the file.
+        restore: bool
+            Restore the `src.config` globals saved with the objects
+
+        Example:
+        --------
+        ```Python
+            save((FEATURES_PIPELINE, model), os.path.join(cfg.MODELS_DIR, "aapl.model"))
+            pipeline, model = load(os.path.join(cfg.MODELS_DIR, "aapl.model"))
+            plan = InferencePlan(pipeline, model)
+        ```
+    """
+    if mmap_mode not in MMAP_MODES:
+        raise ValueError(f"Unknown mmap mode {mmap_mode}. Available modes: {list(MMAP_MODES)}")
+    with open(path, "rb") as fp:
+        header = _read_header(fp)
+        # The map stays open as long as arrays refer to it
+        mapped = mmap.mmap(fp.fileno(), 0, access=MMAP_MODES[mmap_mode])
+    view = memoryview(mapped)
+    (start, size), *sections = header["sections"]
+    buffers = [view[offset:offset + length] for offset, length in sections]
+    content = pickle.loads(view[start:start + size], buffers=buffers)
+    if restore:
+        restore_config(content["config"])
+    return content["object"]
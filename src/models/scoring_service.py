@@ -0,0 +1,348 @@
+""" Long-lived local scoring service.
+
+ Fitted features pipelines are compiled in InferencePlans which stay warm in
+ memory, one per symbol. Bar updates of many symbols, from any amount of
+ concurrent clients, are queued and micro-batched by a single worker thread:
+ each bar is pushed in the plan of its symbol, then the features of all the
+ bars of a batch sharing a model are scored in a single predict call.
+
+ Features are computed bar by bar: each one depends on the window of its own
+ symbol. Computing Finta indicators once on the stacked windows of a batch is
+ not exact: path dependent indicators (PSAR) and rolling variances (Bollinger
+ bands) carry state and rounding from one symbol window to the next.
+
+ The service listens on localhost HTTP:
+
+    POST /score   {"bars": [{"symbol": "aapl", "bar": {"open": 1., "high": 1., "low": 1., "close": 1., "volume": 1.}}]}
+                  -> {"scores": [0.53]}
+    GET  /health  -> symbols and latency statistics
+    GET  /drift   -> drifting features of the plans compiled with drift monitors (see src/features/drift.py)
+
+    python -m src.models.scoring_service aapl msft --models-dir models
+    python -m src.models.scoring_service --models-dir models
+    python -m src.models.scoring_service --synthetic-symbols 20
+"""
+
+import collections
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import click
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+import src.config as cfg
+from src.features.build_features import FEATURES_PIPELINE
+from src.features.inference_plan import InferencePlan
+from src.models.persistence import load, save
+
+MODEL_SUFFIX = ".model"
+
+
+def fit_model(ohlcv:pd.DataFrame, labels:pd.Series, estimator=None, pipeline=None) -> Tuple[Pipeline, object]:
+    """
+        Fit a features pipeline and a model on the history of a symbol.
+
+        Parameters
+        ----------
+        ohlcv: pd.DataFrame
+            History of the symbol, i.e `Stock.ohlcv`. Scored bars must follow its last bar.
+        labels: pd.Series
+            Labels aligned with ohlcv rows, i.e `Stock.labels[cfg.LABELS]`
+        estimator: sklearn estimator, default=None
+            Cloned before fitting. Defaults to a logistic regression.
+        pipeline: sklearn.pipeline.Pipeline, default=None
+            Unfitted features pipeline. Defaults to a clone of FEATURES_PIPELINE.
+    """
+    estimator = LogisticRegression(max_iter=1000) if estimator is None else estimator
+    pipeline = clone(FEATURES_PIPELINE) if pipeline is None else pipeline
+    X = pipeline.fit_transform(ohlcv)
+    # Pipeline outputs drop their first rows, labels are aligned on the last ones
+    y = np.asarray(labels, dtype=float)[-len(X):]
+    rows = ~np.isnan(y)
+    # Fitted on arrays, as plans score arrays
+    model = clone(estimator).fit(X.values[rows], y[rows])
+    return pipeline, model
+
+
+def fit_plan(ohlcv:pd.DataFrame, labels:pd.Series, estimator=None, pipeline=None) -> InferencePlan:
+    """ Fit a features pipeline and a model (see `fit_model`) and compile them in an InferencePlan."""
+    return InferencePlan(*fit_model(ohlcv, labels, estimator, pipeline))
+
+
+def load_plans(models_dir:str) -> Dict[str, InferencePlan]:
+    """ Compile the (pipeline, model) tuples saved as `{symbol}.model` files in models_dir in InferencePlans."""
+    paths = sorted(Path(models_dir).glob(f"*{MODEL_SUFFIX}"))
+    if len(paths) == 0:
+        raise FileNotFoundError(f"No {MODEL_SUFFIX} files in {models_dir}.")
+    return {path.stem: InferencePlan(*load(path)) for path in paths}
+
+
+def _predict(estimator, X:np.ndarray) -> np.ndarray:
+    if hasattr(estimator, "predict_proba"):
+        return estimator.predict_proba(X)[:, -1]
+    return estimator.predict(X)
+
+
+class ScoringService:
+    """Micro-batched scoring of bar updates of many symbols.
+
+    Parameters
+    ----------
+    plans: dict
+        {symbol: InferencePlan with an estimator}. Plans may share the same estimator,
+        bars of symbols sharing an estimator are then scored in the same predict call.
+    max_batch_size: int
+        Maximum amount of bars scored in a batch
+    max_wait_ms: float
+        Maximum time waited for other bars once a bar is queued
+
+    Example:
+    --------
+    ```Python
+        service = ScoringService({symbol: fit_plan(stock.ohlcv, stock.labels[cfg.LABELS])}).start()
+        score = service.submit(symbol, bar).result()
+    ```
+    """
+
+    def __init__(self, plans:Dict[str, InferencePlan], max_batch_size:int=cfg.SCORING_MAX_BATCH_SIZE,
+                 max_wait_ms:float=cfg.SCORING_MAX_WAIT_MS) -> None:
+        self.plans = plans
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._latencies = collections.deque(maxlen=100000)
+        self._batch_sizes = collections.deque(maxlen=100000)
+        # Guards the plans states, updated by the batching thread and read by drift
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the batching thread, unless it is running: a single thread keeps the bars of a symbol in order."""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="scoring-batcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def submit(self, symbol:str, bar) -> Future:
+        """Queue a bar update of a symbol. The future resolves to its score."""
+        future = Future()
+        self._queue.put((symbol, bar, future, time.perf_counter()))
+        return future
+
+    def score(self, updates:Iterable[Tuple[str, object]], timeout:float=None) -> List[float]:
+        """Queue (symbol, bar) updates and wait for their scores."""
+        futures = [self.submit(symbol, bar) for symbol, bar in updates]
+        return [future.result(timeout) for future in futures]
+
+    def stats(self) -> dict:
+        latencies = np.array(self._latencies) * 1e3
+        return {
+            "symbols": len(self.plans),
+            "scored": len(latencies),
+            "batches": len(self._batch_sizes),
+            "mean_batch_size": float(np.mean(self._batch_sizes)) if len(self._batch_sizes) > 0 else 0.,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) > 0 else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) > 0 else None,
+            "target_p99_ms": cfg.INFERENCE_P99_TARGET_MS,
+        }
+
+    def drift(self) -> Dict[str, Dict[str, List[str]]]:
+        """{symbol: {monitor name: drifting columns}} of the plans with drift monitors."""
+        with self._lock:
+            return {symbol: {name: monitor.drifting() for name, monitor in plan.drift_monitors.items()}
+                    for symbol, plan in self.plans.items() if len(plan.drift_monitors) > 0}
+
+    # ----------- Batching -----------
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait_ms / 1e3
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Bars already queued are taken without waiting
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if len(batch) > 0:
+                self._score_batch(batch)
+
+    def _score_batch(self, batch:list) -> None:
+        # Bars are pushed in queue order so that bars of a symbol stay in time order
+        groups = {}
+        for symbol, bar, future, start in batch:
+            plan = self.plans.get(symbol)
+            if plan is None:
+                future.set_exception(KeyError(f"No model loaded for {symbol}."))
+                continue
+            try:
+                with self._lock:
+                    features = plan.update(bar).copy()
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            estimator, rows, pending = groups.setdefault(id(plan.estimator), (plan.estimator, [], []))
+            rows.append(features)
+            pending.append((future, start))
+
+        for estimator, rows, pending in groups.values():
+            try:
+                scores = _predict(estimator, np.vstack(rows))
+            except Exception as e:
+                for future, _ in pending:
+                    future.set_exception(e)
+                continue
+            end = time.perf_counter()
+            for (future, start), score in zip(pending, scores):
+                future.set_result(float(score))
+                self._latencies.append(end - start)
+        self._batch_sizes.append(len(batch))
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """ HTTP request handler of a scoring service, bound by `_handler`."""
+
+    service: ScoringService = None
+    # Path -> name of the handler method
+    GET_ROUTES = {"/health": "_health", "/drift": "_drift"}
+    POST_ROUTES = {"/score": "_score"}
+
+    def _send(self, code:int, body:dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self, routes:dict) -> None:
+        route = routes.get(self.path)
+        if route is None:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+        else:
+            getattr(self, route)()
+
+    def do_GET(self):
+        self._dispatch(self.GET_ROUTES)
+
+    def do_POST(self):
+        self._dispatch(self.POST_ROUTES)
+
+    def _health(self):
+        self._send(200, self.service.stats())
+
+    def _drift(self):
+        self._send(200, self.service.drift())
+
+    def _score(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            updates = [(update["symbol"], update["bar"]) for update in request["bars"]]
+            scores = self.service.score(updates, timeout=cfg.SCORING_TIMEOUT_S)
+        except (KeyError, ValueError) as e:
+            self._send(400, {"error": repr(e)})
+            return
+        except TimeoutError as e:
+            self._send(503, {"error": repr(e)})
+            return
+        except Exception as e:
+            # i.e errors of the estimator, set on the futures of its batch
+            logging.exception("Scoring request failed")
+            self._send(500, {"error": repr(e)})
+            return
+        self._send(200, {"scores": scores})
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def _handler(service:ScoringService):
+    """ HTTP request handler class bound to a scoring service."""
+    return type("BoundScoringHandler", (ScoringHandler,), {"service": service})
+
+
+def serve(service:ScoringService, host:str=cfg.SCORING_HOST, port:int=cfg.SCORING_PORT) -> ThreadingHTTPServer:
+    """
+        Start the scoring service, if not started yet, and bind it to a local HTTP server.
+        Call `serve_forever` on the returned server to handle requests, `port=0` picks a free port.
+    """
+    service.start()
+    server = ThreadingHTTPServer((host, port), _handler(service))
+    server.daemon_threads = True
+    logging.info(f"Scoring service of {len(service.plans)} symbols listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+@click.command()
+@click.argument('symbols', nargs=-1, type=click.STRING)
+@click.option('--synthetic-symbols', default=None, type=int, help="Serve models fitted on synthetic stocks.")
+@click.option('--synthetic-rows', default=500, help="Amount of bars of each synthetic stock.")
+@click.option('--host', default=cfg.SCORING_HOST)
+@click.option('--port', default=cfg.SCORING_PORT)
+@click.option('--models-dir', default=None, help="Save fitted models in this directory, or serve the models saved in it if no symbol is given.")
+def main(symbols:Tuple[str], synthetic_symbols:int, synthetic_rows:int, host:str, port:int, models_dir:str):
+    from src.data.labeling import class_name, compute_labels
+
+    if synthetic_symbols is None and len(symbols) == 0 and models_dir is not None:
+        server = serve(ScoringService(load_plans(models_dir)), host, port)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    if synthetic_symbols is not None:
+        from src.data.synthetic import generate_universe
+        ohlcvs = {symbol: df.set_index(cfg.DATE) for symbol, df in generate_universe(synthetic_symbols, synthetic_rows, seed=0)}
+        labels = {symbol: compute_labels(df, [1], [cfg.BREAKEVEN], [])[class_name(1, cfg.BREAKEVEN)] for symbol, df in ohlcvs.items()}
+    elif len(symbols) > 0:
+        from src.data.stock import Stock
+        stocks = {symbol: Stock(symbol) for symbol in symbols}
+        ohlcvs = {symbol: stock.ohlcv for symbol, stock in stocks.items()}
+        labels = {symbol: stock.labels[cfg.LABELS] for symbol, stock in stocks.items()}
+    else:
+        raise click.UsageError("Provide SYMBOLS, --synthetic-symbols or --models-dir.")
+
+    plans = {}
+    for symbol in ohlcvs:
+        pipeline, model = fit_model(ohlcvs[symbol], labels[symbol])
+        if models_dir is not None:
+            save((pipeline, model), Path(models_dir) / f"{symbol}{MODEL_SUFFIX}", metadata={"symbol": symbol})
+        plans[symbol] = InferencePlan(pipeline, model)
+    server = serve(ScoringService(plans), host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(**cfg.LOGGING_CONFIG)
+    main()
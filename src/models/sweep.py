@@ -0,0 +1,304 @@
+""" Sweep of the settings of FEATURES_PIPELINE.
+
+ Features of a configuration are computed by the steps of FEATURES_PIPELINE,
+ grouped in stages depending on their parent stage and on a few settings only:
+
+    finta ── scaled ── pruned
+    finta      finta, clean_finta                                   no setting
+    scaled     scalers, scaler_output_formater, clean_scaled       scaling_window: window or span of the SCALERS
+    pruned     nan offset, prune_redundant                          correlation_threshold of RedundantColumnDroper
+
+ Stages run clones of the pipeline steps, configured by `configure`, so that a
+ configuration scores exactly the features of `configure(FEATURES_PIPELINE, config)`.
+ A stage output is identified by the stage and the values of its settings and of
+ those of its parents, so a grid of configurations only needs the unique nodes:
+ a 3 x 3 grid computes Finta once, the scalers 3 times and 9 pruned outputs
+ instead of 9 full pipelines. Nodes are computed by waves of equal depth on a
+ process pool, outputs being shared through memory-mapped files, then every
+ configuration is scored by the feature selection filter.
+
+ `buffer_size` only sets the history prepended to transforms of new bars by
+ FintaTransformer: indicators of a whole history do not depend on it, so no
+ stage depends on it and configurations differing by it share the same score.
+ Distances are not part of FEATURES_PIPELINE, so their SMA window and smoother
+ period are not swept.
+
+    python -m src.models.sweep --synthetic-rows 2500 --scaling-window 5,10,20 --correlation-threshold 0.9,0.95
+"""
+
+import itertools
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import click
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+import src.config as cfg
+from src.features.build_features import FEATURES_PIPELINE
+from src.features.chunked import consistent_columns, nan_bounds
+from src.features.selectors import FeatureSelector
+from src.models.persistence import config_snapshot, restore_config
+from src.models.train_model import REPORTS_DIR
+
+DEFAULTS = {
+    "scaling_window": cfg.SCALING_WINDOW,
+    "buffer_size": FEATURES_PIPELINE.named_steps["finta"].buffer_size,
+    "correlation_threshold": cfg.CORRELATION_THRESHOLD,
+}
+
+# Setting -> (step of FEATURES_PIPELINE, names of the parameters of the step and its transformers it sets)
+SETTING_PARAMS = {
+    "scaling_window": ("scalers", ("window", "span")),
+    "buffer_size": ("finta", ("buffer_size",)),
+    "correlation_threshold": ("prune_redundant", ("threshold",)),
+}
+
+
+def configure(pipeline:Pipeline, config:dict) -> Pipeline:
+    """
+        Clone of FEATURES_PIPELINE, or of a slice of its steps, with the settings of a configuration.
+
+        Example:
+        --------
+        ```Python
+            pipeline = configure(FEATURES_PIPELINE, {"scaling_window": 20, "correlation_threshold": 0.9})
+        ```
+    """
+    pipeline = clone(pipeline)
+    params = {param: config[setting] for param in pipeline.get_params()
+              for setting, (step, names) in SETTING_PARAMS.items()
+              if setting in config and param.startswith(f"{step}__") and param.rsplit("__", 1)[-1] in names}
+    return pipeline.set_params(**params)
+
+
+def _steps(first:str, last:str) -> Pipeline:
+    names = [name for name, _ in FEATURES_PIPELINE.steps]
+    return FEATURES_PIPELINE[names.index(first):names.index(last) + 1]
+
+
+class Stage(NamedTuple):
+    parent: Optional[str]
+    settings: Tuple[str, ...]
+    func: Callable
+
+
+# ----------- Stages -----------
+
+def _finta(ohlcv:pd.DataFrame) -> Tuple[np.ndarray, List[str]]:
+    X = configure(_steps("finta", "clean_finta"), {}).fit_transform(ohlcv)
+    return X.values, list(X.columns)
+
+
+def _scaled(values:np.ndarray, columns:List[str], scaling_window:int) -> Tuple[np.ndarray, List[str]]:
+    # Columns named by the output formater, set by clean_finta when the whole pipeline runs
+    cfg.CURRENT_COLS = list(columns)
+    pipeline = configure(_steps("scalers", "clean_scaled"), {"scaling_window": scaling_window})
+    X = pipeline.fit_transform(pd.DataFrame(values, columns=columns))
+    return X.values, list(X.columns)
+
+
+def _pruned(values:np.ndarray, columns:List[str], correlation_threshold:float) -> Tuple[np.ndarray, List[str]]:
+    pipeline = configure(_steps("nan offset", "prune_redundant"), {"correlation_threshold": correlation_threshold})
+    X = pipeline.fit_transform(pd.DataFrame(values, columns=columns))
+    # Rows dropped by the NaN offset are kept as NaN rows to stay aligned with the labels
+    offset = len(values) - len(X)
+    return np.vstack([np.full((offset, X.shape[1]), np.nan), X.values]), list(X.columns)
+
+
+STAGES = {
+    "finta": Stage(None, (), _finta),
+    "scaled": Stage("finta", ("scaling_window",), _scaled),
+    "pruned": Stage("scaled", ("correlation_threshold",), _pruned),
+}
+# Stages whose outputs form the features of a configuration
+FEATURE_STAGES = ["pruned"]
+
+
+def _depth(stage:str) -> int:
+    parent = STAGES[stage].parent
+    return 0 if parent is None else 1 + _depth(parent)
+
+
+def _settings(stage:str) -> Tuple[str, ...]:
+    parent = STAGES[stage].parent
+    return STAGES[stage].settings if parent is None else _settings(parent) + STAGES[stage].settings
+
+
+def node_key(stage:str, config:dict) -> tuple:
+    """ Identifier of the output of a stage for a configuration: the stage and the values of its settings and of its parents ones."""
+    return (stage,) + tuple((setting, config[setting]) for setting in _settings(stage))
+
+
+def configurations(grid:Dict[str, list]) -> List[dict]:
+    """ Every combination of the grid values, unset settings taking their DEFAULTS value."""
+    unknown = set(grid) - set(DEFAULTS)
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown settings {sorted(unknown)}. Available settings: {list(DEFAULTS)}")
+    names = list(grid)
+    return [{**DEFAULTS, **dict(zip(names, values))} for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _parent_key(key:tuple, config:dict) -> Optional[tuple]:
+    parent = STAGES[key[0]].parent
+    return None if parent is None else node_key(parent, config)
+
+
+def _run_node(stage:str, config:dict, source, parent_columns:Optional[List[str]], path:Path) -> Tuple[List[str], float]:
+    """ Compute a node from the OHLCV frame (root stage) or the memory map of its parent, and save its output in path."""
+    start = time.perf_counter()
+    settings = {setting: config[setting] for setting in STAGES[stage].settings}
+    if parent_columns is None:
+        values, columns = STAGES[stage].func(source, **settings)
+    else:
+        values, columns = STAGES[stage].func(np.load(source, mmap_mode="r"), parent_columns, **settings)
+    np.save(path, np.asarray(values, dtype=float))
+    return columns, time.perf_counter() - start
+
+
+def selection_score(values:np.ndarray, columns:List[str], labels:np.ndarray, method:str="auc", k:int=20) -> dict:
+    """
+        Score a features matrix as the mean score of its k best columns according to a selection filter.
+
+        Columns with NaN after their first valid value are dropped and rows are offset to the
+        first row where all the kept columns are valid, as in FEATURES_PIPELINE.
+    """
+    first_valid, last_nan = nan_bounds(values)
+    kept = consistent_columns(first_valid, last_nan)
+    offset = int(first_valid[kept].max()) if kept.any() else len(values)
+    X = pd.DataFrame(values[offset:, kept], columns=[col for col, keep in zip(columns, kept) if keep])
+    selector = FeatureSelector(method, k=min(k, X.shape[1]), n_jobs=1).fit(X, labels[offset:])
+    return {
+        "score": float(selector.scores_.iloc[:selector.k].mean()),
+        "n_features": X.shape[1],
+        "n_rows": len(X),
+        "best_features": selector.selected_columns_[:3],
+    }
+
+
+def _score_config(parts:List[Tuple[Path, List[str]]], labels:np.ndarray, method:str, k:int) -> dict:
+    values = np.hstack([np.load(path, mmap_mode="r") for path, _ in parts])
+    return selection_score(values, [col for _, columns in parts for col in columns], labels, method, k)
+
+
+def sweep(ohlcv:pd.DataFrame, labels, grid:Dict[str, list], method:str="auc", k:int=20, n_jobs:int=-1,
+          workdir:Optional[str]=None) -> pd.DataFrame:
+    """
+        Score every configuration of a grid of pipeline settings, computing each unique intermediate once.
+
+        Parameters
+        ----------
+        ohlcv: pd.DataFrame
+            History of a symbol, i.e `Stock.ohlcv`
+        labels: array-like
+            Labels aligned with ohlcv rows, i.e `Stock.labels[cfg.LABELS]`
+        grid: dict
+            {setting: list of values} among DEFAULTS settings, the others taking their default value
+        method: str
+            Selection filter of `FeatureSelector` ("mutual_information", "auc" or "stability")
+        k: int
+            Amount of best columns whose scores are averaged
+        n_jobs: int
+            Amount of parallel processes, -1 for all cores
+        workdir: str, default=None
+            Directory of the memory-mapped intermediates, a temporary directory if None
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per configuration: its settings, `score`, `n_features`, `n_rows` and `best_features`,
+            sorted by decreasing score
+
+        Example:
+        --------
+        ```Python
+            stock = Stock("aapl")
+            report = sweep(stock.ohlcv, stock.labels[cfg.LABELS], {"scaling_window": [5, 10, 20], "correlation_threshold": [0.9, 0.95]})
+        ```
+    """
+    configs = configurations(grid)
+    labels = np.asarray(labels, dtype=float)
+    nodes = {}
+    for config in configs:
+        for stage in FEATURE_STAGES:
+            while stage is not None:
+                nodes.setdefault(node_key(stage, config), config)
+                stage = STAGES[stage].parent
+    logging.info(f"{len(configs)} configurations share {len(nodes)} stage outputs "
+                 f"instead of {len(configs) * len(STAGES)}.")
+
+    # Stages run in this process with n_jobs=1 fill the configuration globals, which are left unchanged
+    snapshot = config_snapshot()
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp, Parallel(n_jobs=n_jobs) as parallel:
+        paths = {key: Path(tmp) / f"node_{i}.npy" for i, key in enumerate(nodes)}
+        columns = {}
+        # Waves of nodes of equal depth, parents being computed by the previous wave
+        for depth in range(max(_depth(stage) for stage in STAGES) + 1):
+            wave = [key for key in nodes if _depth(key[0]) == depth]
+            start = time.perf_counter()
+            tasks = []
+            for key in wave:
+                parent = _parent_key(key, nodes[key])
+                if parent is None:
+                    tasks.append(delayed(_run_node)(key[0], nodes[key], ohlcv, None, paths[key]))
+                else:
+                    tasks.append(delayed(_run_node)(key[0], nodes[key], paths[parent], columns[parent], paths[key]))
+            results = parallel(tasks)
+            for key, (node_columns, seconds) in zip(wave, results):
+                columns[key] = node_columns
+                logging.debug(f"{key} computed in {seconds:.2f}s")
+            logging.info(f"{len(wave)} stage outputs of depth {depth} computed in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        scores = parallel(delayed(_score_config)(
+            [(paths[node_key(stage, config)], columns[node_key(stage, config)]) for stage in FEATURE_STAGES],
+            labels, method, k) for config in configs)
+        logging.info(f"{len(configs)} configurations scored in {time.perf_counter() - start:.2f}s")
+    restore_config(snapshot)
+
+    report = pd.DataFrame([{**config, **score} for config, score in zip(configs, scores)])
+    return report.sort_values("score", ascending=False, kind="stable").reset_index(drop=True)
+
+
+@click.command()
+@click.argument('symbol', default=None, required=False, type=click.STRING)
+@click.option('--synthetic-rows', default=2500, help="Sweep on a synthetic stock of this amount of bars if no symbol is given.")
+@click.option('--scaling-window', default="", help="Comma separated values of the moving scalers window.")
+@click.option('--buffer-size', default="", help="Comma separated values of the Finta buffer size.")
+@click.option('--correlation-threshold', default="", help="Comma separated values of the redundancy threshold.")
+@click.option('--method', default="auc", help="Selection filter scoring configurations.")
+@click.option('--k', default=20, help="Amount of best features whose scores are averaged.")
+@click.option('--n-jobs', default=-1, help="Amount of parallel processes.")
+@click.option('--output', default=str(REPORTS_DIR / "sweep.csv"), help="Path of the CSV report.")
+def main(symbol:Optional[str], synthetic_rows:int, scaling_window:str, buffer_size:str,
+         correlation_threshold:str, method:str, k:int, n_jobs:int, output:str):
+    from src.data.labeling import compute_labels, class_name
+
+    if symbol is not None:
+        from src.data.stock import Stock
+        stock = Stock(symbol)
+        ohlcv, labels = stock.ohlcv, stock.labels[cfg.LABELS]
+    else:
+        from src.data.synthetic import generate_ohlcv
+        ohlcv = generate_ohlcv(synthetic_rows, seed=0).set_index(cfg.DATE)
+        labels = compute_labels(ohlcv, [1], [cfg.BREAKEVEN], [])[class_name(1, cfg.BREAKEVEN)]
+
+    grid = {name: [kind(value) for value in values.split(",")]
+            for name, kind, values in [("scaling_window", int, scaling_window), ("buffer_size", int, buffer_size),
+                                       ("correlation_threshold", float, correlation_threshold)] if values != ""}
+    report = sweep(ohlcv, labels, grid, method=method, k=k, n_jobs=n_jobs)
+    logging.info(f"Configurations by decreasing {method} score:\n{report.drop(columns='best_features').to_string()}")
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output, index=False)
+    logging.info(f"Report saved in {output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(**cfg.LOGGING_CONFIG)
+    main()
@@ -0,0 +1,265 @@
+""" Walk-forward training of models on the output of the features pipeline.
+
+ Finta indicators only look at past bars, so they are computed once over the
+ whole history of each symbol and shared by every fold. Each fold then only
+ fits the remaining steps of FEATURES_PIPELINE (cleaning, scalers, pruning) on
+ its training rows, so that no statistic leaks from its test rows. Labels of
+ the last training rows are computed from the prices of the next bars: folds
+ skip `gap` bars between training and test rows, by default the labels horizon,
+ so that no training label uses the price of a test bar. Folds of all symbols
+ are trained in parallel processes.
+
+    python -m src.models.train_model aapl msft --n-splits 5
+    python -m src.models.train_model --synthetic-symbols 200 --synthetic-rows 2500
+"""
+
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import click
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, precision_score, roc_auc_score
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.pipeline import Pipeline
+
+import src.config as cfg
+from src.features.build_features import FEATURES_PIPELINE
+from src.features.finta_transformer import finta_methods, compute_finta_metrics
+
+REPORTS_DIR = Path(cfg.PROJECT_DIR) / "reports"
+
+
+def walk_forward_splits(n_samples:int, n_splits:int=5, test_size:Optional[int]=None,
+                        max_train_size:Optional[int]=None, gap:int=cfg.LABELS_HORIZON) -> List[Tuple[slice, slice]]:
+    """
+        Contiguous train and test rows of walk-forward folds.
+
+        Parameters
+        ----------
+        n_samples: int
+            Amount of rows
+        n_splits: int
+            Amount of folds
+        test_size: int, default=None
+            Amount of test rows of each fold. Defaults to `n_samples // (n_splits + 1)`.
+        max_train_size: int, default=None
+            Rolling window of training rows. Training sets expand from the first row if None.
+        gap: int
+            Amount of rows skipped between training and test rows. Labels of a row look `horizon` rows
+            ahead, so a gap below the labels horizon lets training labels use test prices.
+
+        Returns
+        -------
+        list of (train slice, test slice) tuples
+    """
+    splitter = TimeSeriesSplit(n_splits=n_splits, test_size=test_size, max_train_size=max_train_size, gap=gap)
+    return [(slice(train[0], train[-1] + 1), slice(test[0], test[-1] + 1))
+            for train, test in splitter.split(np.empty((n_samples, 1)))]
+
+
+def finta_matrix(ohlcv:pd.DataFrame) -> Tuple[np.ndarray, List[str], float]:
+    """
+        Finta indicators over the whole history of a stock, shared by all its folds.
+
+        Returns
+        -------
+        values: np.ndarray of shape (n_samples, n_indicators)
+        columns: list of str
+        seconds: float
+            Computation time
+    """
+    start = time.perf_counter()
+    # Explicit methods keep symbols independent from the columns of `cfg.FINTA_COLS`
+    finta = compute_finta_metrics(ohlcv, methods=[name for name, _ in finta_methods()])
+    return finta.values, list(finta.columns), time.perf_counter() - start
+
+
+def fold_pipeline() -> Pipeline:
+    """ Unfitted copy of the steps of FEATURES_PIPELINE following the Finta transformer."""
+    return Pipeline([(name, clone(step)) for name, step in FEATURES_PIPELINE.steps[1:]])
+
+
+def _scores(estimator, X:pd.DataFrame) -> np.ndarray:
+    if hasattr(estimator, "predict_proba"):
+        return estimator.predict_proba(X)[:, -1]
+    return estimator.predict(X)
+
+
+def _metrics(y:np.ndarray, scores:np.ndarray, predictions:np.ndarray) -> Dict[str, float]:
+    both_classes = len(np.unique(y)) > 1
+    return {
+        "accuracy": accuracy_score(y, predictions),
+        "precision": precision_score(y, predictions, zero_division=0),
+        "roc_auc": roc_auc_score(y, scores) if both_classes else np.nan,
+        "positive_rate": float(np.mean(y)),
+    }
+
+
+def run_fold(symbol:str, fold:int, values:np.ndarray, columns:List[str], labels:np.ndarray,
+             dates:np.ndarray, n_train:int, n_test:int, estimator) -> Tuple[dict, pd.DataFrame]:
+    """
+        Fit the features pipeline and the estimator on the first `n_train` rows and score the last `n_test` rows.
+        Rows in between (gap) are only used as history of the moving windows of test rows.
+
+        Parameters
+        ----------
+        values, columns:
+            Finta indicators of the training and test rows of the fold (see `finta_matrix`)
+        labels: np.ndarray
+            Labels of the same rows, NaN for unlabelled rows
+        dates: np.ndarray
+            Dates of the same rows
+        n_train, n_test: int
+            Amounts of training and test rows
+
+        Returns
+        -------
+        metrics: dict
+            Amounts of rows, timings and test metrics of the fold
+        predictions: pd.DataFrame
+            Test scores and labels of each test date
+    """
+    timings = {}
+    start = time.perf_counter()
+    finta = pd.DataFrame(values, columns=columns)
+    pipeline = fold_pipeline()
+    X_train = pipeline.fit_transform(finta.iloc[:n_train].copy())
+    # Test rows are transformed with their history for moving windows, then kept alone
+    X_test = pipeline.transform(finta.copy()).iloc[-n_test:]
+    timings["features_s"] = time.perf_counter() - start
+
+    # Pipeline outputs drop their first rows, labels are aligned on the last ones
+    y_train = labels[:n_train][-len(X_train):]
+    y_test, test_dates = labels[-n_test:], dates[-n_test:]
+    train_rows, test_rows = ~np.isnan(y_train), ~np.isnan(y_test)
+
+    start = time.perf_counter()
+    model = clone(estimator).fit(X_train[train_rows], y_train[train_rows])
+    timings["fit_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = _scores(model, X_test)
+    predictions = model.predict(X_test)
+    timings["predict_s"] = time.perf_counter() - start
+
+    metrics = {
+        "symbol": symbol,
+        "fold": fold,
+        "train_start": dates[0],
+        "test_start": test_dates[0],
+        "test_end": test_dates[-1],
+        "n_train": int(train_rows.sum()),
+        "n_test": int(test_rows.sum()),
+        "n_features": X_train.shape[1],
+        **timings,
+        **_metrics(y_test[test_rows], scores[test_rows], predictions[test_rows]),
+    }
+    predictions = pd.DataFrame({"symbol": symbol, "fold": fold, cfg.DATE: test_dates,
+                                "score": scores, cfg.LABELS: y_test})
+    return metrics, predictions
+
+
+def walk_forward(ohlcvs:Dict[str, pd.DataFrame], labels:Dict[str, pd.Series], estimator=None, n_splits:int=5,
+                 test_size:Optional[int]=None, max_train_size:Optional[int]=None, gap:int=cfg.LABELS_HORIZON,
+                 n_jobs:int=-1) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+        Walk-forward evaluation of an estimator over several stocks.
+
+        Parameters
+        ----------
+        ohlcvs: dict
+            {symbol: ohlcv with ascending dates as index}, i.e `Stock.ohlcv`
+        labels: dict
+            {symbol: labels aligned with the ohlcv rows}, i.e `Stock.labels[cfg.LABELS]`
+        estimator: sklearn estimator, default=None
+            Cloned for each fold. Defaults to a logistic regression.
+        n_splits, test_size, max_train_size, gap:
+            Folds of each stock (see `walk_forward_splits`)
+        n_jobs: int
+            Amount of parallel processes, -1 for all cores
+
+        Returns
+        -------
+        report: pd.DataFrame
+            One row of timings and metrics per fold of each symbol
+        predictions: pd.DataFrame
+            Test scores and labels of every fold
+
+        Example:
+        --------
+        ```Python
+            stocks = {symbol: Stock(symbol) for symbol in ["aapl", "msft"]}
+            report, predictions = walk_forward({s: st.ohlcv for s, st in stocks.items()},
+                                               {s: st.labels[cfg.LABELS] for s, st in stocks.items()})
+        ```
+    """
+    estimator = LogisticRegression(max_iter=1000) if estimator is None else estimator
+    symbols = list(ohlcvs)
+
+    start = time.perf_counter()
+    finta = Parallel(n_jobs=n_jobs)(delayed(finta_matrix)(ohlcvs[symbol]) for symbol in symbols)
+    finta_seconds = dict(zip(symbols, (seconds for _, _, seconds in finta)))
+    logging.info(f"Finta indicators of {len(symbols)} symbols computed in {time.perf_counter() - start:.2f}s")
+
+    tasks = []
+    for symbol, (values, columns, _) in zip(symbols, finta):
+        y = np.asarray(labels[symbol], dtype=float)
+        dates = ohlcvs[symbol].index.values
+        for fold, (train, test) in enumerate(walk_forward_splits(len(values), n_splits, test_size, max_train_size, gap)):
+            rows = slice(train.start, test.stop)
+            tasks.append(delayed(run_fold)(symbol, fold, values[rows], columns, y[rows], dates[rows],
+                                           train.stop - train.start, test.stop - test.start, estimator))
+
+    start = time.perf_counter()
+    results = Parallel(n_jobs=n_jobs)(tasks)
+    logging.info(f"{len(tasks)} folds trained in {time.perf_counter() - start:.2f}s")
+
+    report = pd.DataFrame([metrics for metrics, _ in results])
+    report["finta_s"] = report["symbol"].map(finta_seconds)
+    predictions = pd.concat([predictions for _, predictions in results], ignore_index=True)
+    return report, predictions
+
+
+@click.command()
+@click.argument('symbols', nargs=-1, type=click.STRING)
+@click.option('--synthetic-symbols', default=None, type=int, help="Train on synthetic stocks instead of stock data.")
+@click.option('--synthetic-rows', default=2500, help="Amount of bars of each synthetic stock.")
+@click.option('--n-splits', default=5, help="Amount of walk-forward folds.")
+@click.option('--test-size', default=None, type=int, help="Amount of test bars of each fold.")
+@click.option('--max-train-size', default=None, type=int, help="Rolling training window, expanding if not set.")
+@click.option('--gap', default=cfg.LABELS_HORIZON, help="Amount of bars between training and test bars, at least the labels horizon.")
+@click.option('--n-jobs', default=-1, help="Amount of parallel processes.")
+@click.option('--output', default=str(REPORTS_DIR / "walk_forward.csv"), help="Path of the CSV report.")
+def main(symbols:Tuple[str], synthetic_symbols:int, synthetic_rows:int, n_splits:int, test_size:int,
+         max_train_size:int, gap:int, n_jobs:int, output:str):
+    from src.data.labeling import compute_labels, class_name
+
+    if synthetic_symbols is not None:
+        from src.data.synthetic import generate_universe
+        ohlcvs = {symbol: df.set_index(cfg.DATE) for symbol, df in generate_universe(synthetic_symbols, synthetic_rows, seed=0)}
+        labels = {symbol: compute_labels(df, [cfg.LABELS_HORIZON], [cfg.BREAKEVEN], [])[class_name(cfg.LABELS_HORIZON, cfg.BREAKEVEN)] for symbol, df in ohlcvs.items()}
+    elif len(symbols) > 0:
+        from src.data.stock import Stock
+        stocks = {symbol: Stock(symbol) for symbol in symbols}
+        ohlcvs = {symbol: stock.ohlcv for symbol, stock in stocks.items()}
+        labels = {symbol: stock.labels[cfg.LABELS] for symbol, stock in stocks.items()}
+    else:
+        raise click.UsageError("Provide SYMBOLS or --synthetic-symbols.")
+
+    report, _ = walk_forward(ohlcvs, labels, n_splits=n_splits, test_size=test_size,
+                             max_train_size=max_train_size, gap=gap, n_jobs=n_jobs)
+    summary = report.groupby("symbol")[["accuracy", "roc_auc", "features_s", "fit_s", "predict_s"]].mean()
+    logging.info(f"Mean fold metrics and timings:\n{summary.describe().loc[['mean', 'min', 'max']]}")
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output, index=False)
+    logging.info(f"Report saved in {output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(**cfg.LOGGING_CONFIG)
+    main()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from src.data.feature_store import FeatureStore, FeatureStoreWriter, quantize, write_features
+
+
+def test_round_trip_within_quantization_error(tmp_path):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({
+        "scaled": rng.uniform(0, 1, 1000),
+        "raw": np.cumsum(rng.standard_normal(1000)) * 1e4,
+        "sparse": np.where(rng.random(1000) < 0.3, np.nan, rng.standard_normal(1000)),
+        "infinite": np.r_[np.inf, rng.standard_normal(999)],
+    })
+    path = write_features(tmp_path / "features.feat", X, encoding="auto", max_error=1e-3, block_rows=300)
+
+    with FeatureStore(path) as store:
+        assert store.shape == X.shape
+        assert store.encodings()["scaled"] == ["int16"] and store.encodings()["raw"] == ["float32"]
+        assert store.encodings()["infinite"] == ["float32", "int16"]
+        values = store.read()
+        assert values.dtype == np.float32
+        np.testing.assert_allclose(values, X.values, atol=1e-3, rtol=1e-6)
+        np.testing.assert_array_equal(np.isnan(values), np.isnan(X.values))
+        # Random access to columns and to rows across blocks
+        np.testing.assert_array_equal(store.read(["sparse", "scaled"], 250, 700), values[250:700, [2, 0]])
+        assert list(store.read_frame(start=-5).index) == list(range(995, 1000))
+
+
+def test_streamed_blocks_match_single_write(tmp_path):
+    X = pd.DataFrame(np.random.default_rng(1).standard_normal((500, 3)), columns=["a", "b", "c"])
+    writer = FeatureStoreWriter(tmp_path / "streamed.feat", encoding="int8", block_rows=128)
+    for start in range(0, len(X), 70):
+        writer.write(X.iloc[start:start + 70])
+    streamed = writer.close()
+    single = write_features(tmp_path / "single.feat", X, encoding="int8", block_rows=128)
+
+    with FeatureStore(streamed) as a, FeatureStore(single) as b:
+        np.testing.assert_array_equal(a.read(), b.read())
+    codes, encoding, scale, offset = quantize(X["a"].values[:128], "int8")
+    assert encoding == "int8" and np.abs(codes * scale + offset - X["a"].values[:128]).max() <= scale / 2 + 1e-12
+
+
+def test_auto_encoding_accounts_for_float32_decoding(tmp_path):
+    rng = np.random.default_rng(2)
+    X = pd.DataFrame({"level": 5e4 + rng.uniform(0, 0.1, 500), "shifted": 300 + rng.uniform(0, 1, 500)})
+    path = write_features(tmp_path / "features.feat", X, encoding="auto", max_error=1e-3)
+
+    with FeatureStore(path) as store:
+        # The float32 rounding of a 5e4 offset alone exceeds the error bound
+        assert store.encodings() == {"level": ["float32"], "shifted": ["int16"]}
+        values = store.read()
+    assert np.abs(values - X.values.astype(np.float32)).max() <= 1e-3
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+from src.data.labeling import barrier_name, class_name, compute_labels, compute_universe_labels, forward_return_name
+from src.data.synthetic import generate_ohlcv, generate_universe
+
+
+def naive_triple_barrier(df, t, horizon, take_profit, stop_loss):
+    if t + horizon >= len(df):
+        return np.nan
+    entry = df[cfg.OPEN].iloc[t + 1]
+    for i in range(t + 1, t + horizon + 1):
+        if df[cfg.LOW].iloc[i] <= entry * (1 - stop_loss):
+            return -1.
+        if df[cfg.HIGH].iloc[i] >= entry * (1 + take_profit):
+            return 1.
+    return 0.
+
+
+def test_labels_match_naive_computation():
+    df = generate_ohlcv(60, seed=0)
+    # Storage order does not matter
+    labels = compute_labels(df.iloc[::-1], horizons=[1, 3], thresholds=[0.003], barriers=[(0.01, 0.01)]).iloc[::-1]
+    next_day = (df[cfg.CLOSE] - df[cfg.OPEN]).shift(-1) / df[cfg.OPEN].shift(-1)
+    np.testing.assert_allclose(labels[forward_return_name(1)], next_day)
+    expected = next_day.apply(lambda x: 0 if x < 0.003 else x / x)
+    np.testing.assert_array_equal(labels[class_name(1, 0.003)], expected)
+    for h in (1, 3):
+        expected = [naive_triple_barrier(df, t, h, 0.01, 0.01) for t in range(len(df))]
+        np.testing.assert_array_equal(labels[barrier_name(h, 0.01, 0.01)], expected)
+
+
+def test_universe_labels_match_single_stock_labels():
+    universe = dict(generate_universe(3, 40, seed=0))
+    universe["SYN00001"] = universe["SYN00001"].iloc[:25]
+    labels = compute_universe_labels(universe, horizons=[1, 5], thresholds=[0., 0.01], barriers=[(0.02, 0.01)])
+    for symbol, df in universe.items():
+        pd.testing.assert_frame_equal(labels[symbol], compute_labels(df, [1, 5], [0., 0.01], [(0.02, 0.01)]))
@@ -0,0 +1,8 @@
+from src.benchmarks.startup import LAZY_MODULES, import_profile
+
+
+def test_entry_points_defer_heavy_imports():
+    for module in ["src.data.make_dataset", "src.features.build_features"]:
+        loaded = {m["module"] for m in import_profile(module)}
+        assert module in loaded
+        assert not loaded.intersection(LAZY_MODULES)
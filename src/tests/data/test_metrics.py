@@ -0,0 +1,58 @@
+import json
+import urllib.request
+
+import pandas as pd
+
+import src.config as cfg
+import src.data.alpha_vantage_api as alpha_vantage_api
+from src.data.metrics import METRICS, MetricsRegistry, serve_metrics
+
+
+def test_registry_counters_histograms_and_quota():
+    registry = MetricsRegistry(calls_per_minute=5, calls_per_day=25)
+    registry.inc("api_calls", mode="daily", symbol="aapl")
+    registry.inc("api_calls", 2, mode="daily", symbol="msft")
+    for value in [3., 30., 300.]:
+        registry.observe("api_latency_ms", value, mode="daily")
+    for t in [0., 50., 100., 130.]:
+        registry.record_call(now=1e6 + t)
+
+    assert registry.counter("api_calls") == 3 and registry.counter("api_calls", symbol="msft") == 2
+    histogram = registry.histogram("api_latency_ms", mode="daily")
+    assert histogram.count == 3 and histogram.sum == 333. and histogram.quantile(0.5) == 50
+    assert histogram.quantile(1.) == 300.
+    quota = registry.quota(now=1e6 + 130.)
+    assert quota["calls_last_minute"] == 2 and quota["calls_last_day"] == 4 and quota["minute_usage"] == 0.4
+    json.dumps(registry.snapshot())
+
+
+def test_alpha_vantage_calls_are_instrumented(monkeypatch):
+    class FlakyClient:
+        calls = 0
+
+        def get_daily(self, symbol, outputsize):
+            self.calls += 1
+            if self.calls == 1:
+                raise ValueError("Rate limited")
+            return pd.DataFrame({"1. open": [1.], "4. close": [1.]}), {}
+
+    monkeypatch.setattr(alpha_vantage_api, "time_series", FlakyClient)
+    monkeypatch.setattr(alpha_vantage_api.time, "sleep", lambda s: None)
+    METRICS.reset()
+    alpha_vantage_api.get_data_from_alpha_vantage("SYN")
+
+    assert METRICS.counter("api_calls", symbol="SYN") == 2
+    assert METRICS.counter("api_retries", mode="daily") == 1
+    assert METRICS.counter("api_errors", error="ValueError") == 1
+    assert METRICS.counter("api_payload_bytes") > 0
+    assert METRICS.histogram("api_latency_ms", mode="daily", symbol="SYN").count == 2
+    assert METRICS.quota()["calls_last_minute"] == 2
+
+    server = serve_metrics(port=0)
+    try:
+        url = f"http://{cfg.METRICS_HOST}:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            snapshot = json.loads(response.read())
+    finally:
+        server.shutdown()
+    assert {"name": "api_retries", "labels": {"mode": "daily", "symbol": "SYN"}, "value": 1} in snapshot["counters"]
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+from src.data.resampling import resample_ohlcv
+from src.data.synthetic import generate_ohlcv
+
+AGGREGATIONS = {cfg.OPEN: "first", cfg.HIGH: "max", cfg.LOW: "min", cfg.CLOSE: "last", cfg.VOLUME: "sum"}
+
+
+def test_resample_matches_groupby():
+    # Three sessions of 1-minute bars, with pre-market and post-market bars
+    ohlcv = generate_ohlcv(3 * 390, freq="1min", seed=0).set_index(cfg.DATE)
+    extra = ohlcv.iloc[[0, 1, -2, -1]].copy()
+    extra.index = extra.index.normalize() + pd.to_timedelta(["08:00:00", "09:29:00", "16:00:00", "17:45:00"])
+    ohlcv = pd.concat([ohlcv, extra]).sort_index()
+    dates = ohlcv.index
+
+    hourly = resample_ohlcv(ohlcv, "60min")
+    session = ohlcv[(dates.time >= pd.Timestamp("09:30").time()) & (dates.time < pd.Timestamp("16:00").time())]
+    expected = session.groupby(session.index.floor("D") + ((session.index - session.index.floor("D")
+                                - pd.Timedelta("9h30min")) // pd.Timedelta("60min")) * pd.Timedelta("60min")
+                                + pd.Timedelta("9h30min")).agg(AGGREGATIONS)
+    assert len(hourly) == 3 * 7 and hourly.index[-1] == pd.Timestamp(dates[-1].date()) + pd.Timedelta("15h30min")
+    np.testing.assert_allclose(hourly.values, expected.values)
+    np.testing.assert_array_equal(hourly.index.values, expected.index.values)
+
+    daily = resample_ohlcv(ohlcv, "daily", extended_hours=True)
+    np.testing.assert_allclose(daily.values, ohlcv.groupby(dates.floor("D")).agg(AGGREGATIONS).values)
+
+    extended = resample_ohlcv(ohlcv, "60min", extended_hours=True)
+    assert extended.index[0].time() == pd.Timestamp("07:30").time()
+    assert pd.Timestamp("16:00").time() in set(extended.index.time)
+    assert extended[cfg.VOLUME].sum() == ohlcv[cfg.VOLUME].sum()
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.config as cfg
+from src.data.stock import Stock
+from src.data.synthetic import generate_ohlcv
+from src.data.validation import check_ohlcv, ingest_ohlcv
+
+
+def make_stock(dohlcv):
+    stock = Stock.__new__(Stock)
+    stock.symbol = "SYN"
+    stock.set_data(dohlcv)
+    return stock
+
+
+def test_views_are_ascending_cached_and_invalidated():
+    dohlcv = generate_ohlcv(50, seed=0)
+    # Descending storage with a duplicated day, as previously saved files
+    stock = make_stock(pd.concat([dohlcv, dohlcv.iloc[[10]]]).iloc[::-1])
+    assert stock.ohlcv.index.is_monotonic_increasing and len(stock.ohlcv) == 50
+    assert stock.ohlc is stock.ohlc and stock.labels is stock.labels
+    np.testing.assert_allclose(stock.ohlcv.values, dohlcv[cfg.OHLCV].values)
+
+    X, y = stock.training_data
+    next_day = (dohlcv[cfg.CLOSE] - dohlcv[cfg.OPEN]).shift(-1) / dohlcv[cfg.OPEN].shift(-1)
+    np.testing.assert_array_equal(y[cfg.LABELS], (next_day.iloc[:-1] >= cfg.BREAKEVEN).astype(float))
+    np.testing.assert_allclose(stock._next_day_evolution_ratio.values, next_day.values)
+
+    stock.set_data(dohlcv.iloc[:30])
+    assert len(stock.ohlc) == 30 and len(stock.labels) == 30
+
+
+def test_invalid_rows():
+    dohlcv = generate_ohlcv(20, seed=0)
+    dohlcv.loc[3, cfg.HIGH] = dohlcv.loc[3, cfg.LOW] - 1
+    dohlcv.loc[5, cfg.VOLUME] = np.nan
+    checks = check_ohlcv(dohlcv)
+    assert list(np.flatnonzero(checks["high_below_low"])) == [3]
+    assert list(np.flatnonzero(checks["missing"])) == [5]
+    with pytest.raises(ValueError):
+        ingest_ohlcv(dohlcv)
+    assert len(ingest_ohlcv(dohlcv, errors="drop")) == 18
+    assert len(ingest_ohlcv(dohlcv, errors="warn")) == 20
+
+
+def test_downloaded_invalid_rows_do_not_prevent_loading(monkeypatch):
+    dohlcv = generate_ohlcv(20, seed=0)
+    dohlcv.loc[3, cfg.HIGH] = dohlcv.loc[3, cfg.LOW] - 1
+    monkeypatch.setattr(Stock, "load_existing_dataset", lambda self: (None, None))
+    monkeypatch.setattr("src.data.stock.get_data_from_alpha_vantage", lambda symbol, **settings: (dohlcv, {}))
+    assert len(Stock("SYN").ohlcv) == 20
+    with pytest.raises(ValueError):
+        Stock("SYN").set_data(dohlcv)
+
+
+def test_features_are_loaded_from_the_newest_file(tmp_path, monkeypatch):
+    import os
+    from src.data.feature_store import write_features
+
+    monkeypatch.setattr(cfg, "PROCESSED_DATA_DIR", str(tmp_path))
+    stock = make_stock(generate_ohlcv(20, seed=0))
+    X = pd.DataFrame({"a": np.linspace(0, 1, 20)})
+    X.to_csv(stock.features_filepath, index=False)
+    write_features(stock.features_store_filepath, X + 1)
+    assert stock.features["a"].iloc[0] == 1
+    os.utime(stock.features_filepath, (stock.features_store_filepath.stat().st_mtime + 10,) * 2)
+    assert stock.features["a"].iloc[0] == 0
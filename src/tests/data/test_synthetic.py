@@ -0,0 +1,30 @@
+import numpy as np
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv, generate_universe
+
+
+def test_generate_ohlcv_is_seeded():
+    a = generate_ohlcv(100, seed=42)
+    b = generate_ohlcv(100, seed=42)
+    assert a.equals(b)
+    assert not a.equals(generate_ohlcv(100, seed=43))
+
+
+def test_generate_ohlcv_consistency():
+    df = generate_ohlcv(5000, freq="15min", seed=0)
+    assert list(df.columns) == cfg.DOHLCV
+    assert df[cfg.DATE].is_monotonic_increasing
+    assert (df[cfg.LOW] <= df[[cfg.OPEN, cfg.CLOSE]].min(axis=1)).all()
+    assert (df[cfg.HIGH] >= df[[cfg.OPEN, cfg.CLOSE]].max(axis=1)).all()
+    assert (df[cfg.VOLUME] >= 0).all()
+    # Bars stay within the 9:30 - 16:00 session
+    minutes = df[cfg.DATE].dt.hour * 60 + df[cfg.DATE].dt.minute
+    assert minutes.min() == 9 * 60 + 30 and minutes.max() < 16 * 60
+
+
+def test_generate_universe_symbols_differ():
+    universe = dict(generate_universe(3, 50, seed=0))
+    assert len(universe) == 3
+    closes = [df[cfg.CLOSE].values for df in universe.values()]
+    assert not np.allclose(closes[0], closes[1])
@@ -0,0 +1,26 @@
+import copy
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv
+from src.features.backfill import backfill_features
+from src.features.build_features import FEATURES_PIPELINE
+
+
+def test_backfill_matches_sequential_transform():
+    ohlcv = generate_ohlcv(420, seed=0).set_index(cfg.DATE)
+    cfg.FINTA_COLS = None
+    pipeline = clone(FEATURES_PIPELINE)
+    pipeline.fit_transform(ohlcv.iloc[:-20])
+    features = backfill_features(pipeline, ohlcv, start=ohlcv.index[-20])
+
+    sequential = copy.deepcopy(pipeline)
+    expected = pd.concat([sequential.transform(ohlcv.iloc[i]) for i in range(-20, 0)])
+    assert list(features.columns) == list(expected.columns)
+    assert (features.index == ohlcv.index[-20:]).all()
+    np.testing.assert_allclose(features.values, expected.values.astype(float), rtol=1e-7, atol=1e-7)
+    # The pipeline is left untouched
+    np.testing.assert_array_equal(backfill_features(pipeline, ohlcv, start=ohlcv.index[-20]).values, features.values)
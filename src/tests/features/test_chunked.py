@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv
+from src.features.build_features import FEATURES_PIPELINE
+from src.features.chunked import CSVSink, chunked_fit_transform
+from src.models.persistence import config_snapshot
+
+
+def test_chunked_matches_in_memory_run(tmp_path):
+    ohlcv = generate_ohlcv(1200, seed=0).set_index(cfg.DATE)
+    cfg.FINTA_COLS = None
+    pipeline = clone(FEATURES_PIPELINE)
+    expected = pipeline.fit_transform(ohlcv)
+    snapshot = config_snapshot()
+
+    cfg.FINTA_COLS = None
+    chunked = clone(FEATURES_PIPELINE)
+    path = chunked_fit_transform(chunked, ohlcv, block_size=250, sink=CSVSink(tmp_path / "features.csv"))
+    assert config_snapshot() == snapshot
+
+    X = pd.read_csv(path, float_precision="round_trip")
+    assert list(X.columns) == list(expected.columns)
+    np.testing.assert_array_equal(X.values, expected.values.astype(float))
+    np.testing.assert_array_equal(chunked.transform(ohlcv.iloc[-1]).values, pipeline.transform(ohlcv.iloc[-1]).values)
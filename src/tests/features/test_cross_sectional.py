@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import clone
+
+import src.config as cfg
+from src.data.synthetic import generate_universe
+from src.features.build_features import FEATURES_PIPELINE
+from src.features.cross_sectional import CrossSectionalTransformer, cross_sectional_stats, stat_column
+from src.models.persistence import config_snapshot, restore_config
+
+
+def test_stats_match_pandas_with_ties_and_missing_symbols():
+    rng = np.random.default_rng(0)
+    # Few distinct values for many ties, missing symbols, a date without values and a date with one value
+    values = rng.integers(0, 5, (200, 30, 2)).astype(float)
+    values[rng.random(values.shape) < 0.2] = np.nan
+    values[3, :, 0] = np.nan
+    values[4, 1:, 1] = np.nan
+
+    stats = cross_sectional_stats(values, memory_budget=30 * 2 * 64 * 7)
+    for col in range(values.shape[2]):
+        df = pd.DataFrame(values[:, :, col])
+        demeaned = df.sub(df.mean(axis=1), axis=0)
+        expected = {
+            "rank": df.rank(axis=1),
+            "percentile": df.rank(axis=1, pct=True),
+            "demeaned": demeaned,
+            "zscore": demeaned.div(df.std(axis=1), axis=0).replace([np.inf, -np.inf], np.nan),
+        }
+        for stat, frame in expected.items():
+            frame[df.count(axis=1) < 2] = np.nan
+            np.testing.assert_allclose(stats[stat][:, :, col], frame.values, equal_nan=True, err_msg=stat)
+
+
+def test_transformer_keeps_symbol_dates():
+    dates = pd.date_range("2020-01-01", periods=4, name="date")
+    frames = {
+        "a": pd.DataFrame({"x": [1., 2., 3., 4.]}, index=dates),
+        "b": pd.DataFrame({"x": [4., 3., 2.]}, index=dates[1:]),
+        "c": pd.DataFrame({"x": [0., 3.]}, index=dates[[0, 2]]),
+    }
+    transformed = CrossSectionalTransformer(stats=["rank", "demeaned"]).fit_transform(frames)
+
+    assert list(transformed["b"].index) == list(dates[1:])
+    np.testing.assert_allclose(transformed["a"][stat_column("x", "rank")], [2., 1., 2., 2.])
+    np.testing.assert_allclose(transformed["c"][stat_column("x", "rank")], [1., 2.])
+    np.testing.assert_allclose(transformed["b"][stat_column("x", "demeaned")], [1., 0., -1.])
+
+
+def test_transformer_on_features_pipeline_outputs():
+    snapshot = config_snapshot()
+    outputs, features = {}, {}
+    for symbol, df in generate_universe(3, 300, seed=0):
+        ohlcv = df.set_index(cfg.DATE)
+        cfg.FINTA_COLS = None
+        outputs[symbol] = X = clone(FEATURES_PIPELINE).fit_transform(ohlcv)
+        features[symbol] = X.set_axis(ohlcv.index[-len(X):])
+    restore_config(snapshot)
+    column = sorted(set.intersection(*(set(X.columns) for X in features.values())))[0]
+    transformer = CrossSectionalTransformer(columns=[column], stats=["rank", "demeaned"])
+
+    # Pipeline outputs are indexed by row numbers, which are not dates
+    with pytest.raises(ValueError, match="re-index"):
+        transformer.fit_transform(outputs)
+
+    transformed = transformer.fit_transform(features)
+    panel = pd.DataFrame({symbol: X[column] for symbol, X in features.items()})
+    ranks = panel.rank(axis=1).where(panel.count(axis=1) >= 2)
+    demeaned = panel.sub(panel.mean(axis=1), axis=0).where(panel.count(axis=1) >= 2)
+    for symbol, X in transformed.items():
+        assert X.index.equals(features[symbol].index)
+        np.testing.assert_allclose(X[stat_column(column, "rank")], ranks.loc[X.index, symbol], equal_nan=True)
+        np.testing.assert_allclose(X[stat_column(column, "demeaned")], demeaned.loc[X.index, symbol], equal_nan=True)
+    assert transformed[symbol][stat_column(column, "rank")].nunique() > 1
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv
+from src.features.build_features import FEATURES_PIPELINE
+from src.features.drift import DriftMonitor, add_drift_monitors
+from src.features.inference_plan import InferencePlan
+
+
+def test_drift_monitor_flags_shifted_columns():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.standard_normal((5000, 3)), columns=["same", "shifted", "wider"])
+    monitor = DriftMonitor()
+    assert monitor.fit_transform(X) is X
+    rows = rng.standard_normal((400, 3)) * [1., 1., 3.] + [0., 1., 0.]
+    for row in rows[:200]:
+        monitor.update(row)
+    monitor.transform(pd.DataFrame(rows[200:], columns=X.columns))
+    assert monitor.drifting() == ["shifted", "wider"]
+    report = monitor.report()
+    np.testing.assert_allclose(report["mean"], rows.mean(axis=0))
+    np.testing.assert_allclose(report["std"], rows.std(axis=0))
+
+
+def test_decayed_updates_match_weighted_statistics():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.standard_normal((1000, 2)))
+    rows = rng.standard_normal((300, 2))
+    rows[10, 1] = np.nan
+    batch = DriftMonitor(halflife=50).fit(X)
+    batch.update(rows)
+    streamed = DriftMonitor(halflife=50).fit(X)
+    for row in rows:
+        streamed.update(row)
+    np.testing.assert_allclose(streamed.counts_, batch.counts_)
+    np.testing.assert_allclose(streamed.mean_, batch.mean_)
+    np.testing.assert_allclose(streamed.squares_, batch.squares_)
+    weights = 0.5 ** (np.arange(299, -1, -1) / 50)
+    np.testing.assert_allclose(batch.mean_[0], weights @ rows[:, 0] / weights.sum())
+
+
+def test_inference_plan_updates_monitor_copies():
+    ohlcv = generate_ohlcv(400, seed=0).set_index(cfg.DATE)
+    cfg.FINTA_COLS = None
+    pipeline = add_drift_monitors(FEATURES_PIPELINE, after=("clean_finta",))
+    pipeline.fit_transform(ohlcv.iloc[:-5])
+    plan = InferencePlan(pipeline)
+    for bar in ohlcv.iloc[-5:][cfg.OHLCV].values:
+        plan.update(bar)
+    assert plan.drift_monitors["drift_clean_finta"].n_rows_ == 5
+    assert pipeline.named_steps["drift_clean_finta"].n_rows_ == 0
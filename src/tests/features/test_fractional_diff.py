@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.features.fractional_diff import FractionalDifferentiator, fractional_differences, fractional_weights
+
+
+def test_fractional_weights_cutoff():
+    np.testing.assert_allclose(fractional_weights(1.), [1., -1.])
+    np.testing.assert_allclose(fractional_weights(0.5, threshold=0.1), [1., -0.5, -0.125])
+    assert len(fractional_weights(0.4, threshold=1e-6, max_width=100)) == 100
+
+
+def test_fft_matches_direct_convolution():
+    rng = np.random.default_rng(0)
+    values = 1e4 + rng.standard_normal((2000, 3)).cumsum(axis=0)
+    values[:30, 1] = np.nan
+    weights = [fractional_weights(d) for d in [0.2, 0.4]]
+    diffs = fractional_differences(values, weights)
+    for i, w in enumerate(weights):
+        expected = np.full(values.shape, np.nan)
+        expected[len(w) - 1:] = sliding_window_view(values, len(w), axis=0) @ w[::-1]
+        np.testing.assert_allclose(diffs[:, i * 3:(i + 1) * 3], expected, rtol=1e-10)
+
+
+def test_transform_completes_short_inputs_with_buffer():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(100 + rng.standard_normal((1000, 2)).cumsum(axis=0), columns=["a", "b"])
+    transformer = FractionalDifferentiator(d_values=[0., 0.4])
+    expected = transformer.fit_transform(X.iloc[:-2])
+    assert list(expected.columns) == ["a_fracdiff_0", "b_fracdiff_0", "a_fracdiff_0.4", "b_fracdiff_0.4"]
+    np.testing.assert_allclose(expected.iloc[:, :2].values, X.iloc[:-2].values)
+
+    full = FractionalDifferentiator(d_values=[0., 0.4]).fit_transform(X)
+    for i in [2, 1]:
+        np.testing.assert_allclose(transformer.transform(X.iloc[-i]).values[0], full.values[-i], rtol=1e-10)
@@ -0,0 +1,67 @@
+import logging
+
+import numpy as np
+from sklearn.base import clone
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv
+from src.features.build_features import FEATURES_PIPELINE
+from src.features.fractional_diff import FractionalDifferentiator
+from src.features.finta_transformer import compute_finta_indicator, finta_methods
+from src.features import inference_plan
+from src.features.inference_plan import FINTA_KERNELS, InferencePlan
+
+
+def test_inference_plan_matches_pipeline_transform():
+    ohlcv = generate_ohlcv(300, seed=0).set_index(cfg.DATE)
+    FEATURES_PIPELINE.fit_transform(ohlcv.iloc[:-3])
+    plan = InferencePlan(FEATURES_PIPELINE)
+    for i in range(3, 0, -1):
+        bar = ohlcv.iloc[-i]
+        expected = FEATURES_PIPELINE.transform(bar)
+        features = plan.update(bar)
+        assert list(expected.columns) == plan.output_columns
+        np.testing.assert_allclose(features, expected.values[0], rtol=1e-9, atol=1e-9)
+
+
+def test_inference_plan_with_fractional_differences():
+    ohlcv = generate_ohlcv(700, seed=0).set_index(cfg.DATE)
+    cfg.FINTA_COLS = None
+    pipeline = clone(FEATURES_PIPELINE)
+    pipeline.steps.insert(2, ("fracdiff", FractionalDifferentiator(d_values=[0.4])))
+    pipeline.fit_transform(ohlcv.iloc[:-2])
+    plan = InferencePlan(pipeline)
+    for i in range(2, 0, -1):
+        bar = ohlcv.iloc[-i]
+        expected = pipeline.transform(bar)
+        assert list(expected.columns) == plan.output_columns
+        np.testing.assert_allclose(plan.update(bar), expected.values[0], rtol=1e-9, atol=1e-9)
+
+
+def test_finta_kernels_match_finta_methods():
+    window = generate_ohlcv(98, seed=1).set_index(cfg.DATE).reset_index(drop=True)
+    methods = dict(finta_methods())
+    for name, kernel in FINTA_KERNELS.items():
+        expected = compute_finta_indicator(name, methods[name], window.copy()).values[-1]
+        values = kernel(*(window[col].values for col in (cfg.HIGH, cfg.LOW, cfg.CLOSE)))
+        np.testing.assert_allclose(values, expected.astype(float), rtol=1e-12, atol=1e-12, err_msg=name)
+
+
+def test_finta_methods_failing_on_the_fit_buffer_are_logged(monkeypatch, caplog):
+    ohlcv = generate_ohlcv(300, seed=0).set_index(cfg.DATE)
+    FEATURES_PIPELINE.fit_transform(ohlcv.iloc[:-1])
+    columns = list(FEATURES_PIPELINE.transform(ohlcv.iloc[-1]).columns)
+
+    def compute(name, method, df):
+        if name == "MACD":
+            raise ValueError("Broken method")
+        return compute_finta_indicator(name, method, df)
+
+    monkeypatch.setattr(inference_plan, "compute_finta_indicator", compute)
+    with caplog.at_level(logging.WARNING):
+        plan = InferencePlan(FEATURES_PIPELINE)
+    warnings = [record.message for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1 and "'MACD'" in warnings[0] and "MACD_MACD" in warnings[0]
+    macd = [i for i, col in enumerate(plan.output_columns) if col.startswith("MACD_")]
+    assert len(macd) > 0 and plan.output_columns == columns
+    assert np.isnan(plan.update(ohlcv.iloc[-1])[macd]).all()
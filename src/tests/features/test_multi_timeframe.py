@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv
+from src.features.multi_timeframe import multi_timeframe_features
+
+
+def moving_close(ohlcv:pd.DataFrame) -> pd.DataFrame:
+    # Drops its first rows and resets the index, as FEATURES_PIPELINE
+    return ohlcv[[cfg.CLOSE]].rolling(2).mean().iloc[1:].reset_index(drop=True)
+
+
+def test_higher_timeframes_only_use_completed_bars():
+    ohlcv = generate_ohlcv(5 * 390, freq="1min", seed=0).set_index(cfg.DATE)
+    pipeline = Pipeline([("moving_close", FunctionTransformer(moving_close))])
+
+    X = multi_timeframe_features(ohlcv, ["60min", "daily"], pipeline=pipeline)
+    assert len(X) == len(ohlcv) - 1
+    daily = X[f"{cfg.CLOSE}_tf_daily"]
+    days = ohlcv.index.normalize().unique()
+    daily_closes = ohlcv[cfg.CLOSE].groupby(ohlcv.index.normalize()).last()
+    # The daily bar is complete with the last bar of its session, not before
+    assert np.isnan(daily.loc[days[1] + pd.Timedelta("15h58min")])
+    assert daily.loc[days[1] + pd.Timedelta("15h59min")] == daily_closes.iloc[:2].mean()
+    assert daily.loc[days[2] + pd.Timedelta("15h58min")] == daily_closes.iloc[:2].mean()
+
+    # Reference join of hourly bars anchored on 09:30 with pandas
+    closes = ohlcv.resample("60min", offset="30min").last().dropna()
+    hourly = pd.DataFrame({"hourly": moving_close(closes)[cfg.CLOSE].values}, index=closes.index[1:])
+    hourly["completed"] = np.minimum(hourly.index + pd.Timedelta("60min"), hourly.index.normalize() + pd.Timedelta("16h"))
+    bars = pd.DataFrame({"end": X.index + pd.Timedelta("1min")})
+    expected = pd.merge_asof(bars, hourly.sort_values("completed"), left_on="end", right_on="completed")["hourly"]
+    np.testing.assert_allclose(X[f"{cfg.CLOSE}_tf_60min"].values, expected.values, equal_nan=True)
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import FeatureUnion, Pipeline
+from sklearn.preprocessing import FunctionTransformer, StandardScaler
+
+from src.features.profiling import PipelineTrace, instrument_pipeline, trace_summary
+
+
+def allocate(X, n_bytes):
+    # Temporary allocation released before returning
+    return X + np.ones(n_bytes // 8).sum() * 0
+
+
+def make_pipeline():
+    union = FeatureUnion([
+        ("large", FunctionTransformer(allocate, kw_args={"n_bytes": 2**25})),
+        ("small", FunctionTransformer(allocate, kw_args={"n_bytes": 2**20})),
+    ])
+    return Pipeline([("scale", StandardScaler()), ("union", union)])
+
+
+def test_records_of_each_step_and_nested_steps():
+    X = pd.DataFrame(np.random.default_rng(0).standard_normal((200, 3)))
+    pipeline = instrument_pipeline(make_pipeline(), PipelineTrace(memory=True))
+    pipeline.fit_transform(X)
+    pipeline.transform(X)
+
+    records = {(r["step"], r["method"]): r for r in pipeline.trace.records}
+    for step in ["scale", "union", "union.large", "union.small"]:
+        for method in ["fit_transform", "transform"]:
+            record = records[(step, method)]
+            assert record["wall_time"] >= 0 and record["cpu_time"] >= 0
+    assert records[("union.large", "transform")]["parent"] == "union"
+    assert records[("union", "transform")]["parent"] is None
+    assert records[("union", "transform")]["output"]["shape"] == [200, 6]
+    # The peak of the union includes the peak of its largest transformer, reached before the small one ran
+    large = records[("union.large", "transform")]["peak_memory_delta"]
+    assert large >= 2**25 and records[("union", "transform")]["peak_memory_delta"] >= large
+    assert {(s["step"], s["method"]) for s in trace_summary(pipeline.trace)} == set(records)
+
+
+def test_chrome_trace_export(tmp_path):
+    X = pd.DataFrame(np.random.default_rng(0).standard_normal((50, 3)))
+    pipeline = instrument_pipeline(make_pipeline(), PipelineTrace(memory=False))
+    pipeline.fit_transform(X)
+    pipeline.trace.to_chrome_trace(tmp_path / "trace.json")
+
+    with open(tmp_path / "trace.json") as fp:
+        trace = json.load(fp)
+    assert trace["displayTimeUnit"] == "ms" and len(trace["traceEvents"]) == 4
+    for event in trace["traceEvents"]:
+        assert event["ph"] == "X" and event["ts"] >= 0 and event["dur"] >= 0
+        assert {"name", "cat", "pid", "tid", "args"} <= set(event)
+        assert "wall_time" in event["args"] and "peak_memory_delta" not in event["args"]
+    union = next(event for event in trace["traceEvents"] if event["name"] == "union")
+    large = next(event for event in trace["traceEvents"] if event["name"] == "union.large")
+    # Nested events are drawn within their parent
+    assert union["ts"] <= large["ts"] and large["ts"] + large["dur"] <= union["ts"] + union["dur"]
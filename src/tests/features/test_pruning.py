@@ -0,0 +1,25 @@
+import numpy as np
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv
+from src.features.build_features import FEATURES_PIPELINE
+from src.features.pruning import build_pruned_pipeline, parse_feature_name
+
+
+def test_parse_feature_name():
+    lineage = parse_feature_name("PIVOT_FIB_s3_moving_standard_scaler")
+    assert lineage["method"] == "PIVOT_FIB"
+    assert lineage["finta_column"] == "PIVOT_FIB_s3"
+    assert lineage["scaler"] == "moving_standard_scaler"
+    assert lineage["distance"] == cfg.PASSTHROUGH_NAME
+    assert parse_feature_name("close")["method"] is None
+
+
+def test_pruned_pipeline_matches_full_pipeline():
+    ohlcv = generate_ohlcv(400, seed=0).set_index(cfg.DATE)
+    full = FEATURES_PIPELINE.fit_transform(ohlcv)
+    columns = list(np.random.default_rng(0).choice(full.columns, 15, replace=False))
+    pruned = build_pruned_pipeline(columns).fit_transform(ohlcv)
+    assert list(pruned.columns) == columns
+    n = min(len(full), len(pruned))
+    np.testing.assert_allclose(pruned.values[-n:], full[columns].values[-n:])
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from src.features.redundancy import RedundantColumnDroper, duplicate_columns
+
+
+def test_duplicate_columns():
+    X = np.array([[1., np.nan, 1., 0.], [2., 3., 2., -0.], [np.nan, 1., np.nan, 0.]])
+    X = np.hstack([X, X[:, :2]])
+    assert list(duplicate_columns(X)) == [False, False, True, False, True, True]
+
+
+def test_redundant_columns_are_dropped():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.standard_normal((500, 40)), columns=[f"col_{i}" for i in range(40)])
+    X["affine"] = 3 * X["col_1"] - 2
+    X["noisy"] = -X["col_7"] + 0.01 * rng.standard_normal(500)
+    X["duplicate"] = X["col_2"]
+    # A tiny budget forces many blocks
+    droper = RedundantColumnDroper(threshold=0.95, memory_budget=2**14).fit(X)
+    assert droper.selected_columns_ == [f"col_{i}" for i in range(40)]
+    droper = RedundantColumnDroper(threshold=0.95, priority=["noisy"]).fit(X)
+    assert "noisy" in droper.selected_columns_ and "col_7" not in droper.selected_columns_
+    assert list(droper.transform(X).columns) == droper.selected_columns_
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from src.features.scalers import EWStandardScaler, MovingRobustScaler, SortedWindow
+
+
+def _features():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(100 + rng.standard_normal((200, 4)).cumsum(axis=0))
+    X.iloc[:15, 1] = np.nan
+    X.iloc[:, 3] = 5.
+    return X
+
+
+def test_ew_standard_scaler_matches_pandas_and_updates():
+    X = _features()
+    expected = EWStandardScaler(span=10).fit_transform(X)
+    ewm = X.ewm(span=10, adjust=False, ignore_na=True)
+    zscores = ((X - ewm.mean()) / np.sqrt(ewm.var(bias=True))).where(X.notna().cumsum() >= 10)
+    np.testing.assert_allclose(expected.values[:, :3], zscores.values[:, :3], rtol=1e-9, atol=1e-9)
+    assert expected[3].isna().all()
+
+    scaler = EWStandardScaler(span=10).fit(X.iloc[:150])
+    np.testing.assert_allclose(scaler.partial_transform(X.iloc[150:180]).values, expected.values[150:180])
+    updates = [scaler.update(row) for row in X.values[180:]]
+    np.testing.assert_allclose(updates, expected.values[180:])
+
+
+def test_moving_robust_scaler_updates_match_batch():
+    X = _features()
+    expected = MovingRobustScaler(window=10).fit_transform(X)
+    rolling = X.rolling(10)
+    medians, ranges = rolling.median(), rolling.quantile(0.75) - rolling.quantile(0.25)
+    np.testing.assert_allclose(expected.values[:, :3], ((X - medians) / ranges).values[:, :3])
+
+    scaler = MovingRobustScaler(window=10).fit(X.iloc[:150])
+    np.testing.assert_allclose(scaler.transform(X.iloc[150:151]).values[0], expected.values[150])
+    updates = [scaler.update(row) for row in X.values[151:]]
+    np.testing.assert_allclose(updates, expected.values[151:])
+
+
+def test_sorted_window_stays_sorted_with_ties_and_nan():
+    rng = np.random.default_rng(0)
+    window = SortedWindow(rng.integers(0, 4, size=(7, 20)).astype(float))
+    for _ in range(200):
+        x = rng.integers(0, 4, size=20).astype(float)
+        x[rng.random(20) < 0.1] = np.nan
+        window.push(x)
+        values = pd.DataFrame(window.values())
+        np.testing.assert_array_equal(window.quantile(0.25), values.quantile(0.25).where(values.notna().all()).values)
+
+
+def test_sorted_window_quantiles_of_a_trending_window():
+    rng = np.random.default_rng(0)
+    # Trending values are inserted after all the others, rounded values give ties
+    values = np.round(np.cumsum(rng.random((400, 5)), axis=0) + rng.normal(size=(400, 5)), 1)
+    window = SortedWindow(values[:50])
+    for x in values[50:]:
+        window.push(x)
+        np.testing.assert_allclose(window.quantiles([0., 0.25, 0.5, 1.]), np.quantile(window.values(), [0., 0.25, 0.5, 1.], axis=0))
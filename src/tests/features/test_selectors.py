@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+from src.features.selectors import FeatureSelector, auc_scores
+
+
+def informative_data(n=1000, p=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n, p))
+    y = (X[:, 3] - X[:, 42] + 0.5 * rng.standard_normal(n) > 0).astype(float)
+    return pd.DataFrame(X, columns=[f"col_{i}" for i in range(p)]), y
+
+
+def test_auc_scores_match_sklearn():
+    X, y = informative_data(p=50)
+    expected = [roc_auc_score(y, X.iloc[:, i]) for i in range(50)]
+    np.testing.assert_allclose(auc_scores(X.values, y, chunk_size=16, n_jobs=1), expected)
+
+
+def test_selectors_find_informative_columns():
+    X, y = informative_data()
+    y[:5] = np.nan
+    for method in FeatureSelector.METHODS:
+        selector = FeatureSelector(method, k=2, n_resamples=5, chunk_size=64, random_state=0).fit(X, y)
+        assert set(selector.selected_columns_) == {"col_3", "col_42"}
+        assert list(selector.transform(X).columns) == selector.selected_columns_
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+import src.config as cfg
+from src.data.synthetic import generate_universe
+from src.models.backtest import backtest_grid
+
+
+def naive_backtest(signals, ohlcvs, threshold, h, cost, breakeven):
+    trades, exits = [], 0
+    for symbol in signals.columns:
+        o, c = ohlcvs[symbol][cfg.OPEN].values, ohlcvs[symbol][cfg.CLOSE].values
+        s = signals[symbol].values
+        entered = [t + h < len(o) and s[t] >= threshold for t in range(len(o))]
+        trades += [c[t + h] / o[t + 1] - 1 for t in range(len(o)) if entered[t]]
+        exits += sum(entered[t] != (t >= h and entered[t - h]) for t in range(len(o)))
+    trades = np.array(trades)
+    n_slots = h * signals.shape[1]
+    return {
+        "n_trades": len(trades),
+        "mean_return": np.mean(trades - cost),
+        "total_return": np.sum(trades - cost) / n_slots,
+        "hit_rate": np.mean(trades >= breakeven),
+        "turnover": exits / n_slots / len(signals),
+    }
+
+
+def test_backtest_grid_matches_naive_backtest():
+    ohlcvs = {symbol: df.set_index(cfg.DATE) for symbol, df in generate_universe(3, 80, seed=0)}
+    dates = ohlcvs["SYN00000"].index
+    signals = pd.DataFrame(np.random.default_rng(0).random((80, 3)), index=dates, columns=list(ohlcvs))
+    # A tiny memory budget forces one threshold per chunk
+    grid = backtest_grid(signals, ohlcvs, thresholds=[0.2, 0.5, 0.9], holding_periods=[1, 3, 7],
+                         cost=0.001, breakeven=0.003, memory_budget=1)
+    for (threshold, h), row in grid.iterrows():
+        expected = naive_backtest(signals, ohlcvs, threshold, h, 0.001, 0.003)
+        for metric, value in expected.items():
+            np.testing.assert_allclose(row[metric], value, rtol=1e-5, err_msg=f"{metric} {threshold} {h}")
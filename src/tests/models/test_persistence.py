@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import src.config as cfg
+from src.data.labeling import class_name, compute_labels
+from src.data.synthetic import generate_universe
+from src.features.inference_plan import InferencePlan
+from src.models.persistence import config_snapshot, load, read_header, save
+from src.models.scoring_service import fit_model, load_plans
+
+
+def test_save_load_roundtrip(tmp_path):
+    history = 300
+    (symbol, df), = generate_universe(1, history + 3, seed=0)
+    ohlcv = df.set_index(cfg.DATE)
+    labels = compute_labels(ohlcv.iloc[:history], [1], [cfg.BREAKEVEN], [])[class_name(1, cfg.BREAKEVEN)]
+    pipeline, model = fit_model(ohlcv.iloc[:history], labels)
+    snapshot = config_snapshot()
+    expected = pipeline.transform(ohlcv.iloc[:history].copy())
+    reference = InferencePlan(pipeline, model)
+    expected_scores = [reference.score(bar) for bar in ohlcv.iloc[history:][cfg.OHLCV].values]
+
+    path = save((pipeline, model), tmp_path / f"{symbol}.model", metadata={"symbol": symbol})
+    assert read_header(path)["metadata"] == {"symbol": symbol}
+    cfg.CURRENT_COLS, cfg.SELECTED_COLS = [], []
+
+    loaded_pipeline, loaded_model = load(path)
+    assert config_snapshot() == snapshot
+    assert not loaded_model.coef_.flags.owndata
+    np.testing.assert_allclose(loaded_pipeline.transform(ohlcv.iloc[:history].copy()).values, expected.values)
+
+    plan = load_plans(tmp_path)[symbol]
+    scores = [plan.score(bar) for bar in ohlcv.iloc[history:][cfg.OHLCV].values]
+    np.testing.assert_allclose(scores, expected_scores)
+
+    with pytest.raises(ValueError):
+        load(path, mmap_mode="w+")
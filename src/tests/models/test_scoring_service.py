@@ -0,0 +1,95 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+import src.config as cfg
+from src.benchmarks.scoring_load import run_load
+from src.data.labeling import class_name, compute_labels
+from src.data.synthetic import generate_universe
+from src.features.build_features import FEATURES_PIPELINE
+from src.features.drift import add_drift_monitors
+from src.models.scoring_service import ScoringService, fit_plan, serve
+
+
+def test_scoring_service_matches_plans():
+    history = 300
+    universe = {symbol: df.set_index(cfg.DATE) for symbol, df in generate_universe(2, history + 3, seed=0)}
+    labels = {symbol: compute_labels(df.iloc[:history], [1], [cfg.BREAKEVEN], [])[class_name(1, cfg.BREAKEVEN)]
+              for symbol, df in universe.items()}
+    plans = {symbol: fit_plan(df.iloc[:history], labels[symbol]) for symbol, df in universe.items()}
+    references = {symbol: fit_plan(df.iloc[:history], labels[symbol]) for symbol, df in universe.items()}
+
+    service = ScoringService(plans)
+    server = serve(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://{cfg.SCORING_HOST}:{server.server_address[1]}"
+        results = run_load(url, {symbol: df.iloc[history:] for symbol, df in universe.items()}, n_clients=2)
+        unknown = service.submit("UNKNOWN", universe["SYN00000"].iloc[-1]).exception(timeout=5)
+    finally:
+        server.shutdown()
+        service.stop()
+
+    assert results["errors"] == 0 and results["scored"] == 6
+    assert isinstance(unknown, KeyError)
+    for symbol, df in universe.items():
+        expected = [references[symbol].score(bar) for bar in df.iloc[history:][cfg.OHLCV].values]
+        np.testing.assert_allclose(results["scores"][symbol], expected)
+
+
+def test_scoring_errors_are_returned_as_json():
+    class FailingEstimator:
+        def predict_proba(self, X):
+            raise RuntimeError("Broken model")
+
+    df = next(generate_universe(1, 301, seed=0))[1].set_index(cfg.DATE)
+    labels = compute_labels(df.iloc[:300], [1], [cfg.BREAKEVEN], [])[class_name(1, cfg.BREAKEVEN)]
+    plan = fit_plan(df.iloc[:300], labels)
+    plan.estimator = FailingEstimator()
+    service = ScoringService({"SYN": plan})
+    server = serve(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    bar = {col: float(df.iloc[-1][col]) for col in cfg.OHLCV}
+    request = urllib.request.Request(f"http://{cfg.SCORING_HOST}:{server.server_address[1]}/score",
+                                     data=json.dumps({"bars": [{"symbol": "SYN", "bar": bar}]}).encode())
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request)
+    finally:
+        server.shutdown()
+        service.stop()
+    assert error.value.code == 500 and "Broken model" in json.loads(error.value.read())["error"]
+
+
+def test_drift_is_read_under_the_service_lock():
+    df = next(generate_universe(1, 303, seed=0))[1].set_index(cfg.DATE)
+    labels = compute_labels(df.iloc[:300], [1], [cfg.BREAKEVEN], [])[class_name(1, cfg.BREAKEVEN)]
+    plan = fit_plan(df.iloc[:300], labels, pipeline=add_drift_monitors(FEATURES_PIPELINE))
+    service = ScoringService({"SYN": plan})
+    server = serve(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{cfg.SCORING_HOST}:{server.server_address[1]}"
+    batcher = service._thread
+    try:
+        service.score([("SYN", bar) for bar in df.iloc[300:][cfg.OHLCV].values], timeout=5)
+        # Monitors are not read while the batching thread holds the lock to update them
+        responses = []
+        with service._lock:
+            reader = threading.Thread(target=lambda: responses.append(json.loads(urllib.request.urlopen(f"{url}/drift").read())))
+            reader.start()
+            reader.join(0.2)
+            assert reader.is_alive()
+        reader.join(5)
+        # The batching thread started by serve is not duplicated
+        assert service.start()._thread is batcher
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/unknown")
+    finally:
+        server.shutdown()
+        service.stop()
+    assert responses == [service.drift()] and set(responses[0]["SYN"]) == {"drift_clean_finta", "drift_nan offset"}
+    assert error.value.code == 404
@@ -0,0 +1,32 @@
+import numpy as np
+
+import src.config as cfg
+from src.data.labeling import class_name, compute_labels
+from src.data.synthetic import generate_ohlcv
+from src.features.build_features import FEATURES_PIPELINE
+from src.models.persistence import config_snapshot, restore_config
+from src.models.sweep import configure, selection_score, sweep
+
+
+def test_sweep_matches_the_configured_features_pipeline():
+    ohlcv = generate_ohlcv(400, seed=0).set_index(cfg.DATE)
+    labels = compute_labels(ohlcv, [1], [cfg.BREAKEVEN], [])[class_name(1, cfg.BREAKEVEN)]
+    grid = {"scaling_window": [5, 10], "correlation_threshold": [0.9, 0.95], "buffer_size": [98, 150]}
+    snapshot = config_snapshot()
+
+    report = sweep(ohlcv, labels, grid, k=10, n_jobs=1)
+    assert len(report) == 8
+    assert config_snapshot() == snapshot
+
+    config = report.iloc[-1].to_dict()
+    pipeline = configure(FEATURES_PIPELINE, config)
+    assert pipeline.get_params()["scalers__ew_standard_scaler__span"] == config["scaling_window"]
+    assert pipeline.get_params()["prune_redundant__threshold"] == config["correlation_threshold"]
+    X = pipeline.fit_transform(ohlcv)
+    expected = selection_score(X.values, list(X.columns), np.asarray(labels, dtype=float)[cfg.NAN_OFFSET:], k=10)
+    restore_config(snapshot)
+    assert config["score"] == expected["score"] and config["n_features"] == expected["n_features"]
+    assert config["best_features"] == expected["best_features"]
+    # Finta buffer size does not change batch indicators
+    scores = report.groupby(["scaling_window", "correlation_threshold"])["score"].nunique()
+    assert (scores == 1).all()
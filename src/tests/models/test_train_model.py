@@ -0,0 +1,37 @@
+import numpy as np
+
+import src.config as cfg
+from src.data.labeling import class_name, compute_labels
+from src.data.synthetic import generate_ohlcv
+from src.models.train_model import walk_forward, walk_forward_splits
+
+
+def test_walk_forward_splits():
+    expanding = walk_forward_splits(100, n_splits=3, test_size=20, gap=2)
+    assert [(train.start, train.stop, test.start, test.stop) for train, test in expanding] == \
+        [(0, 38, 40, 60), (0, 58, 60, 80), (0, 78, 80, 100)]
+    rolling = walk_forward_splits(100, n_splits=3, test_size=20, max_train_size=30, gap=0)
+    assert all(train.stop - train.start == 30 and train.stop == test.start for train, test in rolling)
+
+
+def test_training_labels_do_not_use_test_prices():
+    ohlcv = generate_ohlcv(300, seed=0).set_index(cfg.DATE)
+    name = class_name(cfg.LABELS_HORIZON, cfg.BREAKEVEN)
+    labels = compute_labels(ohlcv, [cfg.LABELS_HORIZON], [cfg.BREAKEVEN], [])[name]
+    for train, test in walk_forward_splits(len(ohlcv), n_splits=4, test_size=50):
+        # Test bars and the next ones close far above their open, so that every label using them is positive
+        moved = ohlcv.copy()
+        moved.iloc[test.start:, moved.columns.get_loc(cfg.CLOSE)] = 2 * moved[cfg.OPEN].values[test.start:]
+        moved_labels = compute_labels(moved, [cfg.LABELS_HORIZON], [cfg.BREAKEVEN], [])[name]
+        np.testing.assert_array_equal(moved_labels.values[train], labels.values[train])
+
+
+def test_walk_forward():
+    ohlcv = generate_ohlcv(600, seed=0).set_index(cfg.DATE)
+    labels = compute_labels(ohlcv, [1], [cfg.BREAKEVEN], [])[class_name(1, cfg.BREAKEVEN)]
+    report, predictions = walk_forward({"SYN": ohlcv}, {"SYN": labels}, n_splits=2, test_size=100, n_jobs=1)
+    assert list(report["fold"]) == [0, 1]
+    assert (report["test_start"] > report["train_start"]).all()
+    assert len(predictions) == 200
+    assert predictions[cfg.DATE].is_unique and predictions[cfg.DATE].isin(ohlcv.index[-200:]).all()
+    np.testing.assert_array_equal(predictions[cfg.LABELS], labels.values[-200:])
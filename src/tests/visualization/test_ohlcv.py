@@ -0,0 +1,33 @@
+import numpy as np
+
+import src.config as cfg
+from src.data.synthetic import generate_ohlcv
+from src.visualization.ohlcv import candlestick, lttb, ohlc_pyramid, visible_bars
+
+
+def test_pyramid_and_visible_bars():
+    dohlcv = generate_ohlcv(5000, freq="1min", seed=0)
+    levels = ohlc_pyramid(dohlcv, target_points=500)
+    assert len(levels[-1]["date"]) <= 500
+
+    # Level 3 buckets aggregate 8 consecutive bars
+    groups = dohlcv.groupby(np.arange(len(dohlcv)) // 8)
+    expected = groups.agg({cfg.OPEN: "first", cfg.HIGH: "max", cfg.LOW: "min", cfg.CLOSE: "last", cfg.VOLUME: "sum"})
+    np.testing.assert_allclose(levels[3]["values"], expected.values)
+
+    x_range = (dohlcv[cfg.DATE].iloc[1000], dohlcv[cfg.DATE].iloc[1300])
+    bars = visible_bars(levels, x_range, target_points=500)
+    np.testing.assert_array_equal(bars["date"], dohlcv[cfg.DATE].values[1000:1301])
+    assert len(bars["volume"]) == 301
+
+    fig = candlestick(dohlcv, target_points=500, mode="webgl", show=False)
+    assert all(len(trace.x) <= 3 * 500 for trace in fig.data)
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(10000)
+    y = np.ones(10000)
+    y[4321] = 50.
+    kept = lttb(x, y, 100)
+    assert len(kept) == 100 and kept[0] == 0 and kept[-1] == 9999 and 4321 in kept
+    assert np.all(np.diff(kept) > 0)
@@ -1,28 +1,244 @@
+""" Candlestick charts of OHLCV series of any length.
+
+ Series are never handed to plotly as a whole: bars are aggregated into buckets of
+ consecutive rows so that at most `target_points` candles are drawn. Buckets come
+ from a multi-resolution pyramid computed once, each level aggregating pairs of
+ buckets of the previous one, so that the bars of any zoomed range are picked from
+ the finest level fitting the target without touching the raw series again.
+ Volumes are downsampled with Largest-Triangle-Three-Buckets (LTTB), which keeps
+ the spikes a plain decimation would miss."""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
 
 import src.config as cfg
 
-def candlestick(df, title = "stock_candlestick"):
+MODES = ("svg", "webgl", "static")
+# Maximum amount of volume points given to LTTB on zoom, coarser pyramid levels are used above it
+LTTB_MAX_INPUT = 200000
+
+
+def _dates_and_values(df:pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+  if cfg.DATE in df.columns:
+    df = df.set_index(cfg.DATE)
+  has_volumes = cfg.VOLUME in df.columns
+  columns = cfg.OHLCV if has_volumes else cfg.OHLC
+  values = np.column_stack([df[col].to_numpy(dtype=float) for col in columns])
+  if not has_volumes:
+    values = np.column_stack([values, np.full(len(values), np.nan)])
+  return pd.DatetimeIndex(df.index).values.astype("datetime64[ns]"), values
+
+
+def aggregate_buckets(dates:np.ndarray, values:np.ndarray, counts:np.ndarray, starts:np.ndarray) -> dict:
+  """
+    Aggregate consecutive rows starting at `starts` into bars.
+
+    Parameters
+    ----------
+    dates: np.ndarray of datetime64[ns]
+      First date of each row
+    values: np.ndarray of shape (n_rows, 5)
+      Open, high, low, close and volume of each row
+    counts: np.ndarray of int
+      Amount of raw bars aggregated in each row
+    starts: np.ndarray of int
+      First row of each bucket
+
+    Returns
+    -------
+    dict
+      Pyramid level with `date`, `values` and `counts` arrays of the buckets
+  """
+  ends = np.r_[starts[1:], len(dates)] - 1
+  o, h, l, c, v = values.T
+  aggregated = np.column_stack([
+    o[starts],
+    np.maximum.reduceat(h, starts),
+    np.minimum.reduceat(l, starts),
+    c[ends],
+    np.add.reduceat(v, starts),
+  ])
+  return {"date": dates[starts], "values": aggregated, "counts": np.add.reduceat(counts, starts)}
+
+
+def ohlc_pyramid(df:pd.DataFrame, target_points:int=2000) -> List[dict]:
+  """
+    Multi-resolution levels of an OHLCV series.
+
+    Level 0 holds the raw bars, level k buckets of 2**k consecutive bars, up to
+    the first level with at most `target_points` buckets.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+      OHLCV data in time order, with dates as index or in a `cfg.DATE` column.
+      Volumes are optional.
+    target_points: int
+      Maximum amount of bars of the coarsest level
+
+    Returns
+    -------
+    list of dict
+      Levels from the finest to the coarsest (see `aggregate_buckets`)
+  """
+  dates, values = _dates_and_values(df)
+  levels = [{"date": dates, "values": values, "counts": np.ones(len(dates), dtype=np.int64)}]
+  while len(levels[-1]["date"]) > target_points:
+    previous = levels[-1]
+    levels.append(aggregate_buckets(previous["date"], previous["values"], previous["counts"],
+                                    np.arange(0, len(previous["date"]), 2)))
+  return levels
+
+
+def lttb(x:np.ndarray, y:np.ndarray, n_out:int) -> np.ndarray:
+  """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are kept. Other points are split in n_out - 2 buckets and
+    each bucket keeps the point forming the largest triangle with the point kept in the
+    previous bucket and the average point of the next bucket.
+
+    Parameters
+    ----------
+    x, y: np.ndarray of shape (n,)
+      Coordinates of the points, x in ascending order
+    n_out: int
+      Amount of points to keep
+
+    Returns
+    -------
+    np.ndarray of int
+  """
+  n = len(x)
+  if n_out >= n or n_out < 3:
+    return np.arange(n)
+  x, y = x.astype(float), np.nan_to_num(y.astype(float))
+  edges = (np.linspace(1, n - 1, n_out - 1)).astype(int)
+  # Average point of each bucket, the last point closing the series
+  sums_x, sums_y = np.add.reduceat(x[1:n - 1], edges[:-1] - 1), np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+  sizes = np.diff(edges)
+  means_x = np.r_[sums_x / sizes, x[-1]]
+  means_y = np.r_[sums_y / sizes, y[-1]]
+
+  kept = np.empty(n_out, dtype=np.int64)
+  kept[0], kept[-1] = 0, n - 1
+  a = 0
+  for i in range(n_out - 2):
+    start, stop = edges[i], edges[i + 1]
+    # Twice the areas of the triangles (a, candidate, mean of the next bucket)
+    areas = np.abs((x[a] - means_x[i + 1]) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (means_y[i + 1] - y[a]))
+    a = start + int(np.argmax(areas))
+    kept[i + 1] = a
+  return kept
+
+
+def visible_bars(levels:List[dict], x_range:Optional[Tuple]=None, target_points:int=2000) -> Dict[str, np.ndarray]:
+  """
+    Bars and volumes to draw for a visible range of dates.
+
+    Parameters
+    ----------
+    levels: list of dict
+      Pyramid of the series (see `ohlc_pyramid`)
+    x_range: tuple, default=None
+      (first date, last date) of the visible range, the whole series if None
+    target_points: int
+      Maximum amount of candles and volume points
+
+    Returns
+    -------
+    dict
+      `date`, `open`, `high`, `low`, `close` arrays of the candles, and `volume_date`, `volume` arrays
+      of the volume points, as volume per raw bar so that their scale does not change with zoom
+  """
+  bounds = None
+  if x_range is not None:
+    bounds = np.array([pd.Timestamp(x_range[0]).to_datetime64(), pd.Timestamp(x_range[1]).to_datetime64()],
+                      dtype="datetime64[ns]")
+
+  def visible(level):
+    if bounds is None:
+      return slice(0, len(level["date"]))
+    # Keep the bucket overlapping the start of the range
+    start = max(np.searchsorted(level["date"], bounds[0], side="right") - 1, 0)
+    return slice(start, np.searchsorted(level["date"], bounds[1], side="right"))
+
+  # Finest level fitting the target
+  for level in levels:
+    rows = visible(level)
+    if rows.stop - rows.start <= target_points:
+      break
+  o, h, l, c, _ = level["values"][rows].T
+  bars = {"date": level["date"][rows], "open": o, "high": h, "low": l, "close": c}
+
+  for level in levels:
+    volume_rows = visible(level)
+    if volume_rows.stop - volume_rows.start <= LTTB_MAX_INPUT:
+      break
+  dates = level["date"][volume_rows]
+  volumes = level["values"][volume_rows, 4] / level["counts"][volume_rows]
+  kept = lttb(dates.view(np.int64), volumes, target_points)
+  bars.update(volume_date=dates[kept], volume=volumes[kept])
+  return bars
+
+
+def _traces(bars:Dict[str, np.ndarray], mode:str) -> Tuple[list, go.Scatter]:
+  """ Price traces (a candlestick, or increasing and decreasing WebGL segments) and the volume trace."""
+  if mode != "webgl":
+    prices = [go.Candlestick(x=bars["date"], open=bars["open"], high=bars["high"], low=bars["low"],
+                             close=bars["close"], name="ohlc")]
+    volume = go.Bar(x=bars["volume_date"], y=bars["volume"], name=cfg.VOLUME)
+    return prices, volume
+
+  # Candlesticks have no WebGL implementation: wicks (low-high) and bodies (open-close) are drawn
+  # as vertical segments separated by NaN, which break lines whatever their dates
+  prices = []
+  increasing = bars["close"] >= bars["open"]
+  for name, rows, color in (("increasing", increasing, "#3D9970"), ("decreasing", ~increasing, "#FF4136")):
+    x = np.repeat(bars["date"][rows], 3)
+    gaps = np.full(len(x) // 3, np.nan)
+    for bottom, top, width in ((bars["low"], bars["high"], 1), (bars["open"], bars["close"], 4)):
+      y = np.column_stack([bottom[rows], top[rows], gaps]).ravel()
+      prices.append(go.Scattergl(x=x, y=y, mode="lines", line=dict(color=color, width=width), name=name,
+                                 legendgroup=name, showlegend=width == 1))
+  volume = go.Scattergl(x=bars["volume_date"], y=bars["volume"], mode="lines", fill="tozeroy", name=cfg.VOLUME)
+  return prices, volume
+
+
+def candlestick(df, title = "stock_candlestick", target_points:int=2000, mode:str="svg", interactive:bool=False,
+                show:bool=True):
   """
   df : pandas.DataFrame
-    OHLCV data
+    OHLCV data in time order, with dates as index or in a `cfg.DATE` column
   title : str
-     Title of the chart
+    Title of the chart
+  target_points : int
+    Maximum amount of candles and volume points drawn
+  mode : str
+    "svg": plotly candlesticks and volume bars
+    "webgl": WebGL high-low segments and volume area, for large target_points
+    "static": rendered as a PNG image (requires kaleido)
+  interactive : bool
+    Return a FigureWidget re-aggregating bars when zooming (requires ipywidgets, in a notebook)
+  show : bool
+    Display the figure
+
+  Example:
+  --------
+  ```Python
+    stock = Stock("aapl")  # with INTRADAY_1MIN_FULL settings
+    candlestick(stock.ohlcv, "aapl", mode="webgl", interactive=True)
+  ```
   """
-  
+  if mode not in MODES:
+    raise ValueError(f"Unknown mode {mode}. Available modes: {list(MODES)}")
   has_volumes = cfg.VOLUME in df.columns
-  if df.index.name == cfg.DATE:
-    df = df.reset_index()
-
-  #Configures traces for prices and volume
-  ohlc = go.Candlestick(x=df[cfg.DATE],
-                      open=df[cfg.OPEN],
-                      high=df[cfg.HIGH],
-                      low=df[cfg.LOW],
-                      close=df[cfg.CLOSE])
-  if has_volumes:
-    volume = go.Bar(x=df.date,y=df[cfg.VOLUME])
+  levels = ohlc_pyramid(df, target_points)
+  prices, volume = _traces(visible_bars(levels, target_points=target_points), mode)
 
   #configure subplot with a grid of 4 rows and 1 column. OHLC will take 3 rows heigh
   fig = make_subplots(rows=4, cols=1,
@@ -36,7 +252,8 @@ def candlestick(df, title = "stock_candlestick"):
                   ]
                 )
   #Add the 2 subplots
-  fig.append_trace(ohlc, 1, 1)
+  for trace in prices:
+    fig.append_trace(trace, 1, 1)
   if has_volumes:
     fig.append_trace(volume, 4, 1)
 
@@ -45,4 +262,24 @@ def candlestick(df, title = "stock_candlestick"):
             xaxis = dict(rangeslider = dict(visible = False))
             )
 
-  fig.show()
\ No newline at end of file
+  if interactive:
+    fig = go.FigureWidget(fig)
+    n_prices = len(prices)
+
+    def on_zoom(layout, x_range):
+      bars = visible_bars(levels, x_range, target_points)
+      new_prices, new_volume = _traces(bars, mode)
+      with fig.batch_update():
+        for trace, new in zip(fig.data[:n_prices], new_prices):
+          trace.update({key: value for key, value in new.to_plotly_json().items() if key != "type"})
+        if has_volumes:
+          fig.data[n_prices].update(x=new_volume.x, y=new_volume.y)
+
+    fig.layout.on_change(on_zoom, "xaxis.range")
+
+  if show:
+    if mode == "static":
+      fig.show(renderer="png")
+    else:
+      fig.show()
+  return fig